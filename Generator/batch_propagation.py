@@ -0,0 +1,94 @@
+"""Constraint propagation for many puzzles at once.
+
+The puzzles are an (N, group_size, group_size) array with 0 for open
+squares. Every round works on all of them as whole-array NumPy
+operations: find the candidates of every open square, stop puzzles
+that have run into a contradiction, and fill in all naked singles
+(squares with one candidate left) and hidden singles (digits with one
+place left in a row, column or box). Each of those is forced, so a
+puzzle that gets solved this way has exactly one solution, and a puzzle
+that runs into a contradiction has none.
+"""
+import math
+import numpy as np
+
+
+def digit_counts(grids, group_size):
+    """Return how often each digit occurs in every row, column and box.
+
+    The counts have shape (N, group_size, group_size): unit, digit - 1.
+    Boxes are numbered row by row here."""
+    n = group_size
+    w = int(math.sqrt(n))
+    one_hot = grids[..., None] == np.arange(1, n + 1, dtype=grids.dtype)
+    rows = one_hot.sum(axis=2)
+    cols = one_hot.sum(axis=1)
+    boxes = one_hot.reshape(-1, w, w, w, w, n).sum(axis=(2, 4)).reshape(-1, n, n)
+    return rows, cols, boxes
+
+
+def candidates(grids, group_size):
+    """Return an (N, y, x, digit - 1) bool array of the digits each open
+    square can still take, and the digit counts of digit_counts()."""
+    n = group_size
+    w = int(math.sqrt(n))
+    rows, cols, boxes = digit_counts(grids, n)
+    box_used = (boxes > 0).reshape(-1, w, 1, w, 1, n)
+    box_used = np.broadcast_to(box_used, (len(grids), w, w, w, w, n))
+    cand = ((grids == 0)[..., None] &
+            (rows == 0)[:, :, None, :] &
+            (cols == 0)[:, None, :, :] &
+            ~box_used.reshape(-1, n, n, n))
+    return cand, (rows, cols, boxes)
+
+
+def propagate(grids, group_size=9, max_rounds=None):
+    """Fill in singles until no puzzle changes any more.
+
+    Returns (grids, solved, contradiction): the propagated copy of grids
+    and two bool arrays telling which puzzles got solved and which have
+    no solution. The rest still needs a search."""
+    n = group_size
+    w = int(math.sqrt(n))
+    grids = np.array(grids, dtype=np.int8).reshape(-1, n, n)
+    count = len(grids)
+    solved = np.zeros(count, dtype=bool)
+    contradiction = np.zeros(count, dtype=bool)
+    active = np.arange(count)
+    rounds = 0
+    while len(active) and (max_rounds is None or rounds < max_rounds):
+        rounds += 1
+        current = grids[active]
+        cand, (rows, cols, boxes) = candidates(current, n)
+        open_squares = current == 0
+        ncand = cand.sum(axis=3)
+        # a digit twice in a unit, an open square without candidates or
+        # a missing digit with no place left in its unit
+        row_places = cand.sum(axis=2)
+        col_places = cand.sum(axis=1)
+        box_places = cand.reshape(-1, w, w, w, w, n).sum(axis=(2, 4)).reshape(-1, n, n)
+        broken = ((rows > 1).any(axis=(1, 2)) | (cols > 1).any(axis=(1, 2)) |
+                  (boxes > 1).any(axis=(1, 2)) |
+                  (open_squares & (ncand == 0)).any(axis=(1, 2)) |
+                  ((rows == 0) & (row_places == 0)).any(axis=(1, 2)) |
+                  ((cols == 0) & (col_places == 0)).any(axis=(1, 2)) |
+                  ((boxes == 0) & (box_places == 0)).any(axis=(1, 2)))
+        done = ~open_squares.any(axis=(1, 2))
+        contradiction[active[broken]] = True
+        solved[active[done & ~broken]] = True
+        # naked singles
+        fills = np.where(ncand == 1, cand.argmax(axis=3) + 1, 0)
+        # hidden singles; a square can be asked to take two different
+        # digits, which shows up as a contradiction next round
+        hidden = (cand & (row_places == 1)[:, :, None, :]) | \
+                 (cand & (col_places == 1)[:, None, :, :])
+        box_single = (box_places == 1).reshape(-1, w, 1, w, 1, n)
+        box_single = np.broadcast_to(box_single, (len(current), w, w, w, w, n))
+        hidden |= cand & box_single.reshape(-1, n, n, n)
+        hidden_square = hidden.any(axis=3)
+        fills = np.where(hidden_square, hidden.argmax(axis=3) + 1, fills)
+        changed = fills.any(axis=(1, 2))
+        keep = changed & ~broken & ~done
+        grids[active[keep]] = current[keep] + fills[keep]
+        active = active[keep]
+    return grids, solved, contradiction
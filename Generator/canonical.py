@@ -0,0 +1,222 @@
+"""Canonical forms of puzzles, to recognise the same puzzle in disguise.
+
+Relabelling the digits, reordering the rows of a band, the bands, the
+columns of a stack and the stacks, and transposing the grid all turn a
+puzzle into one that is solved the same way. canonical_form() picks one
+representative of all these variants, so two puzzles have the same
+canonical form exactly when one is a variant of the other, and
+puzzle_key() hashes it into a short string.
+
+Up to 9x9 the form is the minlex one: of all variants, the one whose
+cells, read row by row with 0 for open squares, are smallest. It is
+found row by row, keeping only the variants that tie for the smallest
+rows so far; the first row is settled by counting clues, which leaves a
+few dozen column orders instead of all 1296.
+
+Very sparse grids tie on so many rows that the variants kept run into
+the hundreds of thousands; above MINLEX_MAX_STATES they get the weaker
+form of larger grids below. The number of variants kept is the same
+for every variant of a puzzle, so a puzzle and its variants always get
+the same kind of form.
+
+Larger grids have far too many column orders for that, so their
+canonical form is weaker: bands, rows, stacks and columns are sorted by
+their number of clues before the digits are relabelled. Two puzzles
+with the same form are still always variants of each other, but not
+every pair of variants is recognised.
+"""
+import hashlib
+import itertools
+import math
+from Generator.sudoku_solver import RatingSummary
+
+# largest group size that gets the exact minlex form
+MINLEX_MAX_GROUP_SIZE = 9
+# most tied variants minlex() keeps before giving up; generated puzzles
+# stay below 4000
+MINLEX_MAX_STATES = 20000
+
+
+def puzzle_rows(puzzle, group_size):
+    """Return a puzzle, given as a SudokuGrid.to_string() string or as
+    rows of cells, as a tuple of rows."""
+    if isinstance(puzzle, str):
+        cells = [int(i) for i in puzzle.split()]
+        return tuple(tuple(cells[y * group_size:(y + 1) * group_size])
+                     for y in range(group_size))
+    return tuple(tuple(int(v) for v in row) for row in puzzle)
+
+
+def relabel(rows):
+    """Number the digits by their first appearance, row by row."""
+    labels = {}
+    out = []
+    for row in rows:
+        for v in row:
+            if v and v not in labels:
+                labels[v] = len(labels) + 1
+            out.append(labels.get(v, 0))
+    return tuple(out)
+
+
+def first_row_orders(row, width):
+    """Return the smallest clue pattern the columns of row can be
+    ordered into, and all the column orders that give it.
+
+    Stacks go in order of their number of clues, and the open squares
+    of a stack before its clues."""
+    stacks = []
+    for s in range(width):
+        cols = range(s * width, (s + 1) * width)
+        stacks.append(([c for c in cols if not row[c]], [c for c in cols if row[c]]))
+    order = sorted(range(width), key=lambda s: len(stacks[s][1]))
+    pattern = []
+    for s in order:
+        pattern += [0] * len(stacks[s][0]) + [1] * len(stacks[s][1])
+    # stacks with the same number of clues can swap places
+    groups = [list(g) for k, g in itertools.groupby(order, key=lambda s: len(stacks[s][1]))]
+    inner = [[a + b for a in itertools.permutations(stacks[s][0])
+              for b in itertools.permutations(stacks[s][1])] for s in range(width)]
+    orders = []
+    for stack_order in itertools.product(*[itertools.permutations(g) for g in groups]):
+        stack_order = [s for g in stack_order for s in g]
+        for cols in itertools.product(*[inner[s] for s in stack_order]):
+            orders.append(tuple(c for stack in cols for c in stack))
+    return tuple(pattern), orders
+
+
+def minlex(rows, group_size):
+    """Return the minlex form, or None if more than MINLEX_MAX_STATES
+    variants tie on the way."""
+    n = group_size
+    w = int(math.sqrt(n))
+    columns = tuple(zip(*rows))
+    # settle the first row by its clue pattern
+    best = None
+    states = []
+    for grid in (rows, columns):
+        for r in range(n):
+            pattern, orders = first_row_orders(grid[r], w)
+            if best is None or pattern < best:
+                best = pattern
+                states = []
+            if pattern == best:
+                states.extend((grid, cols, (r,)) for cols in orders)
+    if len(states) > MINLEX_MAX_STATES:
+        return None
+    # then every further row, keeping the variants that tie
+    for k in range(1, n):
+        best = None
+        next_states = []
+        for grid, cols, order in states:
+            if k % w:
+                band = order[-1] // w
+                candidates = [r for r in range(band * w, (band + 1) * w) if r not in order]
+            else:
+                used = set(r // w for r in order)
+                candidates = [r for r in range(n) if r // w not in used]
+            labels = {}
+            for r in order:
+                for c in cols:
+                    v = grid[r][c]
+                    if v and v not in labels:
+                        labels[v] = len(labels) + 1
+            for r in candidates:
+                row = []
+                new = dict(labels)
+                for c in cols:
+                    v = grid[r][c]
+                    if v:
+                        if v not in new:
+                            new[v] = len(new) + 1
+                        row.append(new[v])
+                    else:
+                        row.append(0)
+                row = tuple(row)
+                if best is None or row < best:
+                    best = row
+                    next_states = []
+                if row == best:
+                    next_states.append((grid, cols, order + (r,)))
+        states = next_states
+        if len(states) > MINLEX_MAX_STATES:
+            return None
+    grid, cols, order = states[0]
+    return relabel([[grid[r][c] for c in cols] for r in order])
+
+
+def sorted_form(rows, group_size):
+    """The weaker form used for large grids."""
+    n = group_size
+    w = int(math.sqrt(n))
+    forms = []
+    for grid in (rows, tuple(zip(*rows))):
+        row_clues = [sum(1 for v in row if v) for row in grid]
+        col_clues = [sum(1 for v in col if v) for col in zip(*grid)]
+        row_order = lines_by_clues(row_clues, w)
+        col_order = lines_by_clues(col_clues, w)
+        forms.append(relabel([[grid[r][c] for c in col_order] for r in row_order]))
+    return min(forms)
+
+
+def lines_by_clues(clues, width):
+    """Order the bands (or stacks) and their lines by number of clues."""
+    bands = sorted(range(width), key=lambda b: sum(clues[b * width:(b + 1) * width]))
+    return [line for b in bands
+            for line in sorted(range(b * width, (b + 1) * width), key=lambda i: clues[i])]
+
+
+def canonical_form(puzzle, group_size):
+    """Return the canonical form of a puzzle as a tuple of cells, row by
+    row; see the module docstring."""
+    rows = puzzle_rows(puzzle, group_size)
+    if group_size <= MINLEX_MAX_GROUP_SIZE:
+        form = minlex(rows, group_size)
+        if form is not None:
+            return form
+    return sorted_form(rows, group_size)
+
+
+def puzzle_key(puzzle, group_size):
+    """Return a short hash of the canonical form of a puzzle."""
+    form = bytes(canonical_form(puzzle, group_size))
+    return hashlib.blake2b(form, digest_size=8).hexdigest()
+
+
+class PuzzleIndex:
+    """The puzzles seen so far, by puzzle_key(), with their ratings.
+
+    A rating is anything with a value and value_string(), or a (value,
+    guesses, backtraces, squares_filled) tuple like in
+    generate_puzzle_data(), which rating() turns into a RatingSummary."""
+
+    def __init__(self, group_size):
+        self.group_size = group_size
+        self.ratings = {}
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def key(self, puzzle):
+        return puzzle_key(puzzle, self.group_size)
+
+    def add(self, puzzle, rating=None, key=None):
+        """Remember a puzzle; returns False if it was seen before."""
+        if key is None:
+            key = self.key(puzzle)
+        if key in self.ratings:
+            return False
+        self.ratings[key] = rating
+        return True
+
+    def seen(self, puzzle):
+        return self.key(puzzle) in self.ratings
+
+    def rating(self, puzzle, key=None):
+        """Return the RatingSummary of a puzzle seen before, or None."""
+        if key is None:
+            key = self.key(puzzle)
+        rating = self.ratings.get(key)
+        if isinstance(rating, tuple):
+            return RatingSummary(*rating)
+        return rating
@@ -0,0 +1,142 @@
+"""Render a PDF in chunks on several processes and merge them.
+
+The pages main.createPDF draws, puzzle pages first and solution pages
+after them, are cut into chunks of whole pages. Every chunk is drawn
+into a temporary PDF by a worker process, and the chunks are joined in
+order into the final file. Page numbers and puzzle numbers are handed to
+the printpuzzles functions explicitly, so they come out the same as in
+a single-process render.
+
+Puzzle pages are sent to the workers as soon as a chunk of them is
+there, so rendering overlaps with generation when puzzles come from
+iter_puzzles().
+
+Merging needs pypdf, which is only imported here:
+
+    pip install pypdf
+"""
+import itertools
+import multiprocessing
+import os
+import tempfile
+from reportlab.pdfgen import canvas
+from Generator.sudoku_solver import SudokuGrid, RatingSummary
+from Generator.sudoku_maker import PuzzleRecord
+from Generator.printpuzzles import generate_single_pdf, generate_four_pdf, generate_six_pdf, \
+    generateSolutions, solutions_per_page, board_sizes
+
+PAGES_PER_CHUNK = 20
+
+
+def require_pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        raise ImportError('Rendering with more than one worker needs pypdf: pip install pypdf')
+    return pypdf
+
+
+def record_data(record, with_puzzle=True):
+    """Return what the renderers need of a PuzzleRecord as plain data,
+    so it is cheap to send to a worker process."""
+    puzzle = record.puzzle.to_string() if with_puzzle else None
+    return puzzle, record.rating.value, record.solution.to_string(), record.solution.group_size
+
+
+def record_from_render_data(data):
+    puzzle, value, solution, group_size = data
+    if puzzle is not None:
+        puzzle = SudokuGrid(puzzle, group_size=group_size)
+    return PuzzleRecord(puzzle, RatingSummary(value),
+                        SudokuGrid(solution, group_size=group_size))
+
+
+def render_chunk(job):
+    """Draw one chunk, a (path, config, pages, last) job, into the PDF
+    at path.
+
+    pages holds ('puzzles', pagenum, data) entries for puzzle pages and
+    ('solutions', first_number, doc_page_number, data) entries for runs
+    of solution pages; data is a list of record_data() tuples."""
+    path, config, pages, last = job
+    per_page = config['SUDOKUS_PER_PAGE']
+    doc = canvas.Canvas(filename=path, pagesize=config.page_size)
+    for page in pages:
+        if page[0] == 'puzzles':
+            kind, pagenum, data = page
+            plist = [record_from_render_data(d) for d in data]
+            if per_page == 1:
+                generate_single_pdf(plist[0], board_sizes(plist[0][0]), doc, pagenum, config)
+            elif per_page == 4:
+                generate_four_pdf(doc, pagenum, plist, config)
+            elif per_page == 6:
+                generate_six_pdf(doc, pagenum, plist, config)
+            doc.showPage()
+        else:
+            kind, first_number, doc_page_number, data = page
+            solutions = [record_from_render_data(d) for d in data]
+            generateSolutions(doc, solutions, doc_page_number, config, first_number)
+            # generateSolutions ends every full page itself; the last
+            # page is ended the way createPDF does it
+            if last:
+                doc.showPage()
+    doc.save()
+    return path
+
+
+def merge(paths, output_file):
+    """Join the PDFs at paths into output_file, a path or a binary file
+    object."""
+    pypdf = require_pypdf()
+    writer = pypdf.PdfWriter()
+    for path in paths:
+        writer.append(path)
+    writer.write(output_file)
+    writer.close()
+
+
+def create_pdf(output_file, puzzles, config, workers=2, pages_per_chunk=PAGES_PER_CHUNK):
+    """Like main.createPDF, drawing chunks of pages_per_chunk pages on
+    workers processes."""
+    per_page = config['SUDOKUS_PER_PAGE']
+    show_solutions = config['SHOW_SOLUTIONS']
+    if per_page not in (1, 4, 6):
+        return
+    require_pypdf()
+    puzzles = iter(puzzles)
+    solutions = []
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, multiprocessing.Pool(workers) as pool:
+        def submit(pages, last=False):
+            path = os.path.join(tmp, 'chunk_%05d.pdf' % len(results))
+            results.append(pool.apply_async(render_chunk, ((path, config, pages, last),)))
+
+        pagenum = 0
+        while 1:
+            chunk = []
+            for i in range(pages_per_chunk):
+                plist = list(itertools.islice(puzzles, per_page))
+                if not plist:
+                    break
+                pagenum += 1
+                chunk.append(('puzzles', pagenum, [record_data(p) for p in plist]))
+                if show_solutions:
+                    solutions.extend(record_data(p, with_puzzle=False) for p in plist)
+            if chunk:
+                submit(chunk)
+            if len(chunk) < pages_per_chunk:
+                break
+
+        if show_solutions and solutions:
+            # solution chunks start on a page boundary, so the numbering
+            # generateSolutions does on its own carries on correctly
+            per_solution_page = solutions_per_page(config)
+            step = per_solution_page * pages_per_chunk
+            for start in range(0, len(solutions), step):
+                submit([('solutions', start + 1, pagenum + start // per_solution_page,
+                         solutions[start:start + step])],
+                       last=start + step >= len(solutions))
+
+        print('Rendering %s chunks on %s processes...' % (len(results), workers))
+        paths = [result.get() for result in results]
+        merge(paths, output_file)
@@ -0,0 +1,167 @@
+"""Exact-cover solution counting for Sudoku grids.
+
+A Sudoku is an exact-cover problem: every placement "digit d in square
+(x, y)" covers four constraints (the square is filled, the row, the
+column and the box contain d) and a solution covers each constraint
+exactly once. We search it with Knuth's Algorithm X, using dicts of
+sets in place of the linked lists of Dancing Links, and stop as soon as
+we have seen as many solutions as the caller asked for.
+"""
+import math
+from Generator import mask_search
+
+CELL = 0
+ROW = 1
+COLUMN = 2
+BOX = 3
+
+# Larger grids are checked by mask_search, whose stronger propagation
+# pays off there.
+MAX_GROUP_SIZE = 9
+
+
+class ExactCoverTables:
+    """Placement and constraint numbering shared by all grids of a size.
+
+    Placement (x, y, val) is number (y * group_size + x) * group_size +
+    val - 1; constraints[p] lists the four constraints it covers."""
+
+    def __init__(self, group_size):
+        n = group_size
+        width = int(math.sqrt(n))
+        nn = n * n
+        self.group_size = n
+        self.nconstraints = 4 * nn
+        self.constraints = []
+        for y in range(n):
+            for x in range(n):
+                b = (x // width) * width + y // width
+                for val in range(1, n + 1):
+                    self.constraints.append((CELL * nn + y * n + x,
+                                             ROW * nn + y * n + val - 1,
+                                             COLUMN * nn + x * n + val - 1,
+                                             BOX * nn + b * n + val - 1))
+
+
+tables_by_size = {}
+
+
+def get_tables(group_size):
+    tables = tables_by_size.get(group_size)
+    if tables is None:
+        tables = tables_by_size[group_size] = ExactCoverTables(group_size)
+    return tables
+
+
+def build_problem(grid, group_size):
+    """Return the (X, Y) exact-cover structure for the open part of grid.
+
+    X maps each unsatisfied constraint to the set of placements that
+    satisfy it, Y maps placements to their constraints. Returns None if
+    the clues already contradict each other or leave a constraint that
+    nothing can satisfy."""
+    n = group_size
+    Y = get_tables(n).constraints
+    filled = set()
+    open_cells = []
+    p = 0
+    for row in grid:
+        for val in row:
+            if val:
+                for c in Y[p + int(val) - 1]:
+                    if c in filled:
+                        return None
+                    filled.add(c)
+            else:
+                open_cells.append(p)
+            p += n
+    X = {}
+    for start in open_cells:
+        for p in range(start, start + n):
+            constraints = Y[p]
+            if (constraints[1] in filled or constraints[2] in filled or
+                    constraints[3] in filled):
+                continue
+            for c in constraints:
+                if c in X:
+                    X[c].add(p)
+                else:
+                    X[c] = {p}
+    if len(X) + len(filled) < 4 * n * n:
+        return None
+    return X, Y
+
+
+def select(X, Y, r):
+    cols = []
+    for j in Y[r]:
+        for i in X[j]:
+            for k in Y[i]:
+                if k != j:
+                    X[k].remove(i)
+        cols.append(X.pop(j))
+    return cols
+
+
+def deselect(X, Y, r, cols):
+    for j in reversed(Y[r]):
+        X[j] = cols.pop()
+        for i in X[j]:
+            for k in Y[i]:
+                if k != j:
+                    X[k].add(i)
+
+
+def search(X, Y, partial, found, limit):
+    """Depth-first search; returns True once limit solutions are found."""
+    if not X:
+        found.append(list(partial))
+        return len(found) >= limit
+    best_len = None
+    for c, rows in X.items():
+        if best_len is None or len(rows) < best_len:
+            best, best_len = c, len(rows)
+            if best_len < 2:
+                break
+    if not best_len:
+        return False
+    for r in list(X[best]):
+        partial.append(r)
+        cols = select(X, Y, r)
+        if search(X, Y, partial, found, limit):
+            return True
+        deselect(X, Y, r, cols)
+        partial.pop()
+    return False
+
+
+def find_solutions(grid, group_size=9, limit=2):
+    """Return up to limit solutions of grid, each as a tuple of rows."""
+    problem = build_problem(grid, group_size)
+    if problem is None:
+        return []
+    X, Y = problem
+    found = []
+    search(X, Y, [], found, limit)
+    n = group_size
+    solutions = []
+    for placements in found:
+        solution = [[int(val) for val in row] for row in grid]
+        for p in placements:
+            cell, val = divmod(p, n)
+            solution[cell // n][cell % n] = val + 1
+        solutions.append(tuple(tuple(row) for row in solution))
+    return solutions
+
+
+def check_unique(grid, group_size=9):
+    """Return (unique, solution) for grid.
+
+    The search stops at the second solution. solution is the first
+    solution found, or None if the grid cannot be solved."""
+    if group_size > MAX_GROUP_SIZE:
+        return mask_search.check_unique(grid, group_size)
+    solutions = find_solutions(grid, group_size, 2)
+    if not solutions:
+        return False, None
+    return len(solutions) == 1, solutions[0]
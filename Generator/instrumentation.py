@@ -0,0 +1,121 @@
+"""Opt-in counters, stage timers and profiling hooks.
+
+Instrumentation is off by default. The solver and generator check the
+module-level `enabled` flag before counting anything, so when it is off
+a counter costs one attribute lookup:
+
+    if instrumentation.enabled:
+        instrumentation.count('solver.guesses')
+
+Turn it on with enable(), read the numbers with snapshot() or write
+them with dump(). Counters live in the current process only; puzzles
+generated by worker processes are not counted.
+
+profile() wraps a block in cProfile or tracemalloc and writes a report:
+
+    with instrumentation.profile('cprofile', 'run.prof.txt'):
+        make_puzzles(...)
+"""
+import cProfile
+import collections
+import contextlib
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+enabled = False
+counters = collections.Counter()
+# stage name -> [calls, seconds]
+timings = {}
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    counters.clear()
+    timings.clear()
+
+
+def count(name, n=1):
+    if enabled:
+        counters[name] += n
+
+
+# what stage() hands out while instrumentation is off, shared by all
+# calls so a disabled stage costs no generator per block
+NO_STAGE = contextlib.nullcontext()
+
+
+def stage(name):
+    """Time a block as one call of stage name."""
+    if not enabled:
+        return NO_STAGE
+    return timed_stage(name)
+
+
+@contextlib.contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        calls_seconds = timings.setdefault(name, [0, 0.0])
+        calls_seconds[0] += 1
+        calls_seconds[1] += elapsed
+
+
+def snapshot():
+    """Return the counters and stage timings as plain dicts."""
+    return {'counters': dict(sorted(counters.items())),
+            'stages': dict((name, {'calls': calls, 'seconds': seconds})
+                           for name, (calls, seconds) in sorted(timings.items()))}
+
+
+def dump(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+@contextlib.contextmanager
+def profile(kind, path, limit=40):
+    """Run a block under cProfile or tracemalloc and write a text report
+    of the top limit entries to path."""
+    if kind not in PROFILERS:
+        raise ValueError('Unknown profiler %r' % (kind,))
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats('cumulative').print_stats(limit)
+            with open(path, 'w') as f:
+                f.write(report.getvalue())
+    else:
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            memory = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(path, 'w') as f:
+                f.write('current %d bytes, peak %d bytes\n\n' % (current, peak))
+                for stat in memory.statistics('lineno')[:limit]:
+                    f.write('%s\n' % stat)
@@ -0,0 +1,223 @@
+"""Solution counting with strong propagation, for the larger grids.
+
+Every square is a bitmask of the digits it can still take (bit v - 1
+for digit v). After each placement we propagate until nothing changes:
+
+* naked singles: a square with one digit left removes it from its peers
+* hidden singles: a digit with one place left in a unit goes there
+* pointing and claiming: if, inside a box, a digit is confined to one
+  row or column, it can't go anywhere else in that row or column, and
+  the other way round
+* naked pairs: two squares of a unit with the same two digits left take
+  those digits from the rest of the unit
+
+and only then branch on the square with the fewest digits left. On
+16x16 and 25x25 grids this keeps the search tree to a few dozen nodes
+where the exact-cover search (exact_cover.py) visits tens of thousands;
+on 9x9 the lighter exact-cover search is faster.
+"""
+import math
+import random
+
+
+class Contradiction(Exception):
+    pass
+
+
+class MaskSearchTables:
+    """Units, peers and box/line intersections for one grid size.
+
+    Squares are numbered y * group_size + x."""
+
+    def __init__(self, group_size):
+        n = group_size
+        w = int(math.sqrt(n))
+        self.group_size = n
+        self.full_mask = (1 << n) - 1
+        rows = [[y * n + x for x in range(n)] for y in range(n)]
+        cols = [[y * n + x for y in range(n)] for x in range(n)]
+        boxes = [[(by * w + iy) * n + bx * w + ix
+                  for iy in range(w) for ix in range(w)]
+                 for by in range(w) for bx in range(w)]
+        self.units = [tuple(unit) for unit in rows + cols + boxes]
+        peers = [set() for i in range(n * n)]
+        for unit in self.units:
+            for i in unit:
+                peers[i].update(unit)
+        for i, p in enumerate(peers):
+            p.discard(i)
+        self.peers = [tuple(sorted(p)) for p in peers]
+        # (intersection, rest of the box, rest of the line)
+        self.intersections = []
+        for box in boxes:
+            for line in rows + cols:
+                inter = [i for i in line if i in box]
+                if inter:
+                    self.intersections.append((
+                        tuple(inter),
+                        tuple(i for i in box if i not in inter),
+                        tuple(i for i in line if i not in inter)))
+
+
+tables_by_size = {}
+
+
+def get_tables(group_size):
+    tables = tables_by_size.get(group_size)
+    if tables is None:
+        tables = tables_by_size[group_size] = MaskSearchTables(group_size)
+    return tables
+
+
+def eliminate(masks, squares, digits, queue):
+    """Take digits from squares, queueing squares that get down to one
+    digit."""
+    for i in squares:
+        m = masks[i]
+        if m & digits:
+            m &= ~digits
+            if not m:
+                raise Contradiction
+            masks[i] = m
+            if not m & (m - 1):
+                queue.append(i)
+
+
+def propagate(masks, tables, queue):
+    """Propagate the singles in queue and everything that follows from
+    them, see the module docstring. Raises Contradiction if a square or
+    a unit runs out of digits."""
+    peers = tables.peers
+    full = tables.full_mask
+    while 1:
+        while queue:
+            i = queue.pop()
+            eliminate(masks, peers[i], masks[i], queue)
+        for unit in tables.units:
+            once = twice = 0
+            for i in unit:
+                m = masks[i]
+                twice |= once & m
+                once |= m
+            if once != full:
+                raise Contradiction
+            hidden = once & ~twice
+            if hidden:
+                for i in unit:
+                    m = masks[i] & hidden
+                    if m and masks[i] != m:
+                        if m & (m - 1):
+                            raise Contradiction
+                        masks[i] = m
+                        queue.append(i)
+        if queue:
+            continue
+        for inter, box_rest, line_rest in tables.intersections:
+            inside = box_mask = line_mask = 0
+            for i in inter:
+                inside |= masks[i]
+            for i in box_rest:
+                box_mask |= masks[i]
+            for i in line_rest:
+                line_mask |= masks[i]
+            # pointing: digits the box only has here leave the line
+            pointing = inside & ~box_mask & line_mask
+            if pointing:
+                eliminate(masks, line_rest, pointing, queue)
+            # claiming: digits the line only has here leave the box
+            claiming = inside & ~line_mask & box_mask
+            if claiming:
+                eliminate(masks, box_rest, claiming, queue)
+        if queue:
+            continue
+        changed = False
+        for unit in tables.units:
+            pairs = {}
+            for i in unit:
+                m = masks[i]
+                rest = m & (m - 1)
+                if rest and not rest & (rest - 1):  # two digits left
+                    if m in pairs:
+                        others = [j for j in unit if j != i and j != pairs[m]
+                                  and masks[j] & m]
+                        if others:
+                            eliminate(masks, others, m, queue)
+                            changed = True
+                    else:
+                        pairs[m] = i
+        if not changed:
+            return
+
+
+def search(masks, tables, found, limit, rng=None):
+    """Depth-first search; returns True once limit solutions are found.
+
+    With rng the digits of a square are tried in random order."""
+    best = None
+    best_count = tables.group_size + 1
+    for i, m in enumerate(masks):
+        if m & (m - 1):
+            count = bin(m).count('1')
+            if count < best_count:
+                best, best_count = i, count
+                if count == 2:
+                    break
+    if best is None:
+        found.append(masks)
+        return len(found) >= limit
+    m = masks[best]
+    digits = []
+    while m:
+        digit = m & -m
+        digits.append(digit)
+        m ^= digit
+    if rng is not None:
+        rng.shuffle(digits)
+    for digit in digits:
+        branch = list(masks)
+        branch[best] = digit
+        try:
+            propagate(branch, tables, [best])
+        except Contradiction:
+            continue
+        if search(branch, tables, found, limit, rng):
+            return True
+    return False
+
+
+def find_solutions(grid, group_size, limit=2, rng=None):
+    """Return up to limit solutions of grid, each as a tuple of rows."""
+    n = group_size
+    tables = get_tables(n)
+    masks = []
+    queue = []
+    for y, row in enumerate(grid):
+        for x, val in enumerate(row):
+            if val:
+                masks.append(1 << (int(val) - 1))
+                queue.append(y * n + x)
+            else:
+                masks.append(tables.full_mask)
+    try:
+        propagate(masks, tables, queue)
+    except Contradiction:
+        return []
+    found = []
+    search(masks, tables, found, limit, rng)
+    return [tuple(tuple(masks[y * n + x].bit_length() for x in range(n))
+                  for y in range(n))
+            for masks in found]
+
+
+def check_unique(grid, group_size):
+    """Return (unique, solution) for grid, like exact_cover.check_unique."""
+    solutions = find_solutions(grid, group_size, 2)
+    if not solutions:
+        return False, None
+    return len(solutions) == 1, solutions[0]
+
+
+def random_solution(group_size, rng=random):
+    """Return a random solved grid as a tuple of rows."""
+    empty = [[0] * group_size for i in range(group_size)]
+    return find_solutions(empty, group_size, 1, rng)[0]
@@ -0,0 +1,109 @@
+"""Cheap tests that prove a candidate puzzle has more than one solution.
+
+Candidates come in batches: an (N, group_size, group_size) array with 0
+for open squares, all cut from the same solution. Each filter returns a
+bool array of the candidates it rejects, and every rejection is a proof
+of a second solution, so no unique puzzle is ever lost:
+
+* too_few_digits: with two digits missing from the clues, swapping
+  them everywhere in the solution gives another one
+* empty_lines: two rows of the same band without clues can swap places
+  in the solution, and so can two empty columns of the same stack
+* open_rectangles: four squares on two rows and two columns, in two
+  boxes, whose solution reads a b / b a, can take b a / a b instead.
+  The known solution tells us where these rectangles are; if none of
+  their squares is a clue, the puzzle isn't unique
+
+Each one costs O(squares) per candidate. PrefilterChain runs them in
+order, each on what the ones before let through. With instrumentation
+on, the counters prefilter.<name>.checked and prefilter.<name>.rejected
+tell how many candidates each one saw and rejected.
+"""
+import functools
+import math
+import numpy as np
+from Generator import instrumentation
+
+
+def too_few_digits(grids, solution, group_size):
+    n = group_size
+    present = (grids[..., None] == np.arange(1, n + 1, dtype=grids.dtype)).any(axis=(1, 2))
+    return present.sum(axis=1) < n - 1
+
+
+def empty_lines(grids, solution, group_size):
+    n = group_size
+    w = int(math.sqrt(n))
+    filled = grids != 0
+    # empty rows and columns per band and stack
+    empty_rows = (~filled.any(axis=2)).reshape(-1, w, w).sum(axis=2)
+    empty_cols = (~filled.any(axis=1)).reshape(-1, w, w).sum(axis=2)
+    return (empty_rows >= 2).any(axis=1) | (empty_cols >= 2).any(axis=1)
+
+
+@functools.lru_cache(maxsize=16)
+def rectangles(solution_bytes, group_size):
+    """Return the squares (y * group_size + x) of the swappable
+    rectangles of a solution as an (R, 4) array."""
+    n = group_size
+    w = int(math.sqrt(n))
+    solution = np.frombuffer(solution_bytes, dtype=np.int8).reshape(n, n)
+    found = []
+    for lines, index in ((solution, lambda a, b: (a * n + b)),
+                         (solution.T, lambda a, b: (b * n + a))):
+        for start in range(0, n, w):
+            for r1 in range(start, start + w):
+                for r2 in range(r1 + 1, start + w):
+                    # where in line r2 each digit of line r1 sits
+                    where = np.argsort(lines[r2])[lines[r1] - 1]
+                    for c1 in range(n):
+                        c2 = where[c1]
+                        if c1 < c2 and lines[r1][c2] == lines[r2][c1]:
+                            found.append((index(r1, c1), index(r1, c2),
+                                          index(r2, c1), index(r2, c2)))
+    return np.array(found, dtype=np.intp).reshape(-1, 4)
+
+
+def open_rectangles(grids, solution, group_size):
+    rects = rectangles(np.asarray(solution, dtype=np.int8).tobytes(), group_size)
+    if not len(rects):
+        return np.zeros(len(grids), dtype=bool)
+    open_squares = (grids == 0).reshape(len(grids), -1)
+    return open_squares[:, rects].all(axis=2).any(axis=1)
+
+
+class Prefilter:
+    def __init__(self, name, test):
+        self.name = name
+        self.test = test
+
+
+class PrefilterChain:
+    """Filters run in order; see the module docstring. Every
+    SudokuGenerator makes its own chain unless it is given one."""
+
+    def __init__(self, filters=None):
+        if filters is None:
+            filters = [Prefilter('too_few_digits', too_few_digits),
+                       Prefilter('empty_lines', empty_lines),
+                       Prefilter('open_rectangles', open_rectangles)]
+        self.filters = list(filters)
+
+    def add(self, name, test):
+        """Append a filter, test(grids, solution, group_size) -> bool
+        array of the candidates to reject."""
+        self.filters.append(Prefilter(name, test))
+
+    def keep(self, grids, solution, group_size):
+        """Return a bool array of the candidates no filter rejects."""
+        keep = np.ones(len(grids), dtype=bool)
+        for prefilter in self.filters:
+            left = np.flatnonzero(keep)
+            if not len(left):
+                break
+            rejected = prefilter.test(grids[left], solution, group_size)
+            keep[left[rejected]] = False
+            if instrumentation.enabled:
+                instrumentation.count('prefilter.%s.checked' % prefilter.name, len(left))
+                instrumentation.count('prefilter.%s.rejected' % prefilter.name, int(rejected.sum()))
+        return keep
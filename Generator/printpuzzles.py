@@ -1,66 +1,124 @@
 import os
-import json
-from Generator.sudoku_solver import SudokuRater
-from conf import ROOT_DIR, PAGE_SIZE, get_din_size
+import math
+from conf import ROOT_DIR
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 # Custom Font Warning: if glyphs are missing, suppress warnings = 0, don't supress warnings = 1
 import reportlab.rl_config
 reportlab.rl_config.warnOnMissingFontGlyphs = 0
 
-with open('settings.json') as f:
-    json_data = json.load(f)
-
 # Custom fonts folder
 folder = ROOT_DIR + os.sep + 'fonts'
 
-# set default font if no custom font given
-if json_data['CUSTOM_FONT'] == '':
-    font = 'Helvetica'
-else:
-    font = json_data['CUSTOM_FONT']
+# CUSTOM_FONT -> font name to draw with, filled as fonts are registered
+registered_fonts = {}
+
 
-# Check if custom font exists, then register it
-if font != 'Helvetica':
+def custom_font(config):
+    """Return the font for the custom text, registering CUSTOM_FONT with
+    ReportLab the first time it is asked for."""
+    # set default font if no custom font given
+    font = config['CUSTOM_FONT'] or 'Helvetica'
+    if font == 'Helvetica':
+        return font
+    if font not in registered_fonts:
+        # Check if custom font exists, then register it
         fontRegular = os.path.join(folder, font + '.ttf')
         if (os.path.exists(fontRegular)):
             pdfmetrics.registerFont(TTFont(font, fontRegular))
+            registered_fonts[font] = font
         else:
             print("Font File doesn't exist. Fallback to default font.")
-            font = 'Helvetica'
+            registered_fonts[font] = 'Helvetica'
+    return registered_fonts[font]
+
+
+def page_geometry(config):
+    """Return page width and height in points and the DIN width and
+    height in mm."""
+    page_width, page_height = config.page_size
+    din_width, din_height = config.din_size
+    return page_width, page_height, din_width, din_height
 
-# PDF page size settings
-PAGE_WIDTH, PAGE_HEIGHT=PAGE_SIZE
-din_width, din_height = get_din_size(PAGE_SIZE)
 
+def board_sizes(puzzle):
+    """Return [box width, box height, grid size] for a SudokuGrid."""
+    width = int(math.sqrt(puzzle.group_size))
+    return [width, width, puzzle.group_size]
 
-def generate_single_pdf(puzzle, sizes, page, pagenum):
+
+def board_font_size(font_size, gridwidth):
+    """Digits get smaller on the larger grids."""
+    if gridwidth > 3:
+        font_size = font_size - (gridwidth * 2)
+    return font_size
+
+
+def draw_page_number(page, page_count, font_size, config):
+    """Draw the page number; once per page, font_size is the board font
+    size it is centred for."""
+    page_width, page_height, din_width, din_height = page_geometry(config)
+    page_number_font_size = round(8 * (((din_width + din_height) / 2) / 100))
+    page_number_position = 62
+    if din_width < 210:
+        page_number_position = page_height * 0.04375 + (page_height * 0.04375 / 2)
+    page.setFont("Helvetica", page_number_font_size)
+    page.drawString(page_width / 2 - font_size / 4, page_number_position, str(page_count))
+
+
+def grid_form(page, size, selfsizes, thin_line, thick_line):
+    """Return the name of a form XObject with the grid lines of a board.
+
+    The lines of every grid style (grid size, board size, line widths)
+    are written to the PDF once and every board of that style refers to
+    them, instead of repeating the same lines on every board."""
+    gridwidth, gridheight, gridsize = selfsizes
+    name = ('Grid_%d_%d_%.2f_%.2f_%.2f' % (gridsize, gridwidth, size, thin_line, thick_line)).replace('.', '_')
+    if page.hasForm(name):
+        return name
+
+    # the form is drawn with its bottom left corner at the origin
+    box_height = size / gridsize
+    page.beginForm(name, -thick_line, -thick_line, size + thick_line, size + thick_line)
+    for i in range(0, gridsize + 1):
+        squared_grid_size = i % gridwidth
+
+        if squared_grid_size == 0:
+            page.setLineWidth(thick_line)
+        else:
+            page.setLineWidth(thin_line)
+        page.line(0, size - i * box_height, size, size - i * box_height)
+        page.line(i * box_height, size, i * box_height, 0)
+    page.endForm()
+    return name
+
+
+def generate_single_pdf(puzzle, sizes, page, pagenum, config):
     selfsizes = sizes
+    page_width, page_height, din_width, din_height = page_geometry(config)
 
-    top = PAGE_HEIGHT - (PAGE_HEIGHT * 0.175)  # 144
-    left = PAGE_HEIGHT * 0.0875
-    size = PAGE_WIDTH - (PAGE_HEIGHT * 0.175)  # 144
-    font_size = round(json_data['FONT_SIZE_SINGLE_PAGE'] * (((din_width + din_height) / 2) / 100))
+    top = page_height - (page_height * 0.175)  # 144
+    left = page_height * 0.0875
+    size = page_width - (page_height * 0.175)  # 144
+    font_size = round(config['FONT_SIZE_SINGLE_PAGE'] * (((din_width + din_height) / 2) / 100))
 
     # print current progress
     print("Currently working on drawing a puzzle on page " + str(pagenum) + "...")
 
-    draw_board(page, puzzle, pagenum, top, left, size, selfsizes, font_size, pagenum)
+    draw_board(page, puzzle, pagenum, top, left, size, selfsizes, config, font_size, pagenum)
+    draw_page_number(page, pagenum, board_font_size(font_size, selfsizes[0]), config)
 
     return puzzle
 
 
-def generate_four_pdf(page, pagenum, puzzles):
-    inch = PAGE_HEIGHT * 0.0875  # 72
-    top = PAGE_HEIGHT - (PAGE_HEIGHT * 0.04375)  # 36
-    left = PAGE_HEIGHT * 0.075
-    size = (PAGE_WIDTH - (PAGE_HEIGHT * 0.19)) / 2
+def generate_four_pdf(page, pagenum, puzzles, config):
+    page_width, page_height, din_width, din_height = page_geometry(config)
+    inch = page_height * 0.0875  # 72
+    top = page_height - (page_height * 0.04375)  # 36
+    left = page_height * 0.075
+    size = (page_width - (page_height * 0.19)) / 2
 
-    # todo: get data per puzzle
-    board_size = [3, 3, 9]
-    selfsizes = board_size
-    font_size = round(json_data['FONT_SIZE_4_PAGE'] * (((din_width + din_height) / 2) / 100))
-    box_height = size / board_size[2]
+    font_size = round(config['FONT_SIZE_4_PAGE'] * (((din_width + din_height) / 2) / 100))
 
     coords = [
         (top - inch * 1, left),
@@ -74,34 +132,30 @@ def generate_four_pdf(page, pagenum, puzzles):
 
     for i, puzzle in enumerate(puzzles):
         sudoku_index = pagenum * 4 - 3 + i
-        draw_board(page, puzzle, sudoku_index, coords[i][0], coords[i][1], size, selfsizes, font_size, pagenum)
+        selfsizes = board_sizes(puzzle[0])
+        draw_board(page, puzzle, sudoku_index, coords[i][0], coords[i][1], size, selfsizes, config, font_size, pagenum)
         i += 1
 
+    draw_page_number(page, pagenum, board_font_size(font_size, selfsizes[0]), config)
 
-def generate_six_pdf(page, pagenum, puzzles):
-    inch = PAGE_HEIGHT * 0.0875  # 72
-    top = PAGE_HEIGHT
+
+def generate_six_pdf(page, pagenum, puzzles, config):
+    page_width, page_height, din_width, din_height = page_geometry(config)
+    inch = page_height * 0.0875  # 72
+    top = page_height
     # if din_width < 210:
-    #     top = PAGE_HEIGHT - PAGE_HEIGHT * 0.04375
-    left = PAGE_HEIGHT * 0.04375  # 36
-    size = (PAGE_WIDTH - inch * 1.5) / 2.5
+    #     top = page_height - page_height * 0.04375
+    left = page_height * 0.04375  # 36
+    size = (page_width - inch * 1.5) / 2.5
     top_medium = inch - (left / 2)
     right = left + size
     bottom = top - size
-    font_size = round(json_data['FONT_SIZE_6_PAGE'] * (((din_width + din_height) / 2) / 100))
-
-    # todo: get data per puzzle
-    board_size = [3,3,9]
-    # for i, puzzle in enumerate(puzzles):
-    #     board_size = puzzle.get_board_sizes()
-
-    box_height = size / board_size[2]
+    font_size = round(config['FONT_SIZE_6_PAGE'] * (((din_width + din_height) / 2) / 100))
 
     # font_size = 24
     # if board_size[0] > 3:
     #     font_size = font_size - (board_size[0] * 2)
 
-    selfsizes = board_size
     # page_data = [top, left, right, bottom, box_height, font_size]
 
     col = row = 0
@@ -109,14 +163,15 @@ def generate_six_pdf(page, pagenum, puzzles):
     for p, puzzle in enumerate(puzzles):
         sudoku_index = pagenum * 6 - 5 + i
         i += 1
+        selfsizes = board_sizes(puzzle[0])
 
         # print current progress
         print("Currently working on puzzle solutions... " + str(p + 1))
 
-        # draw_board(page, sudoku_index, PAGE_HEIGHT - 54 - row * 72 * 3.25, 72 + col * 72 * 3.5, 72 * 2.75, puzzle,
-        #            selfsizes, json_data['FONT_SIZE_6_PAGE'], pagenum)
-        draw_board(page, puzzle, sudoku_index, PAGE_HEIGHT - top_medium - row * (PAGE_HEIGHT * 0.0875) * 3.25,
-                   (PAGE_HEIGHT * 0.0875) + col * (PAGE_HEIGHT * 0.0875) * 3.5, (PAGE_HEIGHT * 0.0875) * 2.75, selfsizes, font_size, pagenum)
+        # draw_board(page, sudoku_index, page_height - 54 - row * 72 * 3.25, 72 + col * 72 * 3.5, 72 * 2.75, puzzle,
+        #            selfsizes, config['FONT_SIZE_6_PAGE'], pagenum)
+        draw_board(page, puzzle, sudoku_index, page_height - top_medium - row * (page_height * 0.0875) * 3.25,
+                   (page_height * 0.0875) + col * (page_height * 0.0875) * 3.5, (page_height * 0.0875) * 2.75, selfsizes, config, font_size, pagenum)
         col += 1
         if col == 2:
             col = 0
@@ -127,12 +182,15 @@ def generate_six_pdf(page, pagenum, puzzles):
                 #     generateFooter(page)
                 # page.showPage()
 
+    draw_page_number(page, pagenum, board_font_size(font_size, selfsizes[0]), config)
+
     # print current progress
     print("Currently working on drawing a puzzle on page " + str(pagenum) + "...")
 
 
-def draw_board(page, puzzle, sudoku_number, top, left, size, selfsizes, font_size = 24, page_count=1, is_solution = False):
+def draw_board(page, puzzle, sudoku_number, top, left, size, selfsizes, config, font_size = 24, page_count=1, is_solution = False):
     # puz, d = puzzle
+    din_width, din_height = config.din_size
     gridwidth, gridheight, gridsize = selfsizes
     right = left + size
     bottom = top - size
@@ -142,16 +200,16 @@ def draw_board(page, puzzle, sudoku_number, top, left, size, selfsizes, font_siz
     box_height = size / gridsize
 
     # change line thickness for board sizes
-    if json_data['SUDOKUS_PER_PAGE'] == 4:
+    if config['SUDOKUS_PER_PAGE'] == 4:
         thin_line = 0.8
         thick_line = 2.75
-    if json_data['SUDOKUS_PER_PAGE'] == 6:
+    if config['SUDOKUS_PER_PAGE'] == 6:
         thin_line = 0.4
         thick_line = 2
-    if is_solution and json_data['SUDOKUS_PER_PAGE'] == 1:
+    if is_solution and config['SUDOKUS_PER_PAGE'] == 1:
         thin_line = 0.4
         thick_line = 2
-    if is_solution and json_data['SUDOKUS_PER_PAGE'] != 1:
+    if is_solution and config['SUDOKUS_PER_PAGE'] != 1:
         thin_line = 0.25
         thick_line = 1.5
 
@@ -159,8 +217,7 @@ def draw_board(page, puzzle, sudoku_number, top, left, size, selfsizes, font_siz
         thick_line = thick_line / (din_width / 100)
         thin_line = thin_line * 0.875
 
-    if gridwidth > 3:
-        font_size = font_size - (gridwidth * 2)
+    font_size = board_font_size(font_size, gridwidth)
 
     page_data = [top, left, right, bottom, box_height, font_size]
 
@@ -169,32 +226,22 @@ def draw_board(page, puzzle, sudoku_number, top, left, size, selfsizes, font_siz
 
     # todo: make a check for text positioning and font size
     # set font and font size for custom text per sudoku
+    font = custom_font(config)
     page.setFont(font, font_size)
     # (optional) add difficulty level to custom text
-    custom_text_string = f"{json_data['CUSTOM_TEXT']}{sudoku_index}"
-    if json_data['SHOW_DIFFICULTY_TEXT']:
-        custom_text_string = f"{json_data['CUSTOM_TEXT']}{sudoku_index} ({puzzle[1].value_string()})"
+    custom_text_string = f"{config['CUSTOM_TEXT']}{sudoku_index}"
+    if config['SHOW_DIFFICULTY_TEXT']:
+        custom_text_string = f"{config['CUSTOM_TEXT']}{sudoku_index} ({puzzle[1].value_string()})"
 
     page.drawString(left, top + (font_size / 1.5), custom_text_string)
 
-    # draw page number
-    page_number_font_size = round(8 * (((din_width + din_height) / 2) / 100))
-    page_number_position = 62
-    if din_width < 210:
-        page_number_position = PAGE_HEIGHT * 0.04375 + (PAGE_HEIGHT * 0.04375 / 2)
-    page.setFont("Helvetica", page_number_font_size)
-    page.drawString(PAGE_WIDTH / 2 - font_size / 4, page_number_position, str(page_count))
-
-    # draw sudoku board based on dynamic size
-    for i in range(0, gridsize + 1):
-        squared_grid_size = i % gridwidth
-
-        if squared_grid_size == 0:
-            page.setLineWidth(thick_line)
-        else:
-            page.setLineWidth(thin_line)
-        page.line(left, top - i * box_height, right, top - i * box_height)
-        page.line(left + i * box_height, top, left + i * box_height, bottom)
+    # draw sudoku board based on dynamic size; the page number is drawn
+    # once per page by the caller
+    name = grid_form(page, size, selfsizes, thin_line, thick_line)
+    page.saveState()
+    page.translate(left, bottom)
+    page.doForm(name)
+    page.restoreState()
 
     # set font and font size for Sudoku Board
     page.setFont("Helvetica", font_size)
@@ -214,37 +261,46 @@ def position_numbers(page, puzzle, selfsizes, pagedata):
     gridwidth, gridheight, gridsize = selfsizes
     top, left, right, bottom, box_height, font_size = pagedata
 
-    s = puzzle.to_string()
-    nums = s.split()
-
-    for i, row in enumerate(puzzle.grid):
-        for j, col in enumerate(row):
-            if col not in range(10, gridsize + 1):
-                num = nums[i * gridsize + j]
-                if num != '0':
-                    page.drawString(left + j * box_height + box_height * 0.38,
-                                    top - i * box_height - box_height * 0.65, str(col))
+    # all digits of a board go into one text object, each one placed
+    # relative to the one before it
+    text = page.beginText()
+    text.setFont("Helvetica", font_size)
+    last = None
+    for i, row in enumerate(puzzle.grid.tolist()):
+        y = top - i * box_height - box_height * 0.65
+        for j, value in enumerate(row):
+            if not value:
+                continue
+            x = left + j * box_height + box_height * 0.38
+            if value >= 10:
+                # two-digit values start further left to stay centred
+                x -= font_size / gridwidth + gridwidth / 2
+            if last is None:
+                text.setTextOrigin(x, y)
             else:
-                num = nums[i * gridsize + j]
-                if num != '0':
-                    page.drawString(
-                        left - (font_size / gridwidth + (
-                                gridwidth / 2)) + j * box_height + box_height * 0.38,
-                        top - i * box_height - box_height * 0.65, str(col))
+                text.moveCursor(x - last[0], last[1] - y)
+            last = x, y
+            text.textOut(str(value))
+    page.drawText(text)
+
 
+def solutions_per_page(config):
+    """Number of solutions generateSolutions puts on a page."""
+    if config['SUDOKUS_PER_PAGE'] == 1:
+        return 6
+    return 9
 
-def generateSolutions(page, puzzles, doc_page_number):
-    # todo: get data per puzzle
-    board_size = [3, 3, 9]
-    # for i, puzzle in enumerate(puzzles):
-    #     board_size = puzzle.get_board_sizes()
 
+def generateSolutions(page, puzzles, doc_page_number, config, first_number=1):
+    """Draw the solutions of puzzles, starting on page doc_page_number + 1
+    and numbered from first_number on."""
+    page_width, page_height, din_width, din_height = page_geometry(config)
     # 9 grid display values for a page
     col_limit = 3
-    font_size = round(json_data['FONT_SIZE_SOLUTIONS'] * (((din_width + din_height) / 2) / 100))
-    top_offset = PAGE_HEIGHT * 0.0875
+    font_size = round(config['FONT_SIZE_SOLUTIONS'] * (((din_width + din_height) / 2) / 100))
+    top_offset = page_height * 0.0875
     top_multiplier = 2.5
-    left_offset = PAGE_HEIGHT * 0.04375
+    left_offset = page_height * 0.04375
     left_multiplier = 2.5
     size_multiplier = round(1 * (din_width / 100))
     modulo_value = 9
@@ -253,12 +309,12 @@ def generateSolutions(page, puzzles, doc_page_number):
         size_multiplier = size_multiplier + round(1 * (din_width / 100))
 
     # 6 grid display values for a page
-    if json_data['SUDOKUS_PER_PAGE'] == 1:
+    if config['SUDOKUS_PER_PAGE'] == 1:
         col_limit = 2
-        font_size = round(json_data['FONT_SIZE_6_PAGE'] * (((din_width + din_height) / 2) / 100)) + 1
-        top_offset = PAGE_HEIGHT * 0.04375 + ((PAGE_HEIGHT * 0.04375) / 2)
+        font_size = round(config['FONT_SIZE_6_PAGE'] * (((din_width + din_height) / 2) / 100)) + 1
+        top_offset = page_height * 0.04375 + ((page_height * 0.04375) / 2)
         top_multiplier = 3.25
-        left_offset = PAGE_HEIGHT * 0.0875
+        left_offset = page_height * 0.0875
         left_multiplier = 3.5
         size_multiplier = round(1 * (((din_width + din_height) / 2) / 100), 2)
         modulo_value = 6
@@ -266,29 +322,31 @@ def generateSolutions(page, puzzles, doc_page_number):
         if din_width < 210:
             size_multiplier = size_multiplier + round(1 * (din_width / 100) / 2)
 
-    if json_data['SUDOKU_SQUARE_SIZE'] > 3:
-        font_size = json_data['FONT_SIZE_SOLUTIONS_4GRID']
+    if config['SUDOKU_SQUARE_SIZE'] > 3:
+        font_size = config['FONT_SIZE_SOLUTIONS_4GRID']
 
     col = row = 0
-    i = 0
+    i = first_number - 1
     j = 1
     page_num = doc_page_number + j
+    per_page = solutions_per_page(config)
     for p, puzzle in enumerate(puzzles):
-        puz, d = puzzle
         i += 1
-        solver = SudokuRater(puz.grid, verbose=False, group_size=puz.group_size)
-        solver.solve()
-        solved_puzzle = solver, solver.difficulty()
+        # the generator already knows the solution and the rating
+        solved_puzzle = puzzle.solution, puzzle.rating
+        board_size = board_sizes(puzzle.solution)
 
         # print current progress
         print("Currently working on puzzle solutions... " + str(p + 1))
 
         # todo: center position of solutions
-        # draw_board(page, i, PAGE_HEIGHT - top_offset - row * 72 * top_multiplier, left_offset + col * 72 * left_multiplier, 72 * size_multiplier, solver,
+        # draw_board(page, i, page_height - top_offset - row * 72 * top_multiplier, left_offset + col * 72 * left_multiplier, 72 * size_multiplier, solver,
         #            board_size, font_size, page_num, is_solution=True)
-        draw_board(page, solved_puzzle, i, PAGE_HEIGHT - top_offset - row * (PAGE_HEIGHT * 0.0875) * top_multiplier,
-                   left_offset + col * (PAGE_HEIGHT * 0.0875) * left_multiplier, (PAGE_HEIGHT * 0.0875) * size_multiplier,
-                   board_size, font_size, page_num, True)
+        draw_board(page, solved_puzzle, i, page_height - top_offset - row * (page_height * 0.0875) * top_multiplier,
+                   left_offset + col * (page_height * 0.0875) * left_multiplier, (page_height * 0.0875) * size_multiplier,
+                   board_size, config, font_size, page_num, True)
+        if p % per_page == 0:
+            draw_page_number(page, page_num, board_font_size(font_size, board_size[0]), config)
         col += 1
         if col == col_limit:
             col = 0
@@ -0,0 +1,204 @@
+"""A compact binary file of generated puzzles.
+
+Every record has the same width, so the file is read through a NumPy
+memmap: opening a file of a million puzzles only maps it, and records
+are decoded when they are sliced or sampled. A file starts with a
+16-byte header (MAGIC, format version, group size) followed by records
+of
+
+    puzzle          the cells, row by row, 0 for an open square
+    solution        the cells of the solved grid
+    value           the difficulty rating as float64
+    band            the index of the difficulty band in DIFFICULTY_BANDS
+    guesses, backtraces, squares_filled
+                    the rest of the rating, as uint16, uint32 and uint16
+
+For 9x9 grids two cells share a byte (4 bits each), larger grids use a
+byte per cell. PuzzlePool.export() and import_file() move puzzles
+between a pool and a puzzle file.
+"""
+import numpy as np
+from Generator.sudoku_solver import SudokuGrid, RatingSummary, \
+    DIFFICULTY_BANDS, difficulty_band
+from Generator.sudoku_maker import PuzzleRecord
+
+MAGIC = b'SUDOKUPZ'
+VERSION = 1
+HEADER_SIZE = 16
+
+
+def packs_nibbles(group_size):
+    return group_size < 16
+
+
+def cells_width(group_size):
+    """Bytes used by the cells of one grid."""
+    cells = group_size * group_size
+    if packs_nibbles(group_size):
+        return (cells + 1) // 2
+    return cells
+
+
+def record_dtype(group_size):
+    width = cells_width(group_size)
+    return np.dtype([('puzzle', 'u1', (width,)),
+                     ('solution', 'u1', (width,)),
+                     ('value', '<f8'),
+                     ('band', 'u1'),
+                     ('guesses', '<u2'),
+                     ('backtraces', '<u4'),
+                     ('squares_filled', '<u2')])
+
+
+def pack_cells(cells, group_size):
+    """Pack an (n, group_size**2) array of cell values into bytes."""
+    cells = np.asarray(cells, dtype='u1')
+    if not packs_nibbles(group_size):
+        return cells
+    if cells.shape[1] % 2:
+        cells = np.pad(cells, ((0, 0), (0, 1)))
+    return (cells[:, 0::2] << 4) | cells[:, 1::2]
+
+
+def unpack_cells(packed, group_size):
+    """The inverse of pack_cells(); returns (n, group_size, group_size)."""
+    cells = group_size * group_size
+    if packs_nibbles(group_size):
+        unpacked = np.empty((len(packed), packed.shape[1] * 2), dtype='u1')
+        unpacked[:, 0::2] = packed >> 4
+        unpacked[:, 1::2] = packed & 0xf
+        packed = unpacked[:, :cells]
+    return packed.reshape(-1, group_size, group_size)
+
+
+def write_header(f, group_size):
+    header = MAGIC + bytes([VERSION, group_size])
+    f.write(header.ljust(HEADER_SIZE, b'\0'))
+
+
+def read_header(f):
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError('Not a puzzle file')
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError('Unsupported puzzle file version %s' % header[len(MAGIC)])
+    return header[len(MAGIC) + 1]
+
+
+class PuzzleFileWriter:
+    """Append puzzles to a puzzle file, creating it if needed.
+
+    Puzzles are given as the plain tuples of generate_puzzle_data()."""
+
+    def __init__(self, path, group_size):
+        self.group_size = group_size
+        self.dtype = record_dtype(group_size)
+        try:
+            with open(path, 'rb') as f:
+                if read_header(f) != group_size:
+                    raise ValueError('%s holds puzzles of another size' % path)
+            self.f = open(path, 'ab')
+        except FileNotFoundError:
+            self.f = open(path, 'wb')
+            write_header(self.f, group_size)
+
+    def write(self, puzzle_data):
+        puzzle_data = list(puzzle_data)
+        if not puzzle_data:
+            return 0
+        records = np.zeros(len(puzzle_data), dtype=self.dtype)
+        records['puzzle'] = self.parse_cells(data[0] for data in puzzle_data)
+        records['solution'] = self.parse_cells(data[5] for data in puzzle_data)
+        records['value'] = [data[1] for data in puzzle_data]
+        records['band'] = [DIFFICULTY_BANDS.index(difficulty_band(data[1]))
+                           for data in puzzle_data]
+        records['guesses'] = [data[2] for data in puzzle_data]
+        records['backtraces'] = [data[3] for data in puzzle_data]
+        records['squares_filled'] = [data[4] for data in puzzle_data]
+        records.tofile(self.f)
+        return len(records)
+
+    def parse_cells(self, grid_strings):
+        # one parse for the whole batch is much faster than a split() per grid
+        cells = np.array(' '.join(grid_strings).split(), dtype='u1')
+        return pack_cells(cells.reshape(-1, self.group_size * self.group_size),
+                          self.group_size)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PuzzleFile:
+    """Read-only, memory-mapped access to a puzzle file.
+
+    Indexing with an int returns a PuzzleRecord, slicing and sample()
+    return lists of them. iter_data() gives the plain tuples back."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.group_size = read_header(f)
+        self.dtype = record_dtype(self.group_size)
+        try:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r',
+                                     offset=HEADER_SIZE)
+        except ValueError:  # no records yet; mmap can't map 0 bytes
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_records(self.records[index])
+        return self.to_records(self.records[[index]])[0]
+
+    def band_indices(self, bands):
+        """Return the indices of all records in the given bands."""
+        wanted = [DIFFICULTY_BANDS.index(band) for band in bands]
+        return np.flatnonzero(np.isin(self.records['band'], wanted))
+
+    def sample(self, num, bands=None, rng=None):
+        """Return num distinct records picked at random, optionally only
+        from the given difficulty bands."""
+        if rng is None:
+            rng = np.random.default_rng()
+        if bands is None:
+            candidates = len(self.records)
+        else:
+            candidates = self.band_indices(bands)
+        picked = np.sort(rng.choice(candidates, size=num, replace=False))
+        return self.to_records(self.records[picked])
+
+    def iter_data(self, batch_size=10000):
+        """Yield every record as a generate_puzzle_data() tuple, decoding
+        batch_size records at a time."""
+        n = self.group_size
+        for start in range(0, len(self.records), batch_size):
+            records = self.records[start:start + batch_size]
+            puzzles = unpack_cells(records['puzzle'], n).reshape(len(records), -1)
+            solutions = unpack_cells(records['solution'], n).reshape(len(records), -1)
+            for puzzle, solution, value, guesses, backtraces, squares_filled in zip(
+                    puzzles.tolist(), solutions.tolist(), records['value'].tolist(),
+                    records['guesses'].tolist(), records['backtraces'].tolist(),
+                    records['squares_filled'].tolist()):
+                yield (' '.join(map(str, puzzle)), value, guesses, backtraces,
+                       squares_filled, ' '.join(map(str, solution)))
+
+    def to_records(self, records):
+        n = self.group_size
+        puzzles = unpack_cells(records['puzzle'], n)
+        solutions = unpack_cells(records['solution'], n)
+        return [PuzzleRecord(SudokuGrid(puzzle, group_size=n),
+                             RatingSummary(value, guesses, backtraces, squares_filled),
+                             SudokuGrid(solution, group_size=n))
+                for puzzle, solution, value, guesses, backtraces, squares_filled
+                in zip(puzzles.tolist(), solutions.tolist(),
+                       records['value'].tolist(), records['guesses'].tolist(),
+                       records['backtraces'].tolist(),
+                       records['squares_filled'].tolist())]
@@ -0,0 +1,250 @@
+"""A local store of pre-generated puzzles.
+
+Puzzles are kept in a SQLite file, indexed by group size, difficulty
+band and rating, and marked as used once they have been drawn, so no
+book gets the same puzzle twice. Every puzzle is stored with the
+puzzle_key() of its canonical form, so a puzzle that is only a variant
+of one in the pool (digits relabelled, rows swapped, ...) isn't added.
+make_puzzles() draws from the pool first and only generates what is
+missing. Fill the pool ahead of time
+(for example in the background) with
+
+    python -m Generator.puzzle_pool fill puzzle_pool.sqlite --per-band 200
+
+and move puzzles to and from the compact files of puzzle_file.py with
+the export and import commands.
+"""
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import time
+from Generator.sudoku_solver import DIFFICULTY_BANDS, difficulty_band
+from Generator.sudoku_maker import generate_puzzle_data, puzzle_seeds, \
+    difficulty_bands, MODE_RANDOM
+from Generator.canonical import puzzle_key
+from Generator.puzzle_file import PuzzleFile, PuzzleFileWriter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    id INTEGER PRIMARY KEY,
+    group_size INTEGER NOT NULL,
+    band TEXT NOT NULL,
+    value REAL NOT NULL,
+    puzzle TEXT NOT NULL UNIQUE,
+    solution TEXT NOT NULL,
+    guesses INTEGER NOT NULL,
+    backtraces INTEGER NOT NULL,
+    squares_filled INTEGER NOT NULL,
+    used INTEGER NOT NULL DEFAULT 0,
+    canonical TEXT
+);
+CREATE INDEX IF NOT EXISTS puzzles_by_band
+    ON puzzles (group_size, band, used, value);
+"""
+
+CANONICAL_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS puzzles_by_canonical
+    ON puzzles (group_size, canonical);
+"""
+
+
+class PuzzlePool:
+    """Pre-generated puzzles in a SQLite file.
+
+    Puzzles go in and come out as the plain tuples of
+    generate_puzzle_data()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.executescript(SCHEMA)
+        self.add_canonical_keys()
+        self.db.executescript(CANONICAL_INDEX)
+
+    def close(self):
+        self.db.close()
+
+    def add_canonical_keys(self):
+        """Key the puzzles of a pool made before keys were stored, and
+        drop the ones that turn out to be variants of an older one."""
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(puzzles)')]
+        with self.db:
+            if 'canonical' not in columns:
+                self.db.execute('ALTER TABLE puzzles ADD COLUMN canonical TEXT')
+            rows = self.db.execute('SELECT id, group_size, puzzle FROM puzzles '
+                                   'WHERE canonical IS NULL ORDER BY id').fetchall()
+            if not rows:
+                return
+            print('Adding canonical keys to %s puzzles' % len(rows))
+            seen = set(self.db.execute('SELECT group_size, canonical FROM puzzles '
+                                       'WHERE canonical IS NOT NULL').fetchall())
+            for id, group_size, puzzle in rows:
+                key = (group_size, puzzle_key(puzzle, group_size))
+                if key in seen:
+                    self.db.execute('DELETE FROM puzzles WHERE id = ?', (id,))
+                else:
+                    seen.add(key)
+                    self.db.execute('UPDATE puzzles SET canonical = ? WHERE id = ?',
+                                    (key[1], id))
+
+    def add(self, group_size, puzzle_data):
+        """Store generated puzzles; returns how many were new. Variants of
+        puzzles already in the pool are not new."""
+        rows = []
+        for puzzle, value, guesses, backtraces, squares_filled, solution in puzzle_data:
+            rows.append((group_size, difficulty_band(value), value, puzzle,
+                         solution, guesses, backtraces, squares_filled,
+                         puzzle_key(puzzle, group_size)))
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                'INSERT OR IGNORE INTO puzzles (group_size, band, value, '
+                'puzzle, solution, guesses, backtraces, squares_filled, canonical) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            return self.db.total_changes - before
+
+    def has_key(self, group_size, key):
+        """Return whether a puzzle with this puzzle_key() is in the pool,
+        used or not."""
+        return self.db.execute(
+            'SELECT 1 FROM puzzles WHERE group_size = ? AND canonical = ?',
+            (group_size, key)).fetchone() is not None
+
+    def count(self, group_size, band=None, used=False):
+        query = 'SELECT COUNT(*) FROM puzzles WHERE group_size = ? AND used = ?'
+        args = [group_size, int(used)]
+        if band:
+            query += ' AND band = ?'
+            args.append(band)
+        return self.db.execute(query, args).fetchone()[0]
+
+    def draw(self, group_size, difficulty, num):
+        """Take up to num unused puzzles of the given DIFFICULTY_LEVEL
+        string, oldest first, and mark them as used."""
+        bands = difficulty_bands(difficulty)
+        query = ('SELECT id, puzzle, value, guesses, backtraces, '
+                 'squares_filled, solution FROM puzzles '
+                 'WHERE group_size = ? AND used = 0 AND band IN (%s) '
+                 'ORDER BY id LIMIT ?' % ', '.join('?' * len(bands)))
+        with self.db:
+            # take the write lock first, so two runs can't draw the same
+            # puzzles
+            self.db.execute('BEGIN IMMEDIATE')
+            rows = self.db.execute(
+                query, [group_size] + bands + [int(num)]).fetchall()
+            self.db.executemany('UPDATE puzzles SET used = 1 WHERE id = ?',
+                                [(row[0],) for row in rows])
+        return [row[1:] for row in rows]
+
+    def export(self, path, group_size, used=False, batch_size=10000):
+        """Append the unused puzzles of a group size (or all of them,
+        with used=True) to a puzzle file; returns how many."""
+        query = ('SELECT puzzle, value, guesses, backtraces, squares_filled, '
+                 'solution FROM puzzles WHERE group_size = ?')
+        if not used:
+            query += ' AND used = 0'
+        rows = self.db.execute(query + ' ORDER BY id', (group_size,))
+        written = 0
+        with PuzzleFileWriter(path, group_size) as writer:
+            while 1:
+                batch = rows.fetchmany(batch_size)
+                if not batch:
+                    return written
+                written += writer.write(batch)
+
+    def import_file(self, path, batch_size=10000):
+        """Add the puzzles of a puzzle file; returns how many were new."""
+        puzzle_file = PuzzleFile(path)
+        added = 0
+        batch = []
+        for data in puzzle_file.iter_data(batch_size):
+            batch.append(data)
+            if len(batch) == batch_size:
+                added += self.add(puzzle_file.group_size, batch)
+                batch = []
+        return added + self.add(puzzle_file.group_size, batch)
+
+    def fill(self, square_size, per_band, bands=DIFFICULTY_BANDS,
+             engine=None, workers=1, mode=MODE_RANDOM, seed=None):
+        """Generate puzzles until every band has per_band unused ones.
+
+        Puzzles are stored as they come in, so an interrupted fill keeps
+        what it has made so far."""
+        grid_size = square_size * square_size
+        if seed is None:
+            seed = random.getrandbits(64)
+        jobs = []
+        for band in bands:
+            missing = per_band - self.count(grid_size, band)
+            if missing > 0:
+                print('Filling %s: %s puzzles missing' % (band, missing))
+                jobs.extend([(s, band, grid_size, engine, mode)
+                             for s in puzzle_seeds('%s-%s' % (seed, band), missing)])
+        if not jobs:
+            return 0
+        added = 0
+        if workers and workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                for data in pool.imap_unordered(generate_puzzle_data, jobs):
+                    added += self.add(grid_size, [data])
+        else:
+            for job in jobs:
+                added += self.add(grid_size, [generate_puzzle_data(job)])
+        return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the puzzle pool.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    fill = commands.add_parser('fill', help='fill the pool up to --per-band unused puzzles per band')
+    fill.add_argument('path', help='SQLite file of the pool')
+    fill.add_argument('--per-band', type=int, default=100)
+    fill.add_argument('--square-size', type=int, default=3)
+    fill.add_argument('--bands', default='Any',
+                      help='bands to fill, like DIFFICULTY_LEVEL (default: all)')
+    fill.add_argument('--engine', default='bitmask')
+    fill.add_argument('--mode', default=MODE_RANDOM)
+    fill.add_argument('-w', '--workers', type=int, default=1)
+    fill.add_argument('--watch', type=float, default=0,
+                      help='keep topping the pool up, checking every WATCH seconds')
+    stats = commands.add_parser('stats', help='show unused puzzles per band')
+    stats.add_argument('path', help='SQLite file of the pool')
+    stats.add_argument('--square-size', type=int, default=3)
+    export = commands.add_parser('export', help='append puzzles to a puzzle file')
+    export.add_argument('path', help='SQLite file of the pool')
+    export.add_argument('file', help='puzzle file to write')
+    export.add_argument('--square-size', type=int, default=3)
+    export.add_argument('--all', action='store_true',
+                        help='include used puzzles')
+    load = commands.add_parser('import', help='add the puzzles of a puzzle file')
+    load.add_argument('path', help='SQLite file of the pool')
+    load.add_argument('file', help='puzzle file to read')
+    args = parser.parse_args()
+
+    if args.command == 'fill':
+        try:
+            bands = difficulty_bands(args.bands)
+        except ValueError as e:
+            parser.error(str(e))
+    pool = PuzzlePool(args.path)
+    if args.command == 'export':
+        print('Exported %s puzzles' % pool.export(
+            args.file, args.square_size * args.square_size, args.all))
+    elif args.command == 'import':
+        print('Added %s puzzles' % pool.import_file(args.file))
+    else:
+        grid_size = args.square_size * args.square_size
+        if args.command == 'fill':
+            while 1:
+                added = pool.fill(args.square_size, args.per_band,
+                                  bands, args.engine,
+                                  args.workers, args.mode)
+                print('Added %s puzzles' % added)
+                if not args.watch:
+                    break
+                time.sleep(args.watch)
+        for band in DIFFICULTY_BANDS:
+            print('%-10s %6s unused %6s used' % (band, pool.count(grid_size, band),
+                                                 pool.count(grid_size, band, used=True)))
+    pool.close()
@@ -1,300 +1,691 @@
-# import sudoku
-from Generator.sudoku_solver import SudokuGrid, SudokuSolver, SudokuRater
-import random
-# from defaults import *
-
-class SudokuGenerator:
-
-    """A class to generate new Sudoku Puzzles."""
-
-    def __init__(self, start_grid=None, clues=30, group_size=9):
-        self.generated = []
-        self.clues = clues
-        self.all_coords = []
-        self.group_size = group_size
-        for x in range(self.group_size):
-            for y in range(self.group_size):
-                self.all_coords.append((x, y))
-        if start_grid:
-            self.start_grid = SudokuGrid(grid)
-        else:
-            try:
-                self.start_grid = self.generate_grid()
-            except:
-                self.start_grid = self.generate_grid()
-        self.puzzles = []
-        self.rated_puzzles = []
-
-    def get_board_sizes(self):
-        sudoku_board_sizes = [3, 3, self.group_size]
-        return sudoku_board_sizes
-
-    def average_difficulty(self):
-        difficulties = [i[1].value for i in self.rated_puzzles]
-        if difficulties:
-            return sum(difficulties)/len(difficulties)
-
-    def generate_grid(self):
-        self.start_grid = SudokuSolver(
-            verbose=False, group_size=self.group_size)
-        self.start_grid.solve()
-        return self.start_grid
-
-    def reflect(self, x, y, axis=1):
-        # downward sloping
-        upper = self.group_size - 1
-        # reflect once...
-        x, y = upper - y, upper-x
-        # reflect twice...
-        return y, x
-
-    def make_symmetric_puzzle(self):
-        nclues = self.clues/2
-        # coff = [i * nclues for i in self.all_coords]
-        buckshot = set(random.sample(self.all_coords, int(nclues)))
-        new_puzzle = SudokuGrid(
-            verbose=False, group_size=self.group_size)
-        reflections = set()
-        for x, y in buckshot:
-            reflection = self.reflect(x, y)
-            if reflection:
-                nclues += 1
-                reflections.add(reflection)
-        buckshot = buckshot | reflections  # unite our sets
-        remaining_coords = set(self.all_coords) - set(buckshot)
-        while len(buckshot) < self.clues:
-            coord = random.sample(remaining_coords, 1)[0]
-            buckshot.add(coord)
-            reflection = self.reflect(*coord)
-            if reflection:
-                buckshot.add(reflection)
-            remaining_coords = remaining_coords - buckshot
-        return self.make_puzzle_from_coords(buckshot)
-
-    def make_puzzle(self):
-        buckshot = random.sample(self.all_coords, self.clues)
-        while buckshot in self.generated:
-            buckshot = random.sample(self.all_coords, self.clues)
-        return self.make_puzzle_from_coords(buckshot)
-
-    def make_puzzle_from_coords(self, buckshot):
-        new_puzzle = SudokuGrid(
-            verbose=False, group_size=self.group_size)
-        self.generated.append(set(buckshot))
-        for x, y in buckshot:
-            new_puzzle.add(x, y, self.start_grid._get_(x, y))
-        self.puzzles.append(new_puzzle)
-        return new_puzzle
-
-    def make_puzzle_by_boxes(self,
-                             skew_by=0.0,
-                             max_squares=None,):
-        """Make a puzzle paying attention to evenness of clue
-        distribution.
-
-        If skew_by is 0, we distribute our clues as evenly as possible
-        across boxes.  If skew by is 1.0, we make the distribution of
-        clues as uneven as possible. In other words, if we had 27
-        boxes for a 9x9 grid, a skew_by of 0 would put exactly 3 clues
-        in each 3x3 grid whereas a skew_by of 1.0 would completely
-        fill 3 3x3 grids with clues.
-
-        We believe this skewing may have something to do with how
-        difficult a puzzle is to solve. By toying with the ratios,
-        this method may make it considerably easier to generate
-        difficult or easy puzzles.
-        """
-        # Number of total boxes
-        nboxes = len(self.start_grid.boxes)
-        # If no max is given, we calculate one based on our skew_by --
-        # a skew_by of 1 will always produce full squares, 0 will
-        # produce the minimum fullness, and between between in
-        # proportion to its betweenness.
-        if not max_squares:
-            max_squares = self.clues / nboxes
-            max_squares += int((nboxes-max_squares)*skew_by)
-        clued = 0
-        # nclues will be a list of the number of clues we want per
-        # box.
-        nclues = []
-        for n in range(nboxes):
-            # Make sure we'll have enough clues to fill our target
-            # number, regardless of our calculation of the current max
-            minimum = (self.clues-clued)/(nboxes-n)
-            if max_squares < minimum:
-                cls = minimum
-            else:
-                cls = int(max_squares)
-            clues = max_squares
-            if clues > (self.clues - clued):
-                clues = self.clues - clued
-            nclues.append(int(clues))
-            clued += clues
-            if skew_by:
-                # Reduce our number of squares proportionally to
-                # skewiness.
-                max_squares = round(max_squares * skew_by)
-        # shuffle ourselves...
-        random.shuffle(nclues)
-        buckshot = []
-        for i in range(nboxes):
-            if nclues[i]:
-                buckshot.extend(
-                    random.sample(self.start_grid.box_coords[i],
-                                  nclues[i])
-                )
-        return self.make_puzzle_from_coords(buckshot)
-
-    def assess_difficulty(self, sudoku_grid):
-        solver = None
-        try:
-            solver = SudokuRater(
-                sudoku_grid, verbose=False, group_size=self.group_size)
-            d = solver.difficulty()
-            self.rated_puzzles.append((sudoku_grid, d))
-            return d
-        except:
-            print('Impossible!')
-            print('Puzzle was:')
-            if solver:
-                print((solver.virgin))
-            print(('Solution: '), end=' ')
-            print((self.start_grid))
-            print(('Puzzle foobared in following state:'), end=' ')
-            if solver:
-                print(solver)
-            raise
-
-    def is_unique(self, sudoku_grid):
-        """If puzzle is unique, return its difficulty.
-
-        Otherwise, return None."""
-        solver = SudokuRater(
-            sudoku_grid, verbose=False, group_size=self.group_size)
-        if solver.has_unique_solution():
-            return solver.difficulty()
-        else:
-            return None
-
-    def generate_puzzle_for_difficulty(self,
-                                       lower_target=0.3,
-                                       upper_target=0.5,
-                                       max_tries=100,
-                                       by_box=False,
-                                       by_box_kwargs={}):
-        for i in range(max_tries):
-            if by_box:
-                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
-            else:
-                puz = self.make_puzzle()
-            d = self.assess_difficulty(puz.grid)
-            if (d and (not lower_target or d.value > lower_target) and
-               (not upper_target or
-                    d.value < upper_target)):
-                return puz, d
-        else:
-            return None, None
-
-    def make_unique_puzzles(self, n=10, ugargs={}):
-        ug = self.unique_generator(**ugargs)
-        ret = []
-        for i in range(n):
-            print('Working on puzzle ')
-            ret.append(next(ug))
-            # print('Got one!')
-        return ret
-
-    def unique_generator(self, symmetrical=True,
-                         by_box=False, by_box_kwargs={}):
-        while 1:
-            if symmetrical:
-                puz = self.make_symmetric_puzzle()
-            elif by_box:
-                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
-            else:
-                puz = self.make_puzzle()
-            diff = self.is_unique(puz.grid)
-            if diff:
-                yield puz, diff
-
-    def generate_puzzles(self, n=10,
-                         symmetrical=True,
-                         by_box=False,
-                         by_box_kwargs={}):
-        ret = []
-        for i in range(n):
-            print(('Generating puzzle '), i)
-            if symmetrical:
-                puz = self.make_symmetric_puzzle()
-            elif by_box:
-                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
-            else:
-                puz = self.make_puzzle()
-            # print 'Assessing puzzle ',puz
-            try:
-                d = self.assess_difficulty(puz.grid)
-            except:
-                raise
-            if d:
-                ret.append((puz, d))
-        # ret.sort(lambda a, b: a[1].value >
-        #          b[1].value and 1 or a[1].value < b[1].value and -1 or 0)
-        return ret
-
-
-class InterruptibleSudokuGenerator (SudokuGenerator):
-    pass
-
-
-def generate_puzzles_by_difficulty(difficulty='Any', grid_size=9):
-    g = SudokuGenerator(None, int((grid_size*0.608)**2), grid_size)
-
-    while 1:
-        puzzles = g.make_unique_puzzles(1)
-        # puzzle = g.generate_puzzle_for_difficulty(0.5, 0.6)
-        puz, d = puzzles[0]
-        if difficulty == 'Any' or d.value_string() in difficulty:
-            print("Found the correct difficulty!", d.value, d.value_string())
-            break
-    return puz, d
-
-
-def make_puzzles(num, difficulty, sort_by_difficulty, square_size):
-    grid_size = square_size * square_size
-    puzzles = []
-    for i in range(int(num)):
-        puzzles.append(generate_puzzles_by_difficulty(difficulty, grid_size))
-    if sort_by_difficulty:
-        puzzles.sort(key=lambda p: p[1].value)
-    return puzzles
-
-
-# if __name__ == '__main__':
-#     import optparse
-#
-#     parser = optparse.OptionParser(usage='usage: %prog [options] output-file')
-#     parser.add_option("-n", "--number", default=3, action="store", type="int", help="Number of puzzles to generate")
-#     parser.add_option("-d", "--difficulty", default='Any', help="Difficulty level.  Can be 'Any', 'Easy', 'Medium', 'Hard', 'Very hard'")
-#     (options, args) = parser.parse_args()
-#
-#     sg = SudokuGenerator()
-#     puzzles = sg.generate_puzzle_for_difficulty(0.5, 0.6)
-# #
-#     print("PUZZLES", puzzles)
-#
-#     print("MAIN symmetrical", sg.make_symmetric_puzzle())
-#     # generatePuzzle('Hard')
-#
-#     go(options.number, options.difficulty)
-
-    # unique_maker = sg.unique_generator()
-    # unique = []
-    # for n in range(3):
-    #     unique.append(next(unique_maker))
-    # print('Generated Unique...', unique)
-    # unique_puzzles = filter(lambda x: SudokuSolver(x[0].grid,verbose=False).has_unique_solution(),puzzles)
-    # print("unique", unique_puzzles)
-
-    # uniq_puzzles = sg.make_unique_puzzles(3)
-    # for puz, d in uniq_puzzles:
-    #     print("UNIQUE PUZZLE", d.value_string(), d.value, puz)
+# import sudoku
+from Generator.sudoku_solver import SudokuGrid, SudokuSolver, SudokuRater, RatingSummary, \
+    UnsolvablePuzzle, DIFFICULTY_BANDS
+from Generator.exact_cover import check_unique, MAX_GROUP_SIZE
+from Generator import mask_search
+from Generator import instrumentation
+from Generator import prefilters
+from Generator.canonical import PuzzleIndex
+from Generator.batch_propagation import propagate
+from collections import namedtuple
+import numpy as np
+import math
+import multiprocessing
+import random
+# from defaults import *
+
+# Symmetric clue sets are made and propagated this many at a time.
+UNIQUE_BATCH_SIZE = 32
+
+
+class SudokuGenerator:
+
+    """A class to generate new Sudoku Puzzles."""
+
+    def __init__(self, start_grid=None, clues=30, group_size=9, engine=None,
+                 prefilter_chain=None, index=None):
+        # clue sets tried so far, as frozensets
+        self.generated = set()
+        self.engine = engine
+        # cheap proofs of non-uniqueness tried before the search
+        if prefilter_chain is None:
+            prefilter_chain = prefilters.PrefilterChain()
+        self.prefilter_chain = prefilter_chain
+        # an optional PuzzleIndex of ratings by canonical form, so a
+        # puzzle that comes up again in disguise isn't rated twice
+        self.index = index
+        self.clues = clues
+        self.all_coords = []
+        self.group_size = group_size
+        for x in range(self.group_size):
+            for y in range(self.group_size):
+                self.all_coords.append((x, y))
+        if start_grid:
+            self.start_grid = SudokuGrid(grid)
+        else:
+            try:
+                self.start_grid = self.generate_grid()
+            except:
+                self.start_grid = self.generate_grid()
+        self.puzzles = []
+        self.rated_puzzles = []
+
+    def get_board_sizes(self):
+        width = int(math.sqrt(self.group_size))
+        sudoku_board_sizes = [width, width, self.group_size]
+        return sudoku_board_sizes
+
+    def average_difficulty(self):
+        difficulties = [i[1].value for i in self.rated_puzzles]
+        if difficulties:
+            return sum(difficulties)/len(difficulties)
+
+    def generate_grid(self):
+        with instrumentation.stage('generator.start_grid'):
+            return self._generate_grid()
+
+    def _generate_grid(self):
+        if self.group_size > MAX_GROUP_SIZE:
+            # the solver's random guessing can take minutes to fill an
+            # empty 25x25 grid; the propagating search takes a second
+            solution = mask_search.random_solution(self.group_size, random)
+            self.start_grid = SudokuSolver(
+                solution, verbose=False, group_size=self.group_size,
+                engine=self.engine)
+            return self.start_grid
+        self.start_grid = SudokuSolver(
+            verbose=False, group_size=self.group_size, engine=self.engine)
+        self.start_grid.solve()
+        return self.start_grid
+
+    def reflect(self, x, y, axis=1):
+        # downward sloping
+        upper = self.group_size - 1
+        # reflect once...
+        x, y = upper - y, upper-x
+        # reflect twice...
+        return y, x
+
+    def make_symmetric_puzzle(self):
+        return self.make_puzzle_from_coords(self.symmetric_coords())
+
+    def symmetric_coords(self):
+        """Pick a symmetric set of clue coordinates."""
+        nclues = self.clues/2
+        # coff = [i * nclues for i in self.all_coords]
+        buckshot = set(random.sample(self.all_coords, int(nclues)))
+        reflections = set()
+        for x, y in buckshot:
+            reflection = self.reflect(x, y)
+            if reflection:
+                nclues += 1
+                reflections.add(reflection)
+        buckshot = buckshot | reflections  # unite our sets
+        remaining_coords = set(self.all_coords) - set(buckshot)
+        while len(buckshot) < self.clues:
+            coord = random.sample(sorted(remaining_coords), 1)[0]
+            buckshot.add(coord)
+            reflection = self.reflect(*coord)
+            if reflection:
+                buckshot.add(reflection)
+            remaining_coords = remaining_coords - buckshot
+        return buckshot
+
+    def make_puzzle(self):
+        buckshot = random.sample(self.all_coords, self.clues)
+        while frozenset(buckshot) in self.generated:
+            buckshot = random.sample(self.all_coords, self.clues)
+        return self.make_puzzle_from_coords(buckshot)
+
+    def make_puzzle_from_coords(self, buckshot):
+        new_puzzle = SudokuGrid(
+            verbose=False, group_size=self.group_size)
+        self.generated.add(frozenset(buckshot))
+        for x, y in buckshot:
+            new_puzzle.add(x, y, self.start_grid._get_(x, y))
+        self.puzzles.append(new_puzzle)
+        return new_puzzle
+
+    def make_puzzle_by_boxes(self,
+                             skew_by=0.0,
+                             max_squares=None,):
+        """Make a puzzle paying attention to evenness of clue
+        distribution.
+
+        If skew_by is 0, we distribute our clues as evenly as possible
+        across boxes.  If skew by is 1.0, we make the distribution of
+        clues as uneven as possible. In other words, if we had 27
+        boxes for a 9x9 grid, a skew_by of 0 would put exactly 3 clues
+        in each 3x3 grid whereas a skew_by of 1.0 would completely
+        fill 3 3x3 grids with clues.
+
+        We believe this skewing may have something to do with how
+        difficult a puzzle is to solve. By toying with the ratios,
+        this method may make it considerably easier to generate
+        difficult or easy puzzles.
+        """
+        # Number of total boxes
+        nboxes = len(self.start_grid.boxes)
+        # If no max is given, we calculate one based on our skew_by --
+        # a skew_by of 1 will always produce full squares, 0 will
+        # produce the minimum fullness, and between between in
+        # proportion to its betweenness.
+        if not max_squares:
+            max_squares = self.clues / nboxes
+            max_squares += int((nboxes-max_squares)*skew_by)
+        clued = 0
+        # nclues will be a list of the number of clues we want per
+        # box.
+        nclues = []
+        for n in range(nboxes):
+            # Make sure we'll have enough clues to fill our target
+            # number, regardless of our calculation of the current max
+            minimum = (self.clues-clued)/(nboxes-n)
+            if max_squares < minimum:
+                cls = minimum
+            else:
+                cls = int(max_squares)
+            clues = max_squares
+            if clues > (self.clues - clued):
+                clues = self.clues - clued
+            nclues.append(int(clues))
+            clued += clues
+            if skew_by:
+                # Reduce our number of squares proportionally to
+                # skewiness.
+                max_squares = round(max_squares * skew_by)
+        # shuffle ourselves...
+        random.shuffle(nclues)
+        buckshot = []
+        for i in range(nboxes):
+            if nclues[i]:
+                buckshot.extend(
+                    random.sample(self.start_grid.box_coords[i],
+                                  nclues[i])
+                )
+        return self.make_puzzle_from_coords(buckshot)
+
+    def assess_difficulty(self, sudoku_grid):
+        """Return the difficulty of a puzzle, or None if it has no
+        solution."""
+        solution, unique, d = self.analyse(sudoku_grid)
+        if d is not None:
+            self.rated_puzzles.append((sudoku_grid, d))
+        return d
+
+    def analyse(self, sudoku_grid, unique=None):
+        """Return (solution, unique, difficulty) of a puzzle from one
+        search, see SudokuRater.analyse(); unique is passed on. A puzzle
+        without a solution comes back as (None, False, None)."""
+        with instrumentation.stage('generator.analyse'):
+            try:
+                return SudokuRater(
+                    sudoku_grid, verbose=False, group_size=self.group_size,
+                    engine=self.engine).analyse(unique)
+            except UnsolvablePuzzle:
+                return None, False, None
+
+    def is_unique(self, sudoku_grid):
+        """If puzzle is unique, return its difficulty.
+
+        Otherwise, return None. Uniqueness is checked by exact cover
+        first, as in unique_puzzles(); only unique puzzles are rated."""
+        with instrumentation.stage('generator.unique_check'):
+            unique = check_unique(sudoku_grid, self.group_size)[0]
+        if not unique:
+            instrumentation.count('generator.not_unique')
+            return None
+        solution, unique, d = self.analyse(sudoku_grid, unique=True)
+        return d
+
+    def unique_puzzles(self, clue_sets):
+        """Yield (puzzle, difficulty) for the clue sets that make a
+        unique puzzle.
+
+        The clue sets are turned into one array of grids. Those the
+        prefilter chain proves to have several solutions are dropped, the
+        rest go through batch propagation: puzzles it solves are unique
+        without a search, puzzles it breaks are dropped, and the rest are
+        checked in their propagated form, which leaves the exact-cover
+        search less to do. Only unique puzzles become SudokuGrids. Most random
+        clue sets have several solutions, and exact cover rejects those
+        far cheaper than a rater's analyse() would, so it stays in front
+        of the rating here; analyse() is told the puzzle is unique and
+        only searches up to the first solution."""
+        solution = np.array(self.start_grid.grid)
+        grids = np.zeros((len(clue_sets),) + solution.shape, dtype=np.int8)
+        for grid, clues in zip(grids, clue_sets):
+            xs, ys = zip(*clues)
+            grid[ys, xs] = solution[ys, xs]
+        if instrumentation.enabled:
+            instrumentation.count('generator.clue_sets', len(clue_sets))
+        with instrumentation.stage('generator.prefilter'):
+            keep = self.prefilter_chain.keep(grids, solution, self.group_size)
+        clue_sets = [clues for clues, kept in zip(clue_sets, keep) if kept]
+        grids = grids[keep]
+        if not clue_sets:
+            return
+        with instrumentation.stage('generator.propagate'):
+            grids, solved, contradiction = propagate(grids, self.group_size)
+        if instrumentation.enabled:
+            instrumentation.count('generator.solved_by_propagation', int(solved.sum()))
+            instrumentation.count('generator.contradictions', int(contradiction.sum()))
+        for clues, grid, is_solved, is_broken in zip(clue_sets, grids, solved,
+                                                     contradiction):
+            if is_broken:
+                continue
+            if not is_solved:
+                with instrumentation.stage('generator.unique_check'):
+                    unique = check_unique(grid, self.group_size)[0]
+                if not unique:
+                    instrumentation.count('generator.not_unique')
+                    continue
+            puz = self.make_puzzle_from_coords(clues)
+            if self.index is None:
+                solution, unique, d = self.analyse(puz.grid, unique=True)
+                yield puz, d
+                continue
+            key = self.index.key(puz.grid)
+            d = self.index.rating(puz.grid, key)
+            if d is not None:
+                instrumentation.count('generator.cached_ratings')
+                yield puz, d
+                continue
+            solution, unique, d = self.analyse(puz.grid, unique=True)
+            self.index.add(puz.grid, d, key)
+            yield puz, d
+
+    def generate_puzzle_for_difficulty(self,
+                                       lower_target=0.3,
+                                       upper_target=0.5,
+                                       max_tries=100,
+                                       by_box=False,
+                                       by_box_kwargs={}):
+        for i in range(max_tries):
+            if by_box:
+                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
+            else:
+                puz = self.make_puzzle()
+            d = self.assess_difficulty(puz.grid)
+            if (d and (not lower_target or d.value > lower_target) and
+               (not upper_target or
+                    d.value < upper_target)):
+                return puz, d
+        else:
+            return None, None
+
+    def symmetric_pairs(self):
+        """Return all squares grouped with their reflection."""
+        pairs = []
+        seen = set()
+        for coord in self.all_coords:
+            if coord not in seen:
+                pair = set([coord, self.reflect(*coord)])
+                seen |= pair
+                pairs.append(sorted(pair))
+        return pairs
+
+    def dig_puzzle_for_difficulty(self, difficulty='Any', symmetrical=True,
+                                  rate_from=None):
+        """Make a puzzle by digging holes in start_grid until its rating
+        falls into one of the bands named in difficulty.
+
+        Clues are removed in random order (together with their
+        reflection if symmetrical), skipping removals that would give
+        the puzzle a second solution. Puzzles get harder as clues go, so
+        only a few along the dig are rated: the first one with no more
+        than rate_from clues, then ones 1, 3, 7, ... holes further on
+        until one is too hard or the dig runs out, and then the dig is
+        bisected between the last one too easy and the first one too
+        hard. For the bands in DIG_RATE_FROM_END the dig goes straight
+        on to its end, which is rated first; for the other bands so is
+        the end of a dig that never gets down to rate_from clues. Grids
+        larger than exact cover handles are rated after every removal
+        past rate_from instead: there the rater's search settles
+        uniqueness faster than the mask search, and rates on the way.
+        We give up and
+        return (None, None) if the first puzzle is already too hard or
+        the last one still too easy."""
+        bands = difficulty_bands(difficulty)
+        hardest = DIFFICULTY_BANDS.index(bands[-1])
+        easiest = 'Any' if len(bands) == len(DIFFICULTY_BANDS) else bands[0]
+        if rate_from is None:
+            rate_from = self.clues + int(
+                self.group_size ** 2 * DIG_RATE_FROM[easiest] / 9)
+        rate_as_dug = self.group_size > MAX_GROUP_SIZE
+        from_end = easiest in DIG_RATE_FROM_END and not rate_as_dug
+        values = [[int(v) for v in row] for row in self.start_grid.grid]
+        if symmetrical:
+            holes = self.symmetric_pairs()
+        else:
+            holes = [[coord] for coord in self.all_coords]
+        random.shuffle(holes)
+        dug = []
+
+        def clues_after(k):
+            return set(self.all_coords).difference(
+                coord for hole in dug[:k] for coord in hole)
+
+        def rate(k):
+            clues = clues_after(k)
+            grid = [[0] * self.group_size for i in range(self.group_size)]
+            for x, y in clues:
+                grid[y][x] = self.start_grid._get_(x, y)
+            return clues, self.analyse(grid, unique=True)[2]
+
+        def verdict(d):
+            # -1 if a rating is too easy, 0 if it is in one of the
+            # bands, 1 if it is too hard
+            if d.value_string() in bands:
+                return 0
+            instrumentation.count('generator.rejected.' + d.value_string())
+            return 1 if DIFFICULTY_BANDS.index(d.value_string()) > hardest else -1
+
+        left = len(self.all_coords)
+        # the puzzle we want is left after between lo and hi holes
+        lo = hi = probe = None
+        step = 1
+        for hole in holes:
+            for x, y in hole:
+                values[y][x] = 0
+            if rate_as_dug and left - len(hole) <= rate_from:
+                # the puzzle is rated anyway, so one search settles both
+                solution, unique, d = self.analyse(values)
+            else:
+                with instrumentation.stage('generator.unique_check'):
+                    unique, solution = check_unique(values, self.group_size)
+            if not unique:
+                instrumentation.count('generator.not_unique')
+                for x, y in hole:
+                    values[y][x] = self.start_grid._get_(x, y)
+                continue
+            dug.append(hole)
+            left -= len(hole)
+            if left > rate_from:
+                continue
+            if lo is None:
+                lo = probe = len(dug)
+            if rate_as_dug:
+                clues = None
+            elif from_end or len(dug) != probe:
+                continue
+            else:
+                clues, d = rate(probe)
+            v = verdict(d)
+            if v == 0:
+                return self.make_puzzle_from_coords(clues or clues_after(len(dug))), d
+            if v > 0:
+                instrumentation.count('generator.dig_overshoot')
+                hi = len(dug) - 1
+                break
+            lo = len(dug) + 1
+            probe += step
+            step *= 2
+        if lo is None:
+            if from_end:
+                return None, None
+            # some small grids can't be dug down to rate_from clues at
+            # all, rate what is left
+            lo = len(dug)
+        if hi is None:
+            # the dig ran out: try its end first
+            hi = probe = len(dug)
+        else:
+            probe = (lo + hi) // 2
+        while lo <= hi:
+            clues, d = rate(probe)
+            v = verdict(d)
+            if v == 0:
+                return self.make_puzzle_from_coords(clues), d
+            if v > 0:
+                hi = probe - 1
+            else:
+                lo = probe + 1
+            probe = (lo + hi) // 2
+        instrumentation.count('generator.dig_missed')
+        return None, None
+
+    def make_unique_puzzles(self, n=10, ugargs={}):
+        ug = self.unique_generator(**ugargs)
+        ret = []
+        for i in range(n):
+            print('Working on puzzle ')
+            ret.append(next(ug))
+            # print('Got one!')
+        return ret
+
+    def unique_generator(self, symmetrical=True,
+                         by_box=False, by_box_kwargs={},
+                         batch_size=UNIQUE_BATCH_SIZE):
+        while 1:
+            if symmetrical:
+                clue_sets = [self.symmetric_coords()
+                             for i in range(batch_size)]
+                for puz, diff in self.unique_puzzles(clue_sets):
+                    yield puz, diff
+                continue
+            elif by_box:
+                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
+            else:
+                puz = self.make_puzzle()
+            diff = self.is_unique(puz.grid)
+            if diff:
+                yield puz, diff
+
+    def generate_puzzles(self, n=10,
+                         symmetrical=True,
+                         by_box=False,
+                         by_box_kwargs={}):
+        ret = []
+        for i in range(n):
+            print(('Generating puzzle '), i)
+            if symmetrical:
+                puz = self.make_symmetric_puzzle()
+            elif by_box:
+                puz = self.make_puzzle_by_boxes(**by_box_kwargs)
+            else:
+                puz = self.make_puzzle()
+            # print 'Assessing puzzle ',puz
+            try:
+                d = self.assess_difficulty(puz.grid)
+            except:
+                raise
+            if d:
+                ret.append((puz, d))
+        # ret.sort(lambda a, b: a[1].value >
+        #          b[1].value and 1 or a[1].value < b[1].value and -1 or 0)
+        return ret
+
+
+class InterruptibleSudokuGenerator (SudokuGenerator):
+    pass
+
+
+# Generation modes: pick random clue sets and keep those that rate
+# right, or dig holes into the solution until the rating is right.
+MODE_RANDOM = 'random'
+MODE_DIG = 'dig'
+
+# When digging, start rating once we are down to the usual clue count
+# plus this many clues per 9 squares of the grid, depending on the
+# easiest band asked for.
+DIG_RATE_FROM = {'Any': 0.0, 'Easy': 1.0, 'Medium': 0.5, 'Hard': 0.0,
+                 'Very hard': 0.0}
+# The bands that are rarely reached at rate_from clues, so the dig goes
+# straight on to its end before the first rating.
+DIG_RATE_FROM_END = ('Hard', 'Very hard')
+
+# Digs per puzzle before we give up on the band: small grids never
+# rate past Easy, so asking them for Hard would dig forever.
+MAX_DIG_ATTEMPTS = 200
+
+
+# The usual clue count for each grid size, around the Hard band. Larger
+# grids need relatively more clues: below about 100 clues on 16x16 and
+# 315 on 25x25 proving a puzzle unique gets very slow.
+CLUES_BY_SIZE = {16: 120, 25: 345}
+
+
+def clues_for_size(grid_size):
+    return CLUES_BY_SIZE.get(grid_size, int((grid_size * 0.608) ** 2))
+
+
+def difficulty_bands(difficulty):
+    """Return the bands named in a DIFFICULTY_LEVEL string, easiest
+    first. The string is "Any" or band names separated by commas, in
+    any case; anything else raises ValueError."""
+    names = set(name.strip().lower() for name in str(difficulty).split(','))
+    if names == set(['any']):
+        return list(DIFFICULTY_BANDS)
+    bands = [band for band in DIFFICULTY_BANDS if band.lower() in names]
+    if len(bands) != len(names):
+        raise ValueError('Unknown DIFFICULTY_LEVEL %r: use "Any" or some of %s, '
+                         'separated by commas' % (difficulty, ', '.join(DIFFICULTY_BANDS)))
+    return bands
+
+
+def generate_puzzles_by_difficulty(difficulty='Any', grid_size=9, engine=None,
+                                   mode=MODE_RANDOM):
+    """Return (puzzle, rating, solution) for a unique puzzle of the
+    requested difficulty. The solution is the generator's start grid.
+    Raises ValueError for an unknown difficulty and RuntimeError if
+    MAX_DIG_ATTEMPTS digs all miss the bands."""
+    bands = difficulty_bands(difficulty)
+    g = SudokuGenerator(None, clues_for_size(grid_size), grid_size, engine)
+
+    if mode == MODE_DIG:
+        for attempt in range(MAX_DIG_ATTEMPTS):
+            puz, d = g.dig_puzzle_for_difficulty(difficulty)
+            if puz:
+                print("Found the correct difficulty!", d.value, d.value_string())
+                return puz, d, g.start_grid
+        raise RuntimeError('No %s puzzle in %s digs of a %sx%s grid' % (
+            ' or '.join(bands), MAX_DIG_ATTEMPTS, grid_size, grid_size))
+    while 1:
+        puzzles = g.make_unique_puzzles(1)
+        # puzzle = g.generate_puzzle_for_difficulty(0.5, 0.6)
+        puz, d = puzzles[0]
+        if d.value_string() in bands:
+            print("Found the correct difficulty!", d.value, d.value_string())
+            break
+        instrumentation.count('generator.rejected.' + d.value_string())
+    return puz, d, g.start_grid
+
+
+# A generated puzzle as handed to the PDF code: the puzzle and its
+# solution as SudokuGrids and its RatingSummary.
+PuzzleRecord = namedtuple('PuzzleRecord', ['puzzle', 'rating', 'solution'])
+
+
+def puzzle_seeds(seed, num):
+    """Derive one RNG seed per puzzle from the master seed."""
+    master = random.Random(seed)
+    return [master.getrandbits(64) for i in range(int(num))]
+
+
+def generate_puzzle_data(job):
+    """Generate one puzzle from a (seed, difficulty, grid_size, engine,
+    mode) job and return it as plain data, so it is cheap to send back
+    from a worker process."""
+    seed, difficulty, grid_size, engine, mode = job
+    random.seed(seed)
+    puz, d, solution = generate_puzzles_by_difficulty(difficulty, grid_size,
+                                                      engine, mode)
+    return (puz.to_string(), d.value, len(d.guesses), d.backtraces,
+            d.squares_filled, solution.to_string())
+
+
+def record_from_data(data, grid_size):
+    puzzle_string, value, guesses, backtraces, squares_filled, solution_string = data
+    return PuzzleRecord(SudokuGrid(puzzle_string, group_size=grid_size),
+                        RatingSummary(value, guesses, backtraces,
+                                      squares_filled),
+                        SudokuGrid(solution_string, group_size=grid_size))
+
+
+# How often a puzzle that turns out to be a duplicate is generated
+# again before we keep it anyway; small grids have few distinct puzzles.
+MAX_DUPLICATE_RETRIES = 20
+
+
+def iter_puzzles(num, difficulty, square_size, engine=None, workers=1,
+                 seed=None, mode=MODE_RANDOM, puzzle_pool=None, pool=None,
+                 index=None):
+    """Yield num PuzzleRecords as they are generated, using a pool of
+    worker processes if workers > 1.
+
+    Every puzzle is generated from its own seed derived from seed, so
+    the same seed gives the same puzzles, in the same order, whatever
+    the number of workers. If a PuzzlePool is given, puzzles are drawn
+    from it first and only the rest is generated. A running
+    multiprocessing pool can be passed as pool to use its workers
+    instead of starting new ones.
+
+    Generated puzzles are checked against a PuzzleIndex of the run and
+    against the PuzzlePool, if there is one; a puzzle that is a variant
+    of one seen before is generated again from a new seed. Pass index to
+    share it between runs."""
+    grid_size = square_size * square_size
+    if index is None:
+        index = PuzzleIndex(grid_size)
+    drawn = []
+    if puzzle_pool is not None:
+        drawn = puzzle_pool.draw(grid_size, difficulty, num)
+        print('Took %s puzzles from the pool' % len(drawn))
+    if seed is None:
+        seed = random.getrandbits(64)
+    jobs = [(s, difficulty, grid_size, engine, mode)
+            for s in puzzle_seeds(seed, int(num) - len(drawn))]
+    # seeds for the puzzles that replace duplicates, in the order the
+    # duplicates come up
+    retry_seeds = random.Random('%s-retry' % seed)
+
+    def unique(data, generate):
+        for i in range(MAX_DUPLICATE_RETRIES):
+            key = index.key(data[0])
+            if (puzzle_pool is None or not puzzle_pool.has_key(grid_size, key)) \
+                    and index.add(data[0], data[1:5], key):
+                return data
+            instrumentation.count('generator.duplicates')
+            data = generate((retry_seeds.getrandbits(64), difficulty,
+                             grid_size, engine, mode))
+        print('Could not find a new puzzle, keeping a duplicate')
+        return data
+
+    for data in drawn:
+        yield record_from_data(data, grid_size)
+    if pool is not None and jobs:
+        for data in pool.imap(generate_puzzle_data, jobs, chunksize=1):
+            data = unique(data, lambda job: pool.apply(generate_puzzle_data, (job,)))
+            yield record_from_data(data, grid_size)
+    elif workers and workers > 1 and jobs:
+        with multiprocessing.Pool(workers) as pool:
+            for data in pool.imap(generate_puzzle_data, jobs, chunksize=1):
+                data = unique(data, lambda job: pool.apply(generate_puzzle_data, (job,)))
+                yield record_from_data(data, grid_size)
+    else:
+        for job in jobs:
+            yield record_from_data(unique(generate_puzzle_data(job), generate_puzzle_data),
+                                   grid_size)
+
+
+def make_puzzles(num, difficulty, sort_by_difficulty, square_size, engine=None,
+                 workers=1, seed=None, mode=MODE_RANDOM, puzzle_pool=None, pool=None,
+                 index=None):
+    """Return a list of num PuzzleRecords, see iter_puzzles()."""
+    puzzles = list(iter_puzzles(num, difficulty, square_size, engine, workers,
+                                seed, mode, puzzle_pool, pool, index))
+    if sort_by_difficulty:
+        puzzles.sort(key=lambda p: p[1].value)
+    return puzzles
+
+
+# if __name__ == '__main__':
+#     import optparse
+#
+#     parser = optparse.OptionParser(usage='usage: %prog [options] output-file')
+#     parser.add_option("-n", "--number", default=3, action="store", type="int", help="Number of puzzles to generate")
+#     parser.add_option("-d", "--difficulty", default='Any', help="Difficulty level.  Can be 'Any', 'Easy', 'Medium', 'Hard', 'Very hard'")
+#     (options, args) = parser.parse_args()
+#
+#     sg = SudokuGenerator()
+#     puzzles = sg.generate_puzzle_for_difficulty(0.5, 0.6)
+# #
+#     print("PUZZLES", puzzles)
+#
+#     print("MAIN symmetrical", sg.make_symmetric_puzzle())
+#     # generatePuzzle('Hard')
+#
+#     go(options.number, options.difficulty)
+
+    # unique_maker = sg.unique_generator()
+    # unique = []
+    # for n in range(3):
+    #     unique.append(next(unique_maker))
+    # print('Generated Unique...', unique)
+    # unique_puzzles = filter(lambda x: SudokuSolver(x[0].grid,verbose=False).has_unique_solution(),puzzles)
+    # print("unique", unique_puzzles)
+
+    # uniq_puzzles = sg.make_unique_puzzles(3)
+    # for puz, d in uniq_puzzles:
+    #     print("UNIQUE PUZZLE", d.value_string(), d.value, puz)
@@ -1,8 +1,11 @@
-import functools
+import heapq
 import random
 import math
 import numpy as np
 import re
+import types
+from Generator.exact_cover import check_unique
+from Generator import instrumentation
 
 GROUP_SIZE = 9
 
@@ -32,30 +35,82 @@ class ConflictError (ValueError):
 class AlreadySetError (ValueError):
     pass
 
+class GridGeometry:
+    """The coordinates of the rows, columns and boxes of one grid size,
+    shared by every SudokuGrid of that size and never changed.
+
+    The mappings are read-only views; box_coords numbers the boxes
+    column by column and lists their squares column by column. Pickling
+    a geometry only stores its group_size, and unpickling looks the
+    shared one up again."""
+
+    def __init__(self, group_size):
+        n = group_size
+        self.group_size = n
+        self.gen_set = frozenset(range(1, n + 1))
+        width = int(math.sqrt(n))
+        box_by_coords = {}
+        box_coords = {}
+        box_num = 0
+        for bx in range(0, n, width):
+            for by in range(0, n, width):
+                box_coords[box_num] = tuple((x, y) for x in range(bx, bx + width)
+                                            for y in range(by, by + width))
+                for coord in box_coords[box_num]:
+                    box_by_coords[coord] = box_num
+                box_num += 1
+        self.box_by_coords = types.MappingProxyType(box_by_coords)
+        self.box_coords = types.MappingProxyType(box_coords)
+        self.row_coords = types.MappingProxyType(
+            dict((y, tuple((x, y) for x in range(n))) for y in range(n)))
+        self.col_coords = types.MappingProxyType(
+            dict((x, tuple((x, y) for y in range(n))) for x in range(n)))
+        peer_coords = {}
+        for (x, y), box in box_by_coords.items():
+            peers = set(self.row_coords[y]) | set(self.col_coords[x]) | set(box_coords[box])
+            peers.discard((x, y))
+            peer_coords[(x, y)] = tuple(sorted(peers))
+        self.peer_coords = types.MappingProxyType(peer_coords)
+
+    def __reduce__(self):
+        return get_grid_geometry, (self.group_size,)
+
+
+grid_geometry_by_size = {}
+
+
+def get_grid_geometry(group_size):
+    geometry = grid_geometry_by_size.get(group_size)
+    if geometry is None:
+        geometry = grid_geometry_by_size[group_size] = GridGeometry(group_size)
+    return geometry
+
+
 class SudokuGrid:
+    # Grids are made by the thousand, so they get slots and take their
+    # geometry from the shared GridGeometry. Subclasses don't declare
+    # slots of their own (they get a __dict__): two bases with slots,
+    # like SudokuSolver and BitmaskSudokuGrid under BitmaskSudokuSolver,
+    # would have conflicting instance layouts.
+    __slots__ = ('grid', 'group_size', 'verbose', 'gen_set', 'box_by_coords',
+                 'box_coords', 'row_coords', 'col_coords', 'peer_coords',
+                 'rows', 'cols', 'boxes', 'open_counts', 'open_by_count',
+                 'open_entries')
+    GEOMETRY_ATTRIBUTES = ('gen_set', 'box_by_coords', 'box_coords',
+                           'row_coords', 'col_coords', 'peer_coords')
+
     def __init__(self, grid=None, verbose=False, group_size=9):
-        self.grid = []
-        self.cols = []
-        self.rows = []
-        self.boxes = []
         self.group_size = int(group_size) # grid size as number
         self.verbose = False
-        self.gen_set = set(range(1, self.group_size+1))
-        for n in range(self.group_size):
-            self.cols.append(set())
-            self.rows.append(set())
-            self.boxes.append(set())
-            self.grid.append([0]*self.group_size)
-        self.grid = np.array(self.grid, dtype='b')
-        self.box_by_coords = {}
-        self.box_coords = {}
-        self.calculate_box_coords()  # sets box_coords and box_by_coords
-        self.row_coords = {}
-        for n, row in enumerate([[(x, y) for x in range(self.group_size)] for y in range(self.group_size)]):
-            self.row_coords[n] = row
-        self.col_coords = {}
-        for n, col in enumerate([[(x, y) for y in range(self.group_size)] for x in range(self.group_size)]):
-            self.col_coords[n] = col
+        self.grid = np.zeros((self.group_size, self.group_size), dtype='b')
+        geometry = get_grid_geometry(self.group_size)
+        self.gen_set = geometry.gen_set
+        self.box_by_coords = geometry.box_by_coords
+        self.box_coords = geometry.box_coords
+        self.row_coords = geometry.row_coords
+        self.col_coords = geometry.col_coords
+        self.peer_coords = geometry.peer_coords
+        self.setup_units()
         if grid is not None and type(grid) is not bool:
             if type(grid) == str:
                 g = re.split("\s+", grid)
@@ -70,19 +125,72 @@ class SudokuGrid:
         self.verbose = verbose
         # print("GRID", self.group_size)
 
-    def calculate_box_coords(self):
-        width = int(math.sqrt(self.group_size))
-        box_coordinates = [[n*width,
-                            (n+1)*width] for n in range(width)]
-        box_num = 0
-        for xx in box_coordinates:
-            for yy in box_coordinates:
-                self.box_coords[box_num] = []
-                for x in range(*xx):
-                    for y in range(*yy):
-                        self.box_by_coords[(x, y)] = box_num
-                        self.box_coords[box_num].append((x, y))
-                box_num += 1
+    def __getstate__(self):
+        """Leave the shared geometry out of pickles and copies;
+        __setstate__ looks it up again by group_size."""
+        state = dict(getattr(self, '__dict__', {}))
+        for name in SudokuGrid.__slots__:
+            if name not in SudokuGrid.GEOMETRY_ATTRIBUTES:
+                # read the slot itself, Bitmask grids override rows,
+                # cols and boxes with properties
+                try:
+                    state[name] = SudokuGrid.__dict__[name].__get__(self)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        geometry = get_grid_geometry(state['group_size'])
+        for name in SudokuGrid.GEOMETRY_ATTRIBUTES:
+            SudokuGrid.__dict__[name].__set__(self, getattr(geometry, name))
+        for name, value in state.items():
+            if name in SudokuGrid.__slots__:
+                SudokuGrid.__dict__[name].__set__(self, value)
+            else:
+                self.__dict__[name] = value
+
+    def setup_units(self):
+        """Create the per-unit bookkeeping of used digits."""
+        n = self.group_size
+        self.cols = [set() for i in range(n)]
+        self.rows = [set() for i in range(n)]
+        self.boxes = [set() for i in range(n)]
+        # filed on the first least_open_square(), grids that are only
+        # filled and read never pay for it
+        self.open_counts = None
+
+    def setup_open_squares(self):
+        """Start filing the open squares by their number of candidates.
+
+        Squares are numbered by rank, x * group_size + y, the order of
+        calculate_open_squares(). open_counts[rank] is the number of
+        candidates of a square, or -1 once it is filled, and
+        open_by_count[k] is a heap of the ranks of the squares with k
+        candidates. From then on add() and remove() keep the counts up
+        to date and push a square onto the heap of its new count,
+        leaving the old entry behind; entries whose count no longer
+        matches are stale and are dropped when they come to the top."""
+        n = self.group_size
+        counts = [-1] * (n * n)
+        heaps = [[] for k in range(n + 1)]
+        # ranks come in order, and a sorted list is a heap
+        for (x, y), values in self.calculate_open_squares().items():
+            r = x * n + y
+            counts[r] = len(values)
+            heaps[counts[r]].append(r)
+        self.open_counts = counts
+        self.open_by_count = heaps
+        self.open_entries = n * n
+
+    def refile_open_squares(self):
+        """Rebuild open_by_count from open_counts without the stale
+        entries, once they outnumber the squares."""
+        heaps = [[] for k in range(self.group_size + 1)]
+        for r, k in enumerate(self.open_counts):
+            if k >= 0:
+                heaps[k].append(r)
+        self.open_by_count = heaps
+        self.open_entries = len(self.open_counts)
 
     def add(self, x, y, val, force=False):
         if not val:
@@ -104,6 +212,8 @@ class SudokuGrid:
         box = self.box_by_coords[(x, y)]
         if val in self.boxes[box]:
             raise ConflictError(TYPE_BOX, (x, y), val)
+        if self.open_counts is not None:
+            self.file_added(x, y, val)
         # do the actual adding
         self.rows[y].add(val)
         self.cols[x].add(val)
@@ -120,13 +230,57 @@ class SudokuGrid:
         self.cols[x].remove(val)
         self.boxes[self.box_by_coords[(x, y)]].remove(val)
         self._set_(x, y, 0)
-
-    def _get_(self, x, y): return self.grid[y][x]
-
-    def _set_(self, x, y, val): self.grid[y][x] = val
+        if self.open_counts is not None:
+            self.file_removed(x, y, val)
+
+    def file_added(self, x, y, val):
+        # before the units take val: the open peers that could still
+        # take it lose a candidate
+        n = self.group_size
+        rows, cols, boxes = self.rows, self.cols, self.boxes
+        box_by_coords = self.box_by_coords
+        counts = self.open_counts
+        heaps = self.open_by_count
+        for px, py in self.peer_coords[(x, y)]:
+            r = px * n + py
+            if counts[r] > 0 and val not in rows[py] and val not in cols[px] and \
+                    val not in boxes[box_by_coords[(px, py)]]:
+                k = counts[r] = counts[r] - 1
+                heapq.heappush(heaps[k], r)
+                self.open_entries += 1
+        counts[x * n + y] = -1
+        if self.open_entries > 4 * n * n:
+            self.refile_open_squares()
+
+    def file_removed(self, x, y, val):
+        # the square gets its candidates back, its open peers can only
+        # regain val
+        n = self.group_size
+        rows, cols, boxes = self.rows, self.cols, self.boxes
+        box_by_coords = self.box_by_coords
+        counts = self.open_counts
+        heaps = self.open_by_count
+        r = x * n + y
+        k = counts[r] = len(self.possible_values(x, y))
+        heapq.heappush(heaps[k], r)
+        self.open_entries += 1
+        for px, py in self.peer_coords[(x, y)]:
+            r = px * n + py
+            if counts[r] >= 0 and val not in rows[py] and val not in cols[px] and \
+                    val not in boxes[box_by_coords[(px, py)]]:
+                k = counts[r] = counts[r] + 1
+                heapq.heappush(heaps[k], r)
+                self.open_entries += 1
+        if self.open_entries > 4 * n * n:
+            self.refile_open_squares()
+
+    def _get_(self, x, y): return self.grid[y, x]
+
+    def _set_(self, x, y, val): self.grid[y, x] = val
 
     def possible_values(self, x, y):
-        return self.gen_set - self.rows[y] - self.cols[x] - self.boxes[self.box_by_coords[(x, y)]]
+        # a set of our own, callers pop() from it
+        return set(self.gen_set) - self.rows[y] - self.cols[x] - self.boxes[self.box_by_coords[(x, y)]]
 
     def pretty_print(self):
         print('SUDOKU')
@@ -160,6 +314,33 @@ class SudokuGrid:
                     possibilities[(x, y)] = self.possible_values(x, y)
         return possibilities
 
+    def least_open_square(self):
+        """Return (coords, possible values) of the open square with the
+        fewest possible values, the lowest coords first on ties, or None
+        if the grid is full."""
+        if self.open_counts is None:
+            self.setup_open_squares()
+        n = self.group_size
+        counts = self.open_counts
+        for k, heap in enumerate(self.open_by_count):
+            while heap:
+                r = heap[0]
+                if counts[r] == k:
+                    coords = (r // n, r % n)
+                    return coords, self.possible_values(*coords)
+                heapq.heappop(heap)
+        return None
+
+    def has_impossible_square(self):
+        """Return True if some open square has no possible value left."""
+        if self.open_counts is None:
+            self.setup_open_squares()
+        counts = self.open_counts
+        heap = self.open_by_count[0]
+        while heap and counts[heap[0]]:
+            heapq.heappop(heap)
+        return bool(heap)
+
     def find_conflict(self, x, y, val, conflict_type):
         if conflict_type == TYPE_ROW:
             coords = self.row_coords[y]
@@ -175,14 +356,286 @@ class SudokuGrid:
         """Output our grid as a string."""
         return " ".join([" ".join([str(x) for x in row]) for row in self.grid])
 
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def mask_to_values(mask):
+    """Return the digits set in mask, lowest first."""
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length())
+        mask ^= low
+    return tuple(values)
+
+
+class BitmaskTables:
+    """Lookup tables shared by every BitmaskSudokuGrid of one size.
+
+    Cells are numbered y * group_size + x."""
+
+    # Above this size a table of all candidate masks gets too big and
+    # we decode masks on the fly instead.
+    MAX_VALUE_TABLE_SIZE = 16
+
+    def __init__(self, group_size):
+        self.group_size = group_size
+        self.full_mask = (1 << group_size) - 1
+        width = int(math.sqrt(group_size))
+        ncells = group_size * group_size
+        self.box_of = [(x // width) * width + y // width
+                       for y in range(group_size) for x in range(group_size)]
+        self.coords = [(i % group_size, i // group_size) for i in range(ncells)]
+        self.row_cells = [[y * group_size + x for x in range(group_size)]
+                          for y in range(group_size)]
+        self.col_cells = [[y * group_size + x for y in range(group_size)]
+                          for x in range(group_size)]
+        self.box_cells = [[] for n in range(group_size)]
+        # SudokuGrid numbers and walks its boxes column by column.
+        for x in range(group_size):
+            for y in range(group_size):
+                i = y * group_size + x
+                self.box_cells[self.box_of[i]].append(i)
+        # the column, row and box of each cell as unit numbers 0..3n-1,
+        # times group_size (the start of the unit's per-digit entries)
+        self.cell_unit_keys = [
+            (i % group_size * group_size,
+             (group_size + i // group_size) * group_size,
+             (2 * group_size + self.box_of[i]) * group_size)
+            for i in range(ncells)]
+        self.peers = []
+        for i in range(ncells):
+            x, y = self.coords[i]
+            peers = set(self.row_cells[y]) | set(self.col_cells[x]) | \
+                set(self.box_cells[self.box_of[i]])
+            peers.discard(i)
+            self.peers.append(tuple(sorted(peers)))
+        # calculate_open_squares() order: x outer, y inner. rank[i] is
+        # the position of cell i in that order, so the lowest rank of a
+        # group of cells is also its lowest (x, y).
+        self.scan_order = [y * group_size + x
+                           for x in range(group_size) for y in range(group_size)]
+        self.rank = [0] * ncells
+        for r, i in enumerate(self.scan_order):
+            self.rank[i] = r
+        if group_size <= self.MAX_VALUE_TABLE_SIZE:
+            self.mask_values = [mask_to_values(m)
+                                for m in range(self.full_mask + 1)]
+        else:
+            self.mask_values = None
+
+    def values(self, mask):
+        if self.mask_values is not None:
+            return self.mask_values[mask]
+        return mask_to_values(mask)
+
+
+bitmask_tables_by_size = {}
+
+
+def get_bitmask_tables(group_size):
+    tables = bitmask_tables_by_size.get(group_size)
+    if tables is None:
+        tables = bitmask_tables_by_size[group_size] = BitmaskTables(group_size)
+    return tables
+
+
+class BitmaskSudokuGrid (SudokuGrid):
+    """A SudokuGrid that keeps its bookkeeping in integer bitmasks.
+
+    Digit v is bit 1 << (v - 1). Each row, column and box holds a mask
+    of the digits it uses and every open cell holds a mask of its
+    candidates, which is kept up to date on add() and remove(). The
+    public API is the same as SudokuGrid's; rows, cols and boxes are
+    still available as sets, but are computed on demand.
+
+    Open squares are filed by their number of candidates like in
+    SudokuGrid (see setup_open_squares()), the counts being the
+    popcounts of the candidate masks."""
+
+    def setup_units(self):
+        self.tables = get_bitmask_tables(self.group_size)
+        n = self.group_size
+        self.full_mask = self.tables.full_mask
+        self.row_used = [0] * n
+        self.col_used = [0] * n
+        self.box_used = [0] * n
+        self.values = [0] * (n * n)
+        self.candidates = [self.full_mask] * (n * n)
+        # the candidate masks are kept anyway, so the squares are filed
+        # from the start; all of them are open with n candidates
+        self.open_counts = [n] * (n * n)
+        self.open_by_count = [[] for k in range(n + 1)]
+        self.open_by_count[n].extend(range(n * n))
+        self.open_entries = n * n
+
+    def _unit_sets(self, masks):
+        return [set(self.tables.values(m)) for m in masks]
+
+    @property
+    def rows(self):
+        return self._unit_sets(self.row_used)
+
+    @property
+    def cols(self):
+        return self._unit_sets(self.col_used)
+
+    @property
+    def boxes(self):
+        return self._unit_sets(self.box_used)
+
+    def add(self, x, y, val, force=False):
+        i = y * self.group_size + x
+        if self.values[i]:
+            if force:
+                try:
+                    self.remove(x, y)
+                except:
+                    print('Strange')
+            else:
+                raise AlreadySetError
+        val = int(val)
+        bit = 1 << (val - 1)
+        if self.row_used[y] & bit:
+            raise ConflictError(TYPE_ROW, (x, y), val)
+        if self.col_used[x] & bit:
+            raise ConflictError(TYPE_COLUMN, (x, y), val)
+        box = self.tables.box_of[i]
+        if self.box_used[box] & bit:
+            raise ConflictError(TYPE_BOX, (x, y), val)
+        self.row_used[y] |= bit
+        self.col_used[x] |= bit
+        self.box_used[box] |= bit
+        candidates = self.candidates
+        counts = self.open_counts
+        heaps = self.open_by_count
+        rank = self.tables.rank
+        counts[rank[i]] = -1
+        candidates[i] = 0
+        pushed = 0
+        for p in self.tables.peers[i]:
+            c = candidates[p]
+            if c & bit:
+                r = rank[p]
+                k = counts[r] = counts[r] - 1
+                heapq.heappush(heaps[k], r)
+                pushed += 1
+                candidates[p] = c & ~bit
+        self.open_entries += pushed
+        if self.open_entries > 4 * len(candidates):
+            self.refile_open_squares()
+        if self.verbose:
+            print(('Set ', x, ',', y, '=', val))
+        self._set_(x, y, val)
+
+    def remove(self, x, y):
+        n = self.group_size
+        i = y * n + x
+        val = self.values[i]
+        if not val:
+            raise KeyError(val)
+        bit = ~(1 << (val - 1))
+        box_of = self.tables.box_of
+        row_used = self.row_used
+        col_used = self.col_used
+        box_used = self.box_used
+        row_used[y] &= bit
+        col_used[x] &= bit
+        box_used[box_of[i]] &= bit
+        self._set_(x, y, 0)
+        full = self.full_mask
+        values = self.values
+        candidates = self.candidates
+        counts = self.open_counts
+        heaps = self.open_by_count
+        rank = self.tables.rank
+        c = candidates[i] = full & ~(row_used[y] | col_used[x] | box_used[box_of[i]])
+        r = rank[i]
+        k = counts[r] = popcount(c)
+        heapq.heappush(heaps[k], r)
+        pushed = 1
+        for p in self.tables.peers[i]:
+            if not values[p]:
+                old = candidates[p]
+                c = full & ~(row_used[p // n] | col_used[p % n] | box_used[box_of[p]])
+                if c != old:
+                    r = rank[p]
+                    k = counts[r] = popcount(c)
+                    heapq.heappush(heaps[k], r)
+                    pushed += 1
+                    candidates[p] = c
+        self.open_entries += pushed
+        if self.open_entries > 4 * n * n:
+            self.refile_open_squares()
+
+    def _get_(self, x, y): return self.values[y * self.group_size + x]
+
+    def _set_(self, x, y, val):
+        self.values[y * self.group_size + x] = val
+        self.grid[y, x] = val
+
+    def candidate_mask(self, x, y):
+        """Return the candidates of an open square as a bitmask."""
+        i = y * self.group_size + x
+        if self.values[i]:
+            return self.full_mask & ~(self.row_used[y] | self.col_used[x] |
+                                      self.box_used[self.tables.box_of[i]])
+        return self.candidates[i]
+
+    def candidate_count(self, x, y):
+        return popcount(self.candidate_mask(x, y))
+
+    def possible_values(self, x, y):
+        return set(self.tables.values(self.candidate_mask(x, y)))
+
+    def calculate_open_squares(self):
+        values = self.values
+        candidates = self.candidates
+        coords = self.tables.coords
+        decode = self.tables.values
+        possibilities = {}
+        for i in self.tables.scan_order:
+            if not values[i]:
+                possibilities[coords[i]] = set(decode(candidates[i]))
+        return possibilities
+
+
 class SudokuSolver (SudokuGrid):
-    """A SudokuGrid that can solve itself."""
+    """A SudokuGrid that can solve itself.
+
+    engine picks the grid bookkeeping: ENGINE_SET (the default) or
+    ENGINE_BITMASK, which builds the matching Bitmask* class instead.
+
+    The search is iterative. breadcrumbs is the stack of open guesses;
+    every Guess keeps the placements it led to (its consequences), so a
+    dead end is undone by popping the last guess and removing them.
+    With trace=True every guess and undo is also logged in trail."""
 
-    def __init__(self, grid=False, verbose=False, group_size=9):
+    engines = {}
+
+    def __new__(cls, *args, engine=None, **kwargs):
+        if engine is not None:
+            try:
+                cls = cls.engines[engine]
+            except KeyError:
+                raise ValueError('Unknown solver engine %r' % (engine,))
+        return object.__new__(cls)
+
+    def __init__(self, grid=False, verbose=False, group_size=9, engine=None,
+                 trace=False):
         self.current_guess = None
+        self.trace = trace
         self.initialized = False
-        SudokuGrid.__init__(self, grid, verbose=verbose, group_size=group_size)
-        self.virgin = SudokuGrid(grid, False, group_size)
+        super().__init__(grid, verbose=verbose, group_size=group_size)
+        # the puzzle as it was given; virgin makes a SudokuGrid of it
+        # when it is asked for
+        self.virgin_grid = self.grid.copy()
+        self._virgin = None
         self.guesses = GuessList()
         self.breadcrumbs = BreadcrumbTrail()
         self.backtraces = 0
@@ -191,14 +644,24 @@ class SudokuSolver (SudokuGrid):
         self.trail = []
         #self.complete_crumbs = BreadcrumbTrail()
 
+    @property
+    def virgin(self):
+        if self._virgin is None:
+            self._virgin = SudokuGrid(self.virgin_grid, False, self.group_size)
+        return self._virgin
+
     def auto_fill(self):
         changed = []
+        if instrumentation.enabled:
+            instrumentation.count('solver.fill_must_fills')
         try:
             change = self.fill_must_fills()
         except UnsolvablePuzzle:
             return changed
         while change:
             changed.extend(change)
+            if instrumentation.enabled:
+                instrumentation.count('solver.fill_must_fills')
             try:
                 change = self.fill_must_fills()
             except:
@@ -385,13 +848,26 @@ class SudokuSolver (SudokuGrid):
                 yield tuple([tuple(r) for r in self.grid[0:]])
         yield None
 
-    def has_unique_solution(self):
-        sf = self.solution_finder()
-        next(sf)
-        if next(sf):
+    def find_another_solution(self):
+        """After solve(), look for a solution other than the current
+        one, going on from the last guess as solution_finder() does.
+        Returns True and leaves it in the grid if there is one."""
+        if not self.breadcrumbs:
+            # nothing was guessed, every square was forced
             return False
-        else:
-            return True
+        self.unwrap_guess(self.breadcrumbs[-1])
+        try:
+            while not self.guess_least_open_square():
+                1
+        except UnsolvablePuzzle:
+            return False
+        return True
+
+    def has_unique_solution(self):
+        """Check with an exact-cover search, which stops at the second
+        solution. The solver itself is left untouched."""
+        unique, solution = check_unique(self.grid, self.group_size)
+        return unique
 
     def find_all_solutions(self):
         solutions = set([])
@@ -403,105 +879,90 @@ class SudokuSolver (SudokuGrid):
         return solutions
 
     def guess_least_open_square(self):
-        # get open squares and check them
-        poss = list(self.calculate_open_squares().items())
-        # if there are no open squares, we're done!
-        if not poss:
-            if self.verbose:
-                print('Solved!')
-            return True
-        # otherwise, find the possibility with the least possibilities
-        # key = lambda x: getattr(x, 'duration')
-        poss.sort(key=functools.cmp_to_key(lambda a, b: len(a[1]) > len(b[1]) and 1 or len(a[1]) < len(b[1]) and -1 or
-                  a[0] > b[0] and 1 or a[1] < b[1] and -1 or 0))
-        least = poss[0]
-        # remove anything we've already guessed
-        possible_values = least[1] - self.guesses.guesses_for_coord(*least[0])
-        if not possible_values:
-            if self.breadcrumbs:
+        """Guess a value for the open square with the fewest possible
+        values and fill in what follows from it. Returns True once the
+        grid is full.
+
+        A guess that leads to a dead end is undone and the next one is
+        tried in the same loop, backing up through breadcrumbs as far
+        as needed, so deep searches don't recurse."""
+        while 1:
+            # find the open square with the least possibilities
+            least = self.least_open_square()
+            # if there are no open squares, we're done!
+            if least is None:
+                if self.verbose:
+                    print('Solved!')
+                return True
+            (x, y), values = least
+            # remove anything we've already guessed
+            possible_values = values - self.guesses.guesses_for_coord(x, y)
+            if not possible_values:
+                if not self.breadcrumbs:
+                    raise UnsolvablePuzzle("Unsolvable %s.\n \
+                    Out of guesses for %s. Already guessed\n \
+                    %s (other guesses are %s)" % (self,
+                                                  least[0],
+                                                  self.guesses.guesses_for_coord(x, y),
+                                                  self.guesses))
                 self.backtraces += 1
-                # print self.breadcrumbs
-                #raw_input('Hit return to back up...')
+                if instrumentation.enabled:
+                    instrumentation.count('solver.backtraces')
                 self.unwrap_guess(self.breadcrumbs[-1])
-                return self.guess_least_open_square()
-            else:
-                raise UnsolvablePuzzle("Unsolvable %s.\n \
-                Out of guesses for %s. Already guessed\n \
-                %s (other guesses are %s)" % (self,
-                                              least[0],
-                                              self.guesses.guesses_for_coord(
-                                                  *least[0]),
-                                              self.guesses))
-        guess = random.choice(list(possible_values))
-        # print 'Our trail so far: ',self.breadcrumbs
-        # print 'Guessing ',guess,' from ',possible_values,' for ',least[0]
-        # raw_input('Continue...')
-        # If we have a trail, we mark our parent
-        #if self.breadcrumbs: parent=self.breadcrumbs[-1]
-        # else: parent=None
-        # Create guess object
-        guess_obj = Guess(least[0][0], least[0][1], guess)
-        if self.breadcrumbs:
-            self.breadcrumbs[-1].children.append(guess_obj)
-        # print 'Guessing ',guess_obj
-        # print 'adding guess ',least[0],guess
-        self.current_guess = None  # reset (we're tracked via guess.child)
-        self.add(least[0][0], least[0][1], guess)
-        self.current_guess = guess_obj  # (All deterministic additions
-        # get added to our
-        # consequences)
-        self.guesses.append(guess_obj)
-        self.trail.append(('+', guess_obj))
-        self.breadcrumbs.append(guess_obj)
-        try:
-            filled = self.auto_fill()
-            # print 'filled :',filled
-            # print 'Done with guess.'
-        except NotImplementedError:
-            # print 'Bad Guess!!!'
-            # print self
-            self.trail.append('Problem filling coordinates after guess')
-            #raw_input('Hit return to unwrap %s'%guess_obj)
-            self.unwrap_guess(guess_obj)
-            return self.guess_least_open_square()
-            # print self
-        if set([]) in list(self.calculate_open_squares().values()):
-            # print 'BAD GUESS!!!'
-            # print self
-            self.trail.append('Guess leaves us with impossible squares.')
-            #raw_input('Hit return to unwrap %s'%guess_obj)
-            self.unwrap_guess(guess_obj)
-            return self.guess_least_open_square()
-            # print self
+                continue
+            guess = random.choice(list(possible_values))
+            if instrumentation.enabled:
+                instrumentation.count('solver.guesses')
+            guess_obj = Guess(x, y, guess)
+            # the guesses tried under the current one are excluded
+            # until the current one is undone
+            if self.breadcrumbs:
+                self.breadcrumbs[-1].children.append(guess_obj)
+            self.current_guess = None  # the guess isn't its own consequence
+            self.add(x, y, guess)
+            # everything filled in from here on is a consequence
+            self.current_guess = guess_obj
+            self.guesses.append(guess_obj)
+            if self.trace:
+                self.trail.append(('+', guess_obj))
+            self.breadcrumbs.append(guess_obj)
+            try:
+                self.auto_fill()
+            except NotImplementedError:
+                if self.trace:
+                    self.trail.append('Problem filling coordinates after guess')
+                self.unwrap_guess(guess_obj)
+                continue
+            if self.has_impossible_square():
+                if self.trace:
+                    self.trail.append('Guess leaves us with impossible squares.')
+                self.unwrap_guess(guess_obj)
+                continue
+            return False
 
     def unwrap_guess(self, guess):
-        # print 'Unwrapping guess ',guess
-        # print self
-        # raw_input('Unwrap...')
-        # print 'Before:'
-        # print self
-        self.trail.append(('-', guess))
-        if self._get_(guess.x, guess.y):
-            self.remove(guess.x, guess.y)
-        for consequence in list(guess.consequences.keys()):
-            if self._get_(*consequence):
-                self.remove(*consequence)
-        # for d in self.guesses.remove_children(guess):
-        for child in guess.children:
-            # if self._get_(d.x,d.y):
-            # print 'remove descendant ',child.x,child.y
-            self.unwrap_guess(child)
-            if child in self.guesses:
-                self.guesses.remove(child)
-        # print 'removing %s from breadcrumbs (%s)'%(guess,self.breadcrumbs)
-        if guess in self.breadcrumbs:
-            self.breadcrumbs.remove(guess)
-        # print 'Remaining crumbs: ',self.breadcrumbs
-        # print 'Remaining guesses: ',self.guesses
-        # print 'New unwrapped self:'
-        # print self
-        # print 'After:'
-        # print self
+        """Undo a guess: take back its square and its consequences and
+        forget the guesses tried under it, which may be tried again."""
+        undo = [guess]
+        while undo:
+            g = undo.pop()
+            if self.trace:
+                self.trail.append(('-', g))
+            if self._get_(g.x, g.y):
+                self.remove(g.x, g.y)
+            for consequence in reversed(list(g.consequences)):
+                if self._get_(*consequence):
+                    self.remove(*consequence)
+            for child in g.children:
+                if child in self.guesses:
+                    self.guesses.remove(child)
+            undo.extend(reversed(g.children))
+            # Everything below this guess is undone now; don't keep the
+            # dead subtree alive.
+            g.children = []
+            g.consequences = {}
+            if g in self.breadcrumbs:
+                self.breadcrumbs.remove(g)
 
     def print_possibilities(self):
         poss = self.calculate_open_squares()
@@ -529,7 +990,7 @@ class SudokuSolver (SudokuGrid):
     def add(self, x, y, val, *args, **kwargs):
         if self.current_guess:
             self.current_guess.add_consequence(x, y, val)
-        SudokuGrid.add(self, x, y, val, *args, **kwargs)
+        super().add(x, y, val, *args, **kwargs)
     #    if self.initialized:
     #        stack = traceback.extract_stack()
     #        print ":".join(str(x) for x in stack[-5][1:-1]),
@@ -591,6 +1052,10 @@ class DifficultyRating:
 
     def __repr__(self): return '<DifficultyRating %s>' % self.value
 
+    def summary(self):
+        return RatingSummary(self.value, len(self.guesses), self.backtraces,
+                             self.squares_filled)
+
     def pretty_print(self):
         for name, stat in [('Number of moves instantly fillable by elimination',
                            self.instant_elimination_fillable),
@@ -610,20 +1075,44 @@ class DifficultyRating:
             print((name, ': ', stat))
 
     def value_string(self):
-        if self.value > 0.75:
-            return "Very hard"
-        if self.value >= 0.59:
-            return "Hard"
-        elif self.value > 0.45:
-            return "Medium"
-        # elif self.value > 0.3: return "Medium"
-        else:
-            return "Easy"
+        return difficulty_band(self.value)
+
+
+DIFFICULTY_BANDS = ("Easy", "Medium", "Hard", "Very hard")
+
+
+def difficulty_band(value):
+    if value > 0.75:
+        return "Very hard"
+    if value >= 0.59:
+        return "Hard"
+    elif value > 0.45:
+        return "Medium"
+    # elif value > 0.3: return "Medium"
+    else:
+        return "Easy"
+
+
+class RatingSummary:
+    """The numbers of a DifficultyRating without the solver state
+    behind them, so it can be pickled and stored cheaply."""
+
+    def __init__(self, value, guesses=0, backtraces=0, squares_filled=0):
+        self.value = value
+        self.guesses = guesses
+        self.backtraces = backtraces
+        self.squares_filled = squares_filled
+
+    def __repr__(self): return '<DifficultyRating %s>' % self.value
+
+    def value_string(self):
+        return difficulty_band(self.value)
 
 
 class SudokuRater (SudokuSolver):
 
-    def __init__(self, grid=False, verbose=False, group_size=9):
+    def __init__(self, grid=False, verbose=False, group_size=9, engine=None,
+                 trace=False):
         self.initialized = False
         self.guessing = False
         self.fake_add = False
@@ -632,24 +1121,26 @@ class SudokuRater (SudokuSolver):
         self.fill_must_fillables = {}
         self.elimination_fillables = {}
         self.tier = 0
-        SudokuSolver.__init__(self, grid, verbose, group_size)
+        super().__init__(grid, verbose, group_size, trace=trace)
 
     def add(self, *args, **kwargs):
         if not self.fake_add:
             if self.initialized and not self.guessing:
                 # print 'Scanning fillables'
+                if instrumentation.enabled:
+                    instrumentation.count('rater.scan_fillables')
                 self.scan_fillables()
                 # print 'Done scanning fillables'
                 for delayed_args in self.add_me_queue:
                     coords = (delayed_args[0], delayed_args[1])
                     if not self._get_(*coords):
                         # print 'Adding scanned fillable:'
-                        SudokuSolver.add(self, *delayed_args)
+                        super().add(*delayed_args)
                 if not self._get_(args[0], args[1]):
-                    SudokuSolver.add(self, *args)
+                    super().add(*args)
                 self.tier += 1
             else:
-                SudokuSolver.add(self, *args, **kwargs)
+                super().add(*args, **kwargs)
         else:
             self.fake_additions.append(args)
 
@@ -680,15 +1171,14 @@ class SudokuRater (SudokuSolver):
     def guess_least_open_square(self):
         # print 'guessing'
         self.guessing = True
-        return SudokuSolver.guess_least_open_square(self)
+        return super().guess_least_open_square()
 
     def difficulty(self):
+        if instrumentation.enabled:
+            instrumentation.count('rater.ratings')
         if not self.solved:
             self.solve()
-        self.clues = 0
-        # Add up the number of our initial clues through some nifty mapping calls
-        list(map(lambda r: [setattr(self, 'clues', self.clues.__add__(i and 1 or 0)) for i in r],
-            self.virgin.grid))
+        self.clues = int(np.count_nonzero(self.virgin_grid))
         self.numbers_added = self.group_size**2 - self.clues
         # self.auto_fill()
         rating = DifficultyRating(self.fill_must_fillables,
@@ -698,33 +1188,285 @@ class SudokuRater (SudokuSolver):
                                   self.numbers_added)
         return rating
 
-class GuessList (list):
-    def __init__(self, *guesses):
-        list.__init__(self, *guesses)
+    def analyse(self, unique=None):
+        """Solve, rate and check for a unique solution in one search.
+
+        Returns (solution, unique, rating), the solution as a tuple of
+        rows. The rating is that of difficulty(): it only counts the
+        search up to the first solution. The search for a second one
+        then carries on in the same guess tree, and what it guesses and
+        backtracks is kept out of the rating. If the caller already
+        checked the puzzle, e.g. with exact cover, it passes the answer
+        as unique and there is no search for a second solution. Raises
+        UnsolvablePuzzle if there is no solution at all."""
+        if instrumentation.enabled:
+            instrumentation.count('rater.analyses')
+        rating = self.difficulty()
+        solution = tuple(tuple(int(v) for v in row) for row in self.grid)
+        if unique is None:
+            # freeze the rating's guesses before the search goes on
+            rating.guesses = GuessList(rating.guesses)
+            unique = not self.find_another_solution()
+        return solution, unique, rating
+
+
+class BitmaskSudokuSolver (SudokuSolver, BitmaskSudokuGrid):
+    """A SudokuSolver on top of BitmaskSudokuGrid."""
+
+    def fill_must_fills(self):
+        # Same scan as SudokuSolver.fill_must_fills, but a whole unit is
+        # summarised by two masks: digits possible in at least one open
+        # square and digits possible in at least two.
+        changed = []
+        tables = self.tables
+        values = self.values
+        candidates = self.candidates
+        full = self.full_mask
+        for label, units, used in [('Column', tables.col_cells, self.col_used),
+                                   ('Row', tables.row_cells, self.row_used),
+                                   ('Box', tables.box_cells, self.box_used)]:
+            for n, cells in enumerate(units):
+                once = twice = 0
+                for i in cells:
+                    if not values[i]:
+                        c = candidates[i]
+                        twice |= once & c
+                        once |= c
+                missing = full & ~used[n] & ~once
+                singles = once & ~twice
+                if not (missing or singles):
+                    continue
+                where = {}
+                for i in cells:
+                    if not values[i] and candidates[i] & singles:
+                        for v in tables.values(candidates[i] & singles):
+                            where[v] = i
+                for v in tables.values(missing | singles):
+                    if v not in where:
+                        raise UnsolvablePuzzle(
+                            'Missing a %s in %s' % (v, label))
+                    coords = tables.coords[where[v]]
+                    try:
+                        self.add(coords[0], coords[1], v)
+                        changed.append((coords, v))
+                    except AlreadySetError:
+                        raise UnsolvablePuzzle(
+                            "%s,%s must be two values at once!" % (coords)
+                        )
+        return changed
+
+
+class SinglesTrackingGrid (BitmaskSudokuGrid):
+    """A BitmaskSudokuGrid that can keep its naked and hidden singles up
+    to date as digits are added and removed.
+
+    For every unit (column, row or box) and digit we count the open
+    squares of the unit that could take the digit, and sum their cell
+    numbers: a count of one is a hidden single and the sum is its cell.
+    Naked singles are the live entries of open_by_count[1]. A placement
+    only changes the candidates of its own square and its peers, so only
+    their units are touched.
+
+    Tracking starts with start_tracking() and stops when track_singles
+    is set to False, after which hidden_singles() is stale."""
+
+    def setup_units(self):
+        BitmaskSudokuGrid.setup_units(self)
+        self.track_singles = False
+
+    def start_tracking(self):
+        n = self.group_size
+        candidates = self.candidates
+        self.unit_counts = counts = [0] * (3 * n * n)
+        self.unit_sums = sums = [0] * (3 * n * n)
+        for i, units in enumerate(self.tables.cell_unit_keys):
+            for v in self.tables.values(candidates[i]):
+                for base in units:
+                    counts[base + v - 1] += 1
+                    sums[base + v - 1] += i
+        self.hidden_single_keys = set(
+            [key for key, c in enumerate(counts) if c == 1])
+        self.track_singles = True
+
+    def _count(self, i, v, d):
+        # square i gained (d=1) or lost (d=-1) candidate v (counted from 0)
+        counts = self.unit_counts
+        for base in self.tables.cell_unit_keys[i]:
+            key = base + v
+            count = counts[key] = counts[key] + d
+            self.unit_sums[key] += d * i
+            if count == 1:
+                self.hidden_single_keys.add(key)
+            else:
+                self.hidden_single_keys.discard(key)
+
+    def add(self, x, y, val, force=False):
+        if not self.track_singles:
+            return BitmaskSudokuGrid.add(self, x, y, val, force)
+        if force and self._get_(x, y):
+            self.remove(x, y)
+        i = y * self.group_size + x
+        candidates = self.candidates
+        old = candidates[i]
+        peers = self.tables.peers[i]
+        bit = 1 << (int(val) - 1)
+        losing = [p for p in peers if candidates[p] & bit]
+        BitmaskSudokuGrid.add(self, x, y, val)
+        # the square loses all its candidates, its peers lose val
+        while old:
+            low = old & -old
+            old ^= low
+            self._count(i, low.bit_length() - 1, -1)
+        v = bit.bit_length() - 1
+        for p in losing:
+            self._count(p, v, -1)
+
+    def remove(self, x, y):
+        if not self.track_singles:
+            return BitmaskSudokuGrid.remove(self, x, y)
+        i = y * self.group_size + x
+        bit = 1 << (self.values[i] - 1) if self.values[i] else 0
+        candidates = self.candidates
+        peers = self.tables.peers[i]
+        before = [candidates[p] for p in peers]
+        BitmaskSudokuGrid.remove(self, x, y)
+        # the square gets its candidates back, its peers can only regain
+        # the removed value
+        new = candidates[i]
+        while new:
+            low = new & -new
+            new ^= low
+            self._count(i, low.bit_length() - 1, 1)
+        v = bit.bit_length() - 1
+        for p, old in zip(peers, before):
+            if candidates[p] & bit and not old & bit:
+                self._count(p, v, 1)
+
+    def hidden_singles(self):
+        """Return the (x, y, val) placements that are the only place
+        for val in some column, row or box."""
+        n = self.group_size
+        coords = self.tables.coords
+        singles = set()
+        for key in self.hidden_single_keys:
+            x, y = coords[self.unit_sums[key]]
+            singles.add((x, y, key % n + 1))
+        return singles
+
+    def naked_singles(self):
+        """Return the (x, y, val) placements of the open squares that
+        have only one possible value."""
+        n = self.group_size
+        counts = self.open_counts
+        singles = set()
+        for r in self.open_by_count[1]:
+            if counts[r] == 1:
+                x, y = r // n, r % n
+                singles.add((x, y, self.candidates[y * n + x].bit_length()))
+        return singles
+
+
+class BitmaskSudokuRater (SudokuRater, BitmaskSudokuSolver, SinglesTrackingGrid):
+    """A SudokuRater on top of SinglesTrackingGrid.
+
+    scan_fillables() reads the singles the grid keeps up to date
+    instead of running fill_must_fills() and fill_deterministically()
+    over the whole grid in fake-add mode. The tiers it records are the
+    same."""
+
+    def scan_fillables(self):
+        if not self.track_singles:
+            self.start_tracking()
+        must_fills = self.hidden_singles()
+        eliminations = self.naked_singles()
+        self.fill_must_fillables[self.tier] = must_fills - self.filled
+        self.elimination_fillables[self.tier] = eliminations - self.filled
+        self.filled = self.filled | self.fill_must_fillables[
+            self.tier] | self.elimination_fillables[self.tier]
+        self.add_me_queue = list(must_fills) + list(eliminations)
+
+    def guess_least_open_square(self):
+        # we only scan before the first guess
+        self.track_singles = False
+        return SudokuRater.guess_least_open_square(self)
+
+
+ENGINE_SET = 'set'
+ENGINE_BITMASK = 'bitmask'
+
+SudokuSolver.engines = {ENGINE_SET: SudokuSolver,
+                        ENGINE_BITMASK: BitmaskSudokuSolver}
+SudokuRater.engines = {ENGINE_SET: SudokuRater,
+                       ENGINE_BITMASK: BitmaskSudokuRater}
+
+
+class GuessList:
+    """Guesses in the order they were made.
+
+    Guesses are indexed by identity and by coordinates, so membership,
+    removal and guesses_for_coord() don't have to scan the list."""
+
+    def __init__(self, guesses=()):
+        self._guesses = {}  # guess -> None, in insertion order
+        self._by_coord = {}  # (x, y) -> {guess: None}
+        for guess in guesses:
+            self.append(guess)
+
+    def append(self, guess):
+        self._guesses[guess] = None
+        coord = (guess.x, guess.y)
+        if coord in self._by_coord:
+            self._by_coord[coord][guess] = None
+        else:
+            self._by_coord[coord] = {guess: None}
+
+    def remove(self, guess):
+        try:
+            del self._guesses[guess]
+        except KeyError:
+            raise ValueError('%r is not in %s' % (guess, type(self).__name__))
+        coord = (guess.x, guess.y)
+        at_coord = self._by_coord[coord]
+        del at_coord[guess]
+        if not at_coord:
+            del self._by_coord[coord]
+
+    def __contains__(self, guess):
+        return guess in self._guesses
+
+    def __iter__(self):
+        return iter(self._guesses)
+
+    def __len__(self):
+        return len(self._guesses)
+
+    def __getitem__(self, index):
+        if index == -1 and self._guesses:
+            return next(reversed(self._guesses))
+        return list(self._guesses)[index]
+
+    def __repr__(self):
+        return repr(list(self._guesses))
 
     def guesses_for_coord(self, x, y):
-        return set([guess.val for guess in [guess for guess in self if guess.x == x and guess.y == y]])
+        return set([guess.val for guess in self._by_coord.get((x, y), ())])
 
     def remove_children(self, guess):
         removed = []
         for g in guess.children:
-            # print 'removing descendant of ',guess,':',g
             if g in self:
                 removed.append(g)
                 self.remove(g)
-                # print 'recursion from ',g,'->'
-                # removed.extend(self.remove_descendants(g))
         return removed
 
     def remove_guesses_for_coord(self, x, y):
+        """Remove the first guess on x,y and every guess made after it."""
         nuking = False
         nuked = []
-        for i in range(len(self)-1):
-            g = self[i-len(nuked)]
+        for g in list(self._guesses):
             if g.x == x and g.y == y:
                 nuking = True
             if nuking:
-                # print 'nuking ',g
                 self.remove(g)
                 nuked += [g]
         return nuked
@@ -733,14 +1475,16 @@ class GuessList (list):
 class BreadcrumbTrail (GuessList):
     def append(self, guess):
         # Raise an error if we add something to ourselves twice
-        if self.guesses_for_coord(guess.x, guess.y):
+        if (guess.x, guess.y) in self._by_coord:
             raise ValueError("We already have crumbs on %s,%s" %
                              (guess.x, guess.y))
         else:
-            list.append(self, guess)
+            GuessList.append(self, guess)
 
 
 class Guess:
+    __slots__ = ('x', 'y', 'children', 'val', 'consequences')
+
     def __init__(self, x, y, val):
         self.x = x
         self.y = y
@@ -0,0 +1,229 @@
+"""Fixed-seed benchmarks for generation, solving and PDF rendering.
+
+    python benchmark.py --out results.json
+    python benchmark.py --baseline results.json --threshold 0.2
+
+Every run generates the same puzzles for each grid size and difficulty
+band and measures
+
+* puzzles/sec of make_puzzles()
+* p50/p95/p99 latency of SudokuSolver.solve(), has_unique_solution()
+  and SudokuRater.difficulty() on those puzzles
+* pages/sec and bytes per page of the printpuzzles renderers for 1, 4
+  and 6 puzzles per page, solutions included
+* peak RSS
+
+and writes the numbers as JSON. Generation and rendering are timed
+--repeats times and the median is kept. Given a baseline, every number
+that got worse by more than the threshold is reported and the exit
+status is 1. Of the latencies only the p50 is compared: with a few
+puzzles per size the p95 and p99 are the slowest one or two calls.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+from conf import load_config
+from main import createPDF
+from Generator.sudoku_solver import SudokuSolver, SudokuRater, DIFFICULTY_BANDS
+from Generator.sudoku_maker import make_puzzles
+
+SIZES = (3, 4)
+LAYOUTS = (1, 4, 6)
+# timed runs of generation and rendering, of which the median is kept
+REPEATS = 3
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    rank = max(1, int(round(p / 100.0 * len(values))))
+    return values[min(rank, len(values)) - 1]
+
+
+def latency_stats(seconds):
+    ms = [s * 1000 for s in seconds]
+    return {'calls': len(ms),
+            'p50_ms': percentile(ms, 50),
+            'p95_ms': percentile(ms, 95),
+            'p99_ms': percentile(ms, 99)}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_make_puzzles(square_size, band, count, engine, mode, seed, repeats=1):
+    seconds = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeats):
+            start = time.perf_counter()
+            puzzles = make_puzzles(count, band, False, square_size, engine,
+                                   seed=seed, mode=mode)
+            seconds.append(time.perf_counter() - start)
+    elapsed = statistics.median(seconds)
+    return puzzles, {'puzzles': count, 'seconds': elapsed,
+                     'puzzles_per_sec': count / elapsed}
+
+
+def bench_solver(puzzles, engine, seed):
+    solve, unique, difficulty = [], [], []
+    # the solver guesses at random
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for puzzle in puzzles:
+            n = puzzle.puzzle.group_size
+            solver = SudokuSolver(puzzle.puzzle.grid, group_size=n,
+                                  engine=engine)
+            solve.append(timed(solver.solve))
+            solver = SudokuSolver(puzzle.puzzle.grid, group_size=n,
+                                  engine=engine)
+            unique.append(timed(solver.has_unique_solution))
+            rater = SudokuRater(puzzle.puzzle.grid, group_size=n,
+                                engine=engine)
+            difficulty.append(timed(rater.difficulty))
+    return {'solve': latency_stats(solve),
+            'has_unique_solution': latency_stats(unique),
+            'difficulty': latency_stats(difficulty)}
+
+
+# a page object, not the /Pages tree
+PAGE_OBJECT = re.compile(rb'/Type\s*/Page\b(?!s)')
+
+
+def render(puzzles, config, workers=1):
+    """Draw puzzles and their solutions with main.createPDF and return
+    the PDF bytes and the page count."""
+    out = io.BytesIO()
+    createPDF(out, puzzles, config, workers)
+    pdf = out.getvalue()
+    return pdf, len(PAGE_OBJECT.findall(pdf))
+
+
+def bench_render(puzzles, per_page, config, workers=1, repeats=1):
+    config = config.updated({'SUDOKUS_PER_PAGE': per_page,
+                             'SHOW_SOLUTIONS': True})
+    seconds = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeats):
+            start = time.perf_counter()
+            pdf, pages = render(puzzles, config, workers)
+            seconds.append(time.perf_counter() - start)
+    elapsed = statistics.median(seconds)
+    return {'pages': pages, 'seconds': elapsed,
+            'pages_per_sec': pages / elapsed,
+            'bytes_per_page': len(pdf) / pages}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+
+def run(config, sizes=SIZES, bands=DIFFICULTY_BANDS, layouts=LAYOUTS, count=3,
+        engine=None, mode=None, seed=1, repeats=REPEATS, render_workers=1):
+    results = {}
+    for square_size in sizes:
+        n = square_size * square_size
+        generated = []
+        for band in bands:
+            print('make_puzzles %sx%s %s...' % (n, n, band))
+            puzzles, stats = bench_make_puzzles(square_size, band, count,
+                                                engine, mode, seed, repeats)
+            results['make_puzzles/%sx%s/%s' % (n, n, band)] = stats
+            generated.extend(puzzles)
+        print('solver %sx%s...' % (n, n))
+        for name, stats in bench_solver(generated, engine, seed).items():
+            results['%s/%sx%s' % (name, n, n)] = stats
+        for per_page in layouts:
+            print('render %sx%s, %s per page...' % (n, n, per_page))
+            results['render/%sx%s/%s_per_page' % (n, n, per_page)] = \
+                bench_render(generated, per_page, config, render_workers, repeats)
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def lower_is_better(metric):
+    return not metric.endswith('_per_sec')
+
+
+# only these are compared; counts and raw seconds depend on the workload,
+# and the p95 and p99 of a few calls are too noisy
+COMPARED = ('puzzles_per_sec', 'pages_per_sec', 'bytes_per_page',
+            'p50_ms', 'self')
+
+
+def compare(results, baseline, threshold):
+    """Return a line for every number that got worse than in baseline by
+    more than threshold (a fraction, 0.2 = 20%)."""
+    regressions = []
+    for name, stats in sorted(results.items()):
+        old_stats = baseline.get(name, {})
+        for metric, value in sorted(stats.items()):
+            old = old_stats.get(metric)
+            if metric not in COMPARED or not old:
+                continue
+            change = (value - old) / old
+            if not lower_is_better(metric):
+                change = -change
+            if change > threshold:
+                regressions.append('%s %s: %.4g -> %.4g (%+.0f%%)' % (
+                    name, metric, old, value, change * 100))
+    return regressions
+
+
+if __name__ == '__main__':
+    config = load_config()
+    parser = argparse.ArgumentParser(description='Benchmark generation, solving and rendering.')
+    parser.add_argument('--count', type=int, default=3,
+                        help='puzzles per size and band (default: 3)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='SUDOKU_SQUARE_SIZEs to run (default: 3 4)')
+    parser.add_argument('--bands', nargs='+', default=DIFFICULTY_BANDS,
+                        help='difficulty bands to run (default: all)')
+    parser.add_argument('--layouts', type=int, nargs='+', default=LAYOUTS,
+                        help='puzzles per page to render (default: 1 4 6)')
+    parser.add_argument('--engine', default=config['SOLVER_ENGINE'])
+    parser.add_argument('--mode', default=config['GENERATION_MODE'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+                        help='timed runs of generation and rendering, the median is kept (default: %d)' % REPEATS)
+    parser.add_argument('--render-workers', type=int, default=config['RENDER_WORKERS'],
+                        help='processes drawing the PDF, see main.createPDF (default: RENDER_WORKERS)')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown against the baseline (default: 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    results = run(config, args.sizes, args.bands, args.layouts, args.count,
+                  args.engine, args.mode, args.seed, args.repeats,
+                  args.render_workers)
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'args': vars(args),
+              'results': results}
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            sys.exit(1)
+        print('No regressions beyond %d%%' % (args.threshold * 100))
@@ -1,11 +1,12 @@
 import json
 import math
 import os
-import sys
-from reportlab.lib.units import mm, inch
 
 ROOT_DIR = os.path.abspath(os.curdir)
 
+# reportlab.lib.units.mm, so reading the settings doesn't import ReportLab
+mm = 72.0 / 2.54 * 0.1
+
 # helper functions
 def nextnonexistent(file):
     """create and increment new file next to sibling"""
@@ -26,30 +27,35 @@ def get_din_size(pagesize):
     return math.ceil(din_width), math.ceil(din_height)
 
 
-with open('settings.json') as f:
-    json_data = json.load(f)
+class Config(dict):
+    """The keys of settings.json and the values derived from them.
 
-# set pdf folder path
-folder = ROOT_DIR + os.sep + 'pdfs'
+    Load it once with load_config() and hand it to whatever needs it;
+    nothing reads settings.json on import."""
 
-# get PDF page size settings and reportlab tuples by multiplication with mm
-# reference: A4 = (210*mm,297*mm)
-PAGE_SIZE = tuple(mm * elem for elem in eval(json_data["PDF_PAGE_SIZE"]))
+    @property
+    def page_size(self):
+        """Page width and height in points, from PDF_PAGE_SIZE in mm."""
+        # reference: A4 = (210*mm,297*mm)
+        return tuple(mm * float(elem) for elem in self['PDF_PAGE_SIZE'].split(','))
 
-# for attr, value in pdf_sizes.items():
-#     if (json_data['PDF_PAGE_SIZE'] == attr):
-#         PAGE_SIZE = value
+    @property
+    def din_size(self):
+        return get_din_size(self.page_size)
 
-# get file name and create new files
-pdf_file_name = json_data['PDF_FILE_NAME']
-pdf_file_path = str(folder + os.sep + pdf_file_name + '.pdf')
+    def pdf_file_path(self):
+        """Return a path in the pdfs folder for PDF_FILE_NAME; if the file
+        exists already, the name is incremented."""
+        folder = ROOT_DIR + os.sep + 'pdfs'
+        return nextnonexistent(str(folder + os.sep + self['PDF_FILE_NAME'] + '.pdf'))
 
-pdf_file_path = nextnonexistent(pdf_file_path)
+    def updated(self, settings):
+        """Return a copy with some settings changed."""
+        config = Config(self)
+        config.update(settings)
+        return config
 
-# get desired amount of puzzles
-amount = json_data['SUDOKU_AMOUNT']
-if len(sys.argv) > 1:
-    amount = sys.argv[1]
 
-# get desired amount of puzzles displayed per page
-amount_per_page = json_data['SUDOKUS_PER_PAGE']
\ No newline at end of file
+def load_config(path='settings.json'):
+    with open(path) as f:
+        return Config(json.load(f))
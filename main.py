@@ -1,70 +1,121 @@
-import math
+import argparse
+import contextlib
+import itertools
+import os
 import sys
 import time
-import json
-from conf import pdf_file_path, PAGE_SIZE, amount_per_page
-from reportlab.pdfgen import canvas
-from Generator.sudoku_maker import make_puzzles
-from Generator.printpuzzles import generate_single_pdf, generate_four_pdf, generateSolutions, generate_six_pdf
+from conf import load_config, ROOT_DIR
+from Generator.sudoku_maker import make_puzzles, iter_puzzles, PuzzleRecord, difficulty_bands
+from Generator.puzzle_pool import PuzzlePool
+from Generator import instrumentation
 
-with open('settings.json') as f:
-    json_data = json.load(f)
 
-# create pdf canvas
-doc = canvas.Canvas(filename=pdf_file_path, pagesize=PAGE_SIZE)
+def page_chunks(puzzles, perPage):
+    """Group an iterable of puzzles into lists of perPage puzzles,
+    taking only as many from it as the next page needs."""
+    puzzles = iter(puzzles)
+    while 1:
+        plist = list(itertools.islice(puzzles, perPage))
+        if not plist:
+            return
+        yield plist
 
-# grab current time before running the code
-start = time.time()
 
+def generate(config, amount, workers=1, seed=None, puzzle_pool=None, pool=None):
+    """Return the puzzles for a book: a sorted list with
+    SORT_BY_DIFFICULTY, otherwise a generator yielding them as they are
+    made, so createPDF can start drawing right away. An unknown
+    DIFFICULTY_LEVEL raises ValueError here, before any work starts."""
+    difficulty_bands(config['DIFFICULTY_LEVEL'])
+    if config['SORT_BY_DIFFICULTY']:
+        # sorting needs every puzzle before the first page
+        return make_puzzles(amount, config['DIFFICULTY_LEVEL'], True, config['SUDOKU_SQUARE_SIZE'], config['SOLVER_ENGINE'],
+                            workers, seed, config['GENERATION_MODE'], puzzle_pool, pool)
+    return iter_puzzles(amount, config['DIFFICULTY_LEVEL'], config['SUDOKU_SQUARE_SIZE'], config['SOLVER_ENGINE'],
+                        workers, seed, config['GENERATION_MODE'], puzzle_pool, pool)
 
-def createPDF(output_file, puzzles, perPage = 1, showSolutions = json_data['SHOW_SOLUTIONS']):
-    # doc = canvas.Canvas(filename=output_file, pagesize=PAGE_SIZE)
+
+def createPDF(output_file, puzzles, config, renderWorkers = 1):
+    """Draw puzzles, any iterable of PuzzleRecords, to output_file, a
+    path or a binary file object, with SUDOKUS_PER_PAGE puzzles to a page.
+
+    Each page is drawn as soon as its puzzles are there, so with a
+    generator (see iter_puzzles()) drawing starts with the first puzzle.
+    Only solution and rating are kept for the solution pages. With
+    renderWorkers > 1 the pages are drawn in chunks on that many
+    processes and merged, see Generator/chunked_pdf.py."""
+    perPage = config['SUDOKUS_PER_PAGE']
+    showSolutions = config['SHOW_SOLUTIONS']
+    if renderWorkers > 1:
+        from Generator import chunked_pdf
+        chunked_pdf.create_pdf(output_file, puzzles, config, renderWorkers)
+        return
+    if perPage not in (1, 4, 6):
+        return
+    # ReportLab is only imported once there is something to draw
+    from reportlab.pdfgen import canvas
+    from Generator.printpuzzles import generate_single_pdf, generate_four_pdf, generateSolutions, \
+        generate_six_pdf, board_sizes
+    doc = canvas.Canvas(filename=output_file, pagesize=config.page_size)
     doc_page_number = 1
+    solutions = []
 
-    if perPage == 1:
-        i = 0
-        for puzzle in puzzles:
-            # print("PUZZLE CREATE PDF", puzzle)
-            i += 1
-            doc_page_number = doc.getPageNumber()
-            # TODO: update for dynamic grid size
-            nine_puz_grid_size = [3, 3, puzzle[0].group_size]
-            boardsize = nine_puz_grid_size
-            # generate_single_pdf(boardsize, doc, i, i + 1, puzzle)
-            generate_single_pdf(puzzle, boardsize, doc, i)
-            doc.showPage()
-        if showSolutions:
-            generateSolutions(doc, puzzles, doc_page_number)
-            doc.showPage()
-        doc.save()
-    elif perPage == 4:
-        for i in range(0, int(math.ceil(float(len(puzzles)) / 4))):
-            doc_page_number = doc.getPageNumber()
-            plist = puzzles[i*4:(i+1)*4]
-            generate_four_pdf(doc, i + 1, plist)
-            doc.showPage()
-        if showSolutions:
-            generateSolutions(doc, puzzles, doc_page_number)
-            doc.showPage()
-        doc.save()
-    elif perPage == 6:
-        for i in range(0, int(math.ceil(float(len(puzzles)) / 6))):
-            doc_page_number = doc.getPageNumber()
-            plist = puzzles[i * 6:(i + 1) * 6]
-            generate_six_pdf(doc, i + 1, plist)
-            doc.showPage()
+    for i, plist in enumerate(page_chunks(puzzles, perPage)):
+        doc_page_number = doc.getPageNumber()
+        if perPage == 1:
+            boardsize = board_sizes(plist[0][0])
+            generate_single_pdf(plist[0], boardsize, doc, i + 1, config)
+        elif perPage == 4:
+            generate_four_pdf(doc, i + 1, plist, config)
+        elif perPage == 6:
+            generate_six_pdf(doc, i + 1, plist, config)
+        doc.showPage()
         if showSolutions:
-            generateSolutions(doc, puzzles, doc_page_number)
-            doc.showPage()
-        doc.save()
+            solutions.extend(PuzzleRecord(None, p.rating, p.solution) for p in plist)
+    if showSolutions:
+        generateSolutions(doc, solutions, doc_page_number, config)
+        doc.showPage()
+    doc.save()
 
 
 if __name__ == '__main__':
-    puzzles = make_puzzles(json_data['SUDOKU_AMOUNT'], json_data['DIFFICULTY_LEVEL'], json_data['SORT_BY_DIFFICULTY'], json_data['SUDOKU_SQUARE_SIZE'])
-    createPDF(pdf_file_path, puzzles, amount_per_page)
+    # grab current time before running the code
+    start = time.time()
+    config = load_config()
+    parser = argparse.ArgumentParser(description='Generate a PDF of Sudoku puzzles.')
+    parser.add_argument('amount', nargs='?', type=int, default=config['SUDOKU_AMOUNT'],
+                        help='number of puzzles (default: SUDOKU_AMOUNT)')
+    parser.add_argument('-w', '--workers', type=int, default=config['SUDOKU_WORKERS'],
+                        help='number of worker processes (default: SUDOKU_WORKERS)')
+    parser.add_argument('-r', '--render-workers', type=int, default=config['RENDER_WORKERS'],
+                        help='number of processes drawing the PDF, more than 1 needs pypdf (default: RENDER_WORKERS)')
+    parser.add_argument('-s', '--seed', type=int, default=config['SUDOKU_SEED'],
+                        help='master random seed (default: SUDOKU_SEED)')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='count guesses, backtraces, rejected puzzles etc. and write them to FILE as JSON')
+    parser.add_argument('--profile', choices=instrumentation.PROFILERS,
+                        help='run under cProfile or tracemalloc')
+    parser.add_argument('--profile-out', metavar='FILE', default='profile.txt',
+                        help='where to write the profile report (default: profile.txt)')
+    args = parser.parse_args()
+    if args.stats:
+        instrumentation.enable()
+    profiler = contextlib.nullcontext()
+    if args.profile:
+        profiler = instrumentation.profile(args.profile, args.profile_out)
+    puzzle_pool = None
+    if config['PUZZLE_POOL']:
+        puzzle_pool = PuzzlePool(os.path.join(ROOT_DIR, config['PUZZLE_POOL']))
+    pdf_file_path = config.pdf_file_path()
+    with profiler:
+        puzzles = generate(config, args.amount, args.workers, args.seed, puzzle_pool)
+        with instrumentation.stage('main.create_pdf'):
+            createPDF(pdf_file_path, puzzles, config, args.render_workers)
+    if args.stats:
+        instrumentation.dump(args.stats)
 
-# grab current time after running the code
-end = time.time()
-total_time = end - start
-print("Total time:\n" + str(total_time) + " seconds.")
+    # grab current time after running the code
+    end = time.time()
+    total_time = end - start
+    print("Total time:\n" + str(total_time) + " seconds.")
 
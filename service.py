@@ -0,0 +1,273 @@
+"""Local HTTP service that generates Sudoku PDFs on request.
+
+    python service.py --port 8080 --workers 4
+
+POST a JSON object with any of the keys of settings.json; the rest is
+taken from settings.json. The response is the PDF:
+
+    curl -d '{"SUDOKU_AMOUNT": 4, "SUDOKUS_PER_PAGE": 4}' localhost:8080 -o book.pdf
+
+PUZZLE_POOL, RENDER_WORKERS and SUDOKU_WORKERS name a file on the
+server or start processes, so they are only taken from settings.json
+and the command line; a request that sets them is refused.
+
+Unlike a run of main.py per book, the service keeps its generator
+worker processes, ReportLab and the registered fonts loaded between
+requests. Every book is generated and drawn in a thread of an executor,
+so concurrent requests don't wait for each other. With --workers 1
+puzzles are generated in those threads too; then a SUDOKU_SEED only
+gives the same book while no other request is running.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import re
+from conf import load_config, ROOT_DIR
+from Generator.puzzle_pool import PuzzlePool
+from Generator.sudoku_maker import difficulty_bands, MODE_RANDOM, MODE_DIG
+from Generator.sudoku_solver import SudokuSolver
+from main import generate, createPDF
+
+# bytes written to the socket at a time
+SEND_BLOCK = 64 * 1024
+MAX_BODY = 64 * 1024
+
+# settings only the service itself may choose
+SERVER_SETTINGS = ('PUZZLE_POOL', 'RENDER_WORKERS', 'SUDOKU_WORKERS')
+
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_name(value):
+    # goes into a file name and the Content-Disposition header
+    return isinstance(value, str) and re.fullmatch(r'[\w .-]{1,100}', value, re.ASCII) is not None
+
+
+def is_page_size(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        sizes = [float(v) for v in value.split(',')]
+    except ValueError:
+        return False
+    return len(sizes) == 2 and all(10 <= v <= 2000 for v in sizes)
+
+
+def is_difficulty(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        difficulty_bands(value)
+    except ValueError:
+        return False
+    return True
+
+
+def is_font_size(value):
+    return is_number(value) and 1 <= value <= 100
+
+
+# what a request may set each setting to; SUDOKU_AMOUNT is also held to
+# the service's --max-amount
+SETTING_CHECKS = {
+    'PDF_FILE_NAME': (is_name, 'a name of letters, digits, spaces, ".", "-" and "_"'),
+    'PDF_PAGE_SIZE': (is_page_size, '"width,height" in mm, each between 10 and 2000'),
+    'SUDOKU_SQUARE_SIZE': (lambda v: is_int(v) and 2 <= v <= 5, '2, 3, 4 or 5'),
+    'SUDOKU_AMOUNT': (is_int, 'a whole number'),
+    'SUDOKUS_PER_PAGE': (lambda v: is_int(v) and v in (1, 4, 6), '1, 4 or 6'),
+    'DIFFICULTY_LEVEL': (is_difficulty, '"Any" or difficulty bands like "Easy, Medium"'),
+    'SORT_BY_DIFFICULTY': (lambda v: isinstance(v, bool), 'true or false'),
+    'SOLVER_ENGINE': (lambda v: v in SudokuSolver.engines, ' or '.join(sorted(SudokuSolver.engines))),
+    'SUDOKU_SEED': (lambda v: v is None or is_int(v) or (isinstance(v, str) and len(v) <= 100),
+                    'null, a whole number or a short string'),
+    'GENERATION_MODE': (lambda v: v in (MODE_RANDOM, MODE_DIG), '"%s" or "%s"' % (MODE_RANDOM, MODE_DIG)),
+    'CUSTOM_FONT': (lambda v: v == '' or (is_name(v) and re.fullmatch(r'[\w-]+', v, re.ASCII)),
+                    'the name of a TTF file in the fonts folder, or ""'),
+    'FONT_SIZE_SINGLE_PAGE': (is_font_size, 'a number between 1 and 100'),
+    'FONT_SIZE_4_PAGE': (is_font_size, 'a number between 1 and 100'),
+    'FONT_SIZE_6_PAGE': (is_font_size, 'a number between 1 and 100'),
+    'FONT_SIZE_SOLUTIONS': (is_font_size, 'a number between 1 and 100'),
+    'FONT_SIZE_SOLUTIONS_4GRID': (is_font_size, 'a number between 1 and 100'),
+    'SHOW_SOLUTIONS': (lambda v: isinstance(v, bool), 'true or false'),
+    'CUSTOM_TEXT': (lambda v: isinstance(v, str) and len(v) <= 200, 'a string of up to 200 characters'),
+    'SHOW_DIFFICULTY_TEXT': (lambda v: isinstance(v, bool), 'true or false'),
+}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class SudokuService:
+    """Generates books from a base Config on warm worker processes."""
+
+    def __init__(self, config, workers=1, threads=4, max_amount=1000):
+        self.config = config
+        self.workers = workers
+        self.max_amount = max_amount
+        self.pool = None
+        if workers > 1:
+            self.pool = multiprocessing.Pool(workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+        # load ReportLab and register the font before the first request
+        from Generator.printpuzzles import custom_font
+        custom_font(config)
+
+    def close(self):
+        self.executor.shutdown()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+    def request_config(self, body):
+        """Return the Config for a request body, the settings to change as
+        a JSON object."""
+        try:
+            settings = json.loads(body or b'{}')
+        except ValueError as e:
+            raise RequestError(400, 'Invalid JSON: %s' % e)
+        if not isinstance(settings, dict):
+            raise RequestError(400, 'Expected a JSON object of settings')
+        unknown = sorted(set(settings) - set(SETTING_CHECKS) - set(SERVER_SETTINGS))
+        if unknown:
+            raise RequestError(400, 'Unknown settings: %s' % ', '.join(unknown))
+        reserved = sorted(set(settings) & set(SERVER_SETTINGS))
+        if reserved:
+            raise RequestError(400, 'Settings of the service, not of a request: %s'
+                               % ', '.join(reserved))
+        for key, value in sorted(settings.items()):
+            test, expected = SETTING_CHECKS[key]
+            if not test(value):
+                raise RequestError(400, '%s must be %s, not %s' % (key, expected, json.dumps(value)))
+        config = self.config.updated(settings)
+        if not 0 < config['SUDOKU_AMOUNT'] <= self.max_amount:
+            raise RequestError(400, 'SUDOKU_AMOUNT must be between 1 and %s' % self.max_amount)
+        return config
+
+    def make_book(self, config):
+        """Generate and draw a book; runs in an executor thread."""
+        puzzle_pool = None
+        if config['PUZZLE_POOL']:
+            # SQLite connections can't be shared between threads
+            puzzle_pool = PuzzlePool(os.path.join(ROOT_DIR, config['PUZZLE_POOL']))
+        try:
+            puzzles = generate(config, config['SUDOKU_AMOUNT'], self.workers,
+                               config['SUDOKU_SEED'], puzzle_pool, self.pool)
+            out = io.BytesIO()
+            createPDF(out, puzzles, config, config['RENDER_WORKERS'])
+            return out.getvalue()
+        finally:
+            if puzzle_pool is not None:
+                puzzle_pool.close()
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await read_request(reader)
+                if path.split('?')[0] != '/':
+                    raise RequestError(404, 'Not found: %s' % path)
+                if method != 'POST':
+                    raise RequestError(405, 'POST a JSON object of settings')
+                config = self.request_config(body)
+                loop = asyncio.get_running_loop()
+                pdf = await loop.run_in_executor(self.executor, self.make_book, config)
+            except RequestError as e:
+                await respond(writer, e.status, str(e).encode() + b'\n', 'text/plain')
+            except Exception as e:
+                await respond(writer, 500, ('%s: %s\n' % (type(e).__name__, e)).encode(), 'text/plain')
+            else:
+                await respond(writer, 200, pdf, 'application/pdf',
+                              {'Content-Disposition': 'attachment; filename="%s.pdf"' % config['PDF_FILE_NAME']})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader):
+    """Return method, path, headers and body of an HTTP request."""
+    try:
+        request_line = await reader.readline()
+        method, path, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise RequestError(400, 'Malformed request line')
+    headers = {}
+    while 1:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, 'Invalid Content-Length')
+    if length > MAX_BODY:
+        raise RequestError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+async def respond(writer, status, body, content_type, extra_headers=None):
+    headers = {'Content-Type': content_type,
+               'Content-Length': str(len(body)),
+               'Connection': 'close'}
+    headers.update(extra_headers or {})
+    head = 'HTTP/1.1 %s %s\r\n' % (status, REASONS[status])
+    head += ''.join('%s: %s\r\n' % item for item in headers.items())
+    writer.write((head + '\r\n').encode('latin-1'))
+    # send the PDF in blocks, waiting for the client to keep up
+    for start in range(0, len(body), SEND_BLOCK):
+        writer.write(body[start:start + SEND_BLOCK])
+        await writer.drain()
+    await writer.drain()
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handle, host, port)
+    print('Serving Sudoku PDFs on http://%s:%s/' % (host, port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    config = load_config()
+    parser = argparse.ArgumentParser(description='Serve Sudoku PDFs over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-w', '--workers', type=int, default=config['SUDOKU_WORKERS'],
+                        help='generator worker processes kept running (default: SUDOKU_WORKERS)')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='books generated and drawn at the same time (default: 4)')
+    parser.add_argument('--max-amount', type=int, default=1000,
+                        help='largest SUDOKU_AMOUNT a request may ask for (default: 1000)')
+    parser.add_argument('-r', '--render-workers', type=int, default=config['RENDER_WORKERS'],
+                        help='processes drawing each PDF (default: RENDER_WORKERS)')
+    parser.add_argument('--puzzle-pool', default=config['PUZZLE_POOL'],
+                        help='puzzle pool to draw from (default: PUZZLE_POOL)')
+    args = parser.parse_args()
+    config = config.updated({'RENDER_WORKERS': args.render_workers,
+                             'PUZZLE_POOL': args.puzzle_pool})
+    service = SudokuService(config, args.workers, args.threads, args.max_amount)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,85 @@
+import random
+import numpy as np
+import pytest
+from Generator import mask_search
+from Generator.batch_propagation import propagate
+from Generator.exact_cover import check_unique
+
+# solved by singles alone
+EASY = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+        '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+        '4 0 0 1 0 0 3 9 0')
+# unique, but needs a search
+HARD = ('8 0 0 0 0 0 0 0 0 0 0 3 6 0 0 0 0 0 0 7 0 0 9 0 2 0 0 0 5 0 0 0 7 0 0 0 '
+        '0 0 0 0 4 5 7 0 0 0 0 0 1 0 0 0 3 0 0 0 1 0 0 0 0 6 8 0 0 8 5 0 0 0 1 0 '
+        '0 9 0 0 0 0 4 0 0')
+
+
+def grid(puzzle):
+    return np.array(puzzle.split(), dtype=np.int8).reshape(9, 9)
+
+
+def solution_of(puzzle):
+    unique, solution = check_unique(grid(puzzle))
+    assert unique
+    return np.array(solution, dtype=np.int8)
+
+
+def test_a_puzzle_of_singles_is_solved():
+    grids, solved, contradiction = propagate(grid(EASY)[None])
+    assert solved.tolist() == [True]
+    assert contradiction.tolist() == [False]
+    assert np.array_equal(grids[0], solution_of(EASY))
+
+
+def test_a_hard_puzzle_is_left_for_the_search():
+    grids, solved, contradiction = propagate(grid(HARD)[None])
+    assert not solved[0] and not contradiction[0]
+    filled = grids[0] != 0
+    assert filled.sum() >= (grid(HARD) != 0).sum()
+    assert np.array_equal(grids[0][filled], solution_of(HARD)[filled])
+
+
+def test_a_puzzle_with_several_solutions_is_not_solved():
+    solution = solution_of(EASY)
+    puzzle = solution.copy()
+    # two empty rows of one band can swap places
+    puzzle[3:5] = 0
+    grids, solved, contradiction = propagate(puzzle[None])
+    assert not solved[0] and not contradiction[0]
+    assert not check_unique(puzzle)[0]
+    assert np.array_equal(grids[0], puzzle)
+
+
+@pytest.mark.parametrize('y, x', [(0, 0), (0, 3)])
+def test_a_broken_puzzle_is_a_contradiction(y, x):
+    puzzle = grid(EASY)
+    # a second 8 in the first row
+    puzzle[y, x] = 8
+    grids, solved, contradiction = propagate(puzzle[None])
+    assert contradiction.tolist() == [True]
+    assert solved.tolist() == [False]
+
+
+def test_a_batch_gives_the_same_results_as_single_puzzles():
+    broken = grid(EASY)
+    broken[0, 0] = 8
+    puzzles = [grid(EASY), grid(HARD), broken, np.zeros((9, 9), dtype=np.int8)]
+    grids, solved, contradiction = propagate(np.array(puzzles))
+    for i, puzzle in enumerate(puzzles):
+        one, one_solved, one_contradiction = propagate(puzzle[None])
+        assert solved[i] == one_solved[0]
+        assert contradiction[i] == one_contradiction[0]
+        assert np.array_equal(grids[i], one[0])
+
+
+@pytest.mark.parametrize('group_size', [4, 16])
+def test_other_sizes_are_solved_by_singles(group_size):
+    n = group_size
+    solution = np.array(mask_search.random_solution(n, random.Random(1)), dtype=np.int8)
+    puzzle = solution.copy()
+    # one open square in every row and every column
+    puzzle[np.arange(n), (np.arange(n) * 3 + 1) % n] = 0
+    grids, solved, contradiction = propagate(puzzle[None], n)
+    assert solved.tolist() == [True]
+    assert np.array_equal(grids[0], solution)
@@ -0,0 +1,140 @@
+import contextlib
+import io
+import math
+import random
+import time
+import pytest
+from Generator import instrumentation
+from Generator.canonical import PuzzleIndex, canonical_form, puzzle_key, puzzle_rows
+from Generator.puzzle_pool import PuzzlePool
+from Generator.sudoku_maker import SudokuGenerator, generate_puzzle_data, iter_puzzles, puzzle_seeds
+
+
+def generate(seed, group_size=9):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_puzzle_data((seed, 'Any', group_size, 'bitmask', 'random'))
+
+
+def variant(puzzle, group_size, rnd):
+    """Return a random variant of a puzzle string: digits relabelled,
+    rows and columns swapped within their band or stack, bands and
+    stacks swapped and, half of the time, the grid transposed."""
+    n = group_size
+    w = int(math.sqrt(n))
+    rows = puzzle_rows(puzzle, n)
+
+    def line_order():
+        bands = list(range(w))
+        rnd.shuffle(bands)
+        order = []
+        for band in bands:
+            lines = list(range(band * w, (band + 1) * w))
+            rnd.shuffle(lines)
+            order += lines
+        return order
+
+    row_order, col_order = line_order(), line_order()
+    digits = list(range(1, n + 1))
+    rnd.shuffle(digits)
+    grid = [[rows[r][c] for c in col_order] for r in row_order]
+    if rnd.random() < 0.5:
+        grid = [list(col) for col in zip(*grid)]
+    return ' '.join(str(digits[v - 1] if v else 0) for row in grid for v in row)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_variants_have_the_same_key(seed):
+    puzzle = generate(seed)[0]
+    rnd = random.Random(seed)
+    key = puzzle_key(puzzle, 9)
+    form = canonical_form(puzzle, 9)
+    for i in range(10):
+        other = variant(puzzle, 9, rnd)
+        assert puzzle_key(other, 9) == key
+        assert canonical_form(other, 9) == form
+
+
+def test_different_puzzles_have_different_keys():
+    puzzles = [generate(seed)[0] for seed in range(8)]
+    assert len(set(puzzles)) == len(puzzles)
+    assert len(set(puzzle_key(p, 9) for p in puzzles)) == len(puzzles)
+
+
+def test_a_variant_is_seen_within_one_run():
+    rnd = random.Random(1)
+    data = generate(1)
+    index = PuzzleIndex(9)
+    assert index.add(data[0], data[1:5])
+    other = variant(data[0], 9, rnd)
+    assert index.seen(other)
+    assert not index.add(other, data[1:5])
+    assert len(index) == 1
+    assert index.add(generate(2)[0])
+
+
+def test_a_variant_of_a_pool_puzzle_is_seen(tmp_path):
+    rnd = random.Random(2)
+    data = generate(3)
+    pool = PuzzlePool(str(tmp_path / 'pool.sqlite'))
+    try:
+        assert pool.add(9, [data]) == 1
+        other = variant(data[0], 9, rnd)
+        # the pool itself refuses the variant too
+        assert pool.add(9, [(other,) + data[1:]]) == 0
+        assert pool.has_key(9, puzzle_key(other, 9))
+        assert not pool.has_key(16, puzzle_key(other, 9))
+    finally:
+        pool.close()
+
+
+def test_a_puzzle_used_from_the_pool_is_not_generated_again(tmp_path):
+    seed = 5
+    data = generate_puzzle_data((puzzle_seeds(seed, 1)[0], 'Any', 9, 'bitmask',
+                                 'random'))
+    pool = PuzzlePool(str(tmp_path / 'pool.sqlite'))
+    try:
+        pool.add(9, [data])
+        pool.draw(9, 'Any', 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            records = list(iter_puzzles(1, 'Any', 3, 'bitmask', seed=seed,
+                                        puzzle_pool=pool))
+    finally:
+        pool.close()
+    assert len(records) == 1
+    assert puzzle_key(records[0][0].to_string(), 9) != puzzle_key(data[0], 9)
+
+
+@pytest.mark.parametrize('clues', [1, 2, 5])
+def test_sparse_grids_are_keyed_quickly(clues):
+    rnd = random.Random(clues)
+    cells = [0] * 81
+    for i in rnd.sample(range(81), clues):
+        cells[i] = rnd.randint(1, 9)
+    puzzle = ' '.join(str(v) for v in cells)
+    start = time.perf_counter()
+    form = canonical_form(puzzle, 9)
+    assert time.perf_counter() - start < 1.0
+    assert sum(1 for v in form if v) == clues
+    if clues == 1:
+        # the weaker form still puts a single clue in one place
+        for i in range(5):
+            assert puzzle_key(variant(puzzle, 9, rnd), 9) == puzzle_key(puzzle, 9)
+
+
+def test_a_generator_reuses_ratings_only_with_an_index():
+    random.seed(3)
+    clue_sets = [SudokuGenerator(group_size=9).all_coords[:70]]
+    generator = SudokuGenerator(group_size=9)
+    assert generator.index is None
+    assert len(list(generator.unique_puzzles(clue_sets))) == 1
+    generator.index = PuzzleIndex(9)
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        first = list(generator.unique_puzzles(clue_sets))
+        again = list(generator.unique_puzzles(clue_sets))
+        assert instrumentation.snapshot()['counters']['generator.cached_ratings'] == 1
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert again[0][1] is first[0][1]
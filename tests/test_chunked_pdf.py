@@ -0,0 +1,36 @@
+import contextlib
+import io
+import pytest
+from conf import load_config
+from main import createPDF
+from Generator import chunked_pdf
+from Generator.sudoku_maker import make_puzzles
+
+pypdf = pytest.importorskip('pypdf')
+
+
+@pytest.fixture(scope='module')
+def puzzles():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return make_puzzles(13, 'Any', False, 3, 'bitmask', seed=7)
+
+
+def page_texts(pdf):
+    return [page.extract_text() for page in pypdf.PdfReader(io.BytesIO(pdf)).pages]
+
+
+@pytest.mark.parametrize('per_page', [1, 4, 6])
+def test_a_chunked_render_matches_a_single_process_one(puzzles, per_page):
+    config = load_config().updated({'SUDOKUS_PER_PAGE': per_page,
+                                    'SHOW_SOLUTIONS': True})
+    single, chunked = io.BytesIO(), io.BytesIO()
+    with contextlib.redirect_stdout(io.StringIO()):
+        createPDF(single, puzzles, config)
+        # small chunks, so puzzle and solution pages are split up
+        chunked_pdf.create_pdf(chunked, puzzles, config, workers=2, pages_per_chunk=2)
+    expected = page_texts(single.getvalue())
+    pages = page_texts(chunked.getvalue())
+    assert len(pages) == len(expected)
+    # the page texts carry the puzzle numbers and the page numbers the
+    # solution pages refer to
+    assert pages == expected
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from Generator import exact_cover, mask_search
+
+UNIQUE = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+          '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+          '4 0 0 1 0 0 3 9 0')
+# unique, but needs a deep search
+HARD = ('8 0 0 0 0 0 0 0 0 0 0 3 6 0 0 0 0 0 0 7 0 0 9 0 2 0 0 0 5 0 0 0 7 0 0 0 '
+        '0 0 0 0 4 5 7 0 0 0 0 0 1 0 0 0 3 0 0 0 1 0 0 0 0 6 8 0 0 8 5 0 0 0 1 0 '
+        '0 9 0 0 0 0 4 0 0')
+
+
+def grid(puzzle):
+    return np.array(puzzle.split(), dtype=np.int8).reshape(9, 9)
+
+
+def is_solution(solution, puzzle, group_size=9):
+    n = group_size
+    w = int(n ** 0.5)
+    solution = np.array(solution)
+    digits = set(range(1, n + 1))
+    boxes = solution.reshape(w, w, w, w).swapaxes(1, 2).reshape(n, n)
+    return (all(set(line) == digits for line in solution) and
+            all(set(line) == digits for line in solution.T) and
+            all(set(box) == digits for box in boxes) and
+            np.array_equal(solution[puzzle != 0], puzzle[puzzle != 0]))
+
+
+@pytest.mark.parametrize('puzzle', [UNIQUE, HARD])
+def test_unique_puzzles(puzzle):
+    unique, solution = exact_cover.check_unique(grid(puzzle))
+    assert unique
+    assert is_solution(solution, grid(puzzle))
+    assert exact_cover.find_solutions(grid(puzzle), 9, 5) == [solution]
+
+
+def test_a_puzzle_with_several_solutions():
+    solution = np.array(exact_cover.check_unique(grid(UNIQUE))[1])
+    puzzle = solution.copy()
+    # two empty rows of one band can swap places
+    puzzle[3:5] = 0
+    unique, first = exact_cover.check_unique(puzzle)
+    assert not unique
+    assert is_solution(first, puzzle)
+    solutions = exact_cover.find_solutions(puzzle, 9, 5)
+    assert len(set(solutions)) == len(solutions) > 1
+    assert all(is_solution(s, puzzle) for s in solutions)
+
+
+def test_a_broken_puzzle_has_no_solution():
+    puzzle = grid(UNIQUE)
+    puzzle[0, 0] = 8
+    assert exact_cover.check_unique(puzzle) == (False, None)
+    assert exact_cover.find_solutions(puzzle) == []
+
+
+def test_an_empty_grid_has_many_solutions():
+    solutions = exact_cover.find_solutions(np.zeros((9, 9), dtype=np.int8), 9, 3)
+    assert len(set(solutions)) == 3
+
+
+def test_larger_grids_go_to_mask_search():
+    n = 16
+    solution = np.array(mask_search.random_solution(n))
+    puzzle = solution.copy()
+    puzzle[np.arange(n), (np.arange(n) * 3 + 1) % n] = 0
+    unique, found = exact_cover.check_unique(puzzle, n)
+    assert unique
+    assert np.array_equal(found, solution)
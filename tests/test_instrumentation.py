@@ -0,0 +1,36 @@
+import pytest
+from Generator import instrumentation
+
+
+@pytest.fixture
+def counting():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_stages_share_one_context_manager():
+    assert not instrumentation.enabled
+    first = instrumentation.stage('a')
+    assert instrumentation.stage('b') is first
+    with first:
+        pass
+    assert instrumentation.snapshot()['stages'] == {}
+
+
+def test_enabled_stages_are_timed(counting):
+    for i in range(3):
+        with instrumentation.stage('a'):
+            instrumentation.count('a.blocks')
+    snapshot = instrumentation.snapshot()
+    assert snapshot['stages']['a']['calls'] == 3
+    assert snapshot['counters'] == {'a.blocks': 3}
+
+
+def test_a_failing_stage_is_still_timed(counting):
+    with pytest.raises(ValueError):
+        with instrumentation.stage('a'):
+            raise ValueError
+    assert instrumentation.snapshot()['stages']['a']['calls'] == 1
@@ -0,0 +1,86 @@
+import random
+import numpy as np
+import pytest
+from Generator import exact_cover, mask_search, prefilters
+
+UNIQUE = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+          '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+          '4 0 0 1 0 0 3 9 0')
+# unique, but needs a deep search
+HARD = ('8 0 0 0 0 0 0 0 0 0 0 3 6 0 0 0 0 0 0 7 0 0 9 0 2 0 0 0 5 0 0 0 7 0 0 0 '
+        '0 0 0 0 4 5 7 0 0 0 0 0 1 0 0 0 3 0 0 0 1 0 0 0 0 6 8 0 0 8 5 0 0 0 1 0 '
+        '0 9 0 0 0 0 4 0 0')
+
+
+def grid(puzzle):
+    return np.array(puzzle.split(), dtype=np.int8).reshape(9, 9)
+
+
+def is_solution(solution, group_size):
+    n = group_size
+    w = int(n ** 0.5)
+    solution = np.array(solution)
+    digits = set(range(1, n + 1))
+    boxes = solution.reshape(w, w, w, w).swapaxes(1, 2).reshape(n, n)
+    return all(set(line) == digits
+               for lines in (solution, solution.T, boxes) for line in lines)
+
+
+def nine_by_nine():
+    """The test puzzles: unique, needing a search, with several
+    solutions and without any."""
+    several = np.array(exact_cover.check_unique(grid(UNIQUE))[1], dtype=np.int8)
+    several[3:5] = 0
+    broken = grid(UNIQUE)
+    broken[0, 0] = 8
+    return {'unique': grid(UNIQUE), 'hard': grid(HARD), 'several': several,
+            'broken': broken}
+
+
+@pytest.mark.parametrize('name', ['unique', 'hard', 'several', 'broken'])
+def test_nine_by_nine_agrees_with_exact_cover(name):
+    puzzle = nine_by_nine()[name]
+    unique, solution = mask_search.check_unique(puzzle, 9)
+    assert (unique, solution) == exact_cover.check_unique(puzzle)
+    assert unique == (name in ('unique', 'hard'))
+    if name == 'broken':
+        assert solution is None
+    else:
+        assert is_solution(solution, 9)
+        assert len(mask_search.find_solutions(puzzle, 9, 5)) == \
+            len(exact_cover.find_solutions(puzzle, 9, 5))
+
+
+@pytest.mark.parametrize('group_size', [4, 9, 16, 25])
+def test_random_solutions_are_valid(group_size):
+    solution = mask_search.random_solution(group_size, random.Random(group_size))
+    assert is_solution(solution, group_size)
+
+
+@pytest.fixture(scope='module')
+def solution_16():
+    return np.array(mask_search.random_solution(16, random.Random(1)), dtype=np.int8)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sixteen_by_sixteen_agrees_with_exact_cover(solution_16, seed):
+    # with 35% of the squares open, seeds 0, 2 and 4 are unique, 1 and 3 not
+    open_squares = np.random.default_rng(seed).random((16, 16)) < 0.35
+    puzzle = np.where(open_squares, 0, solution_16)
+    unique, solution = mask_search.check_unique(puzzle, 16)
+    solutions = exact_cover.find_solutions(puzzle, 16, 2)
+    assert unique == (len(solutions) == 1) == (seed % 2 == 0)
+    assert is_solution(solution, 16)
+    if unique:
+        assert np.array_equal(solution, solution_16)
+
+
+def test_a_sixteen_by_sixteen_open_rectangle_is_not_unique(solution_16):
+    puzzle = solution_16.reshape(-1).copy()
+    puzzle[prefilters.rectangles(solution_16.tobytes(), 16)[0]] = 0
+    puzzle = puzzle.reshape(16, 16)
+    unique, solution = mask_search.check_unique(puzzle, 16)
+    assert not unique
+    solutions = mask_search.find_solutions(puzzle, 16, 5)
+    assert len(solutions) == 2
+    assert any(np.array_equal(s, solution_16) for s in solutions)
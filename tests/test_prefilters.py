@@ -0,0 +1,99 @@
+import random
+import numpy as np
+import pytest
+from Generator import instrumentation, prefilters
+from Generator.exact_cover import check_unique
+from Generator.prefilters import PrefilterChain, Prefilter
+from Generator.sudoku_maker import SudokuGenerator
+
+UNIQUE = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+          '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+          '4 0 0 1 0 0 3 9 0')
+
+
+def candidates(seed, clues, count=40):
+    """Return (grids, solution) for count symmetric clue sets cut from
+    one generated solution."""
+    random.seed(seed)
+    generator = SudokuGenerator(clues=clues, group_size=9, engine='bitmask')
+    solution = np.array(generator.start_grid.grid, dtype=np.int8)
+    grids = np.zeros((count, 9, 9), dtype=np.int8)
+    for grid in grids:
+        xs, ys = zip(*generator.symmetric_coords())
+        grid[ys, xs] = solution[ys, xs]
+    return grids, solution
+
+
+def unique_puzzle():
+    grid = np.array([int(v) for v in UNIQUE.split()], dtype=np.int8).reshape(9, 9)
+    unique, solution = check_unique(grid)
+    assert unique
+    return grid, np.array(solution, dtype=np.int8)
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('clues', [24, 28, 34])
+def test_no_puzzle_exact_cover_accepts_is_rejected(seed, clues):
+    grids, solution = candidates(seed, clues)
+    keep = PrefilterChain().keep(grids, solution, 9)
+    for grid, kept in zip(grids, keep):
+        if not kept:
+            assert not check_unique(grid)[0]
+
+
+@pytest.fixture
+def counting():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_the_filters_reject_some_random_candidates(counting):
+    chain = PrefilterChain()
+    for seed in range(3):
+        chain.keep(*candidates(seed, 24), group_size=9)
+    counters = instrumentation.snapshot()['counters']
+    assert counters['prefilter.too_few_digits.checked'] == 120
+    assert sum(counters.get('prefilter.%s.rejected' % f.name, 0)
+               for f in chain.filters) > 0
+
+
+def test_every_generator_has_its_own_chain():
+    random.seed(1)
+    first, second = SudokuGenerator(group_size=9), SudokuGenerator(group_size=9)
+    first.prefilter_chain.add('nothing', lambda grids, solution, n: np.zeros(len(grids), bool))
+    assert len(second.prefilter_chain.filters) == 3
+
+
+def test_a_known_unique_puzzle_is_kept():
+    grid, solution = unique_puzzle()
+    assert PrefilterChain().keep(grid[None], solution, 9).all()
+
+
+def non_unique_variants(solution):
+    """One puzzle per filter, cut from the full solution so that only
+    the pattern that filter looks for gives a second solution."""
+    missing_digits = solution.copy()
+    missing_digits[(solution == 1) | (solution == 2)] = 0
+    empty_rows = solution.copy()
+    empty_rows[3:5] = 0
+    rect = prefilters.rectangles(solution.tobytes(), 9)[0]
+    open_rectangle = solution.copy().reshape(-1)
+    open_rectangle[rect] = 0
+    return {'too_few_digits': missing_digits,
+            'empty_lines': empty_rows,
+            'open_rectangles': open_rectangle.reshape(9, 9)}
+
+
+@pytest.mark.parametrize('name', ['too_few_digits', 'empty_lines', 'open_rectangles'])
+def test_known_non_unique_puzzles_are_rejected(counting, name):
+    grid, solution = unique_puzzle()
+    puzzle = non_unique_variants(solution)[name]
+    assert not check_unique(puzzle)[0]
+    test = dict((f.name, f) for f in PrefilterChain().filters)[name].test
+    chain = PrefilterChain([Prefilter(name, test)])
+    assert not chain.keep(puzzle[None], solution, 9).any()
+    assert instrumentation.snapshot()['counters'] == {
+        'prefilter.%s.checked' % name: 1, 'prefilter.%s.rejected' % name: 1}
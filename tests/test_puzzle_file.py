@@ -0,0 +1,94 @@
+import contextlib
+import io
+import random
+import numpy as np
+import pytest
+from Generator import mask_search
+from Generator.puzzle_file import PuzzleFile, PuzzleFileWriter
+from Generator.puzzle_pool import PuzzlePool
+from Generator.sudoku_maker import generate_puzzle_data
+from Generator.sudoku_solver import difficulty_band
+
+
+def generate(seed, group_size=9):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_puzzle_data((seed, 'Any', group_size, 'bitmask', 'random'))
+
+
+def made_up(seed, group_size):
+    """A puzzle tuple with a random solution and half the cells open;
+    quicker than generating one for large grids."""
+    rng = random.Random(seed)
+    solution = [v for row in mask_search.random_solution(group_size, rng) for v in row]
+    puzzle = [v if rng.random() < 0.5 else 0 for v in solution]
+    return (' '.join(map(str, puzzle)), rng.uniform(0, 1), rng.randint(0, 300),
+            rng.randint(0, 70000), rng.randint(0, 600), ' '.join(map(str, solution)))
+
+
+@pytest.mark.parametrize('group_size', [4, 9, 16])
+def test_puzzles_round_trip(tmp_path, group_size):
+    if group_size == 16:
+        data = [made_up(seed, 16) for seed in range(5)]
+    else:
+        data = [generate(seed, group_size) for seed in range(5)]
+    path = str(tmp_path / 'puzzles.bin')
+    with PuzzleFileWriter(path, group_size) as writer:
+        assert writer.write(data[:3]) == 3
+    # a second writer appends
+    with PuzzleFileWriter(path, group_size) as writer:
+        assert writer.write(data[3:]) == 2
+    puzzle_file = PuzzleFile(path)
+    assert isinstance(puzzle_file.records, np.memmap)
+    assert len(puzzle_file) == 5
+    assert list(puzzle_file.iter_data(batch_size=2)) == data
+    for record, (puzzle, value, guesses, backtraces, squares_filled, solution) \
+            in zip(puzzle_file[:], data):
+        assert record.puzzle.to_string() == puzzle
+        assert record.solution.to_string() == solution
+        assert (record.rating.value, record.rating.guesses, record.rating.backtraces,
+                record.rating.squares_filled) == (value, guesses, backtraces,
+                                                  squares_filled)
+    assert puzzle_file[4].puzzle.to_string() == data[4][0]
+
+
+def test_sample_picks_from_the_given_bands(tmp_path):
+    data = [generate(seed) for seed in range(8)]
+    path = str(tmp_path / 'puzzles.bin')
+    with PuzzleFileWriter(path, 9) as writer:
+        writer.write(data)
+    puzzle_file = PuzzleFile(path)
+    sampled = puzzle_file.sample(2, rng=np.random.default_rng(1))
+    assert len(set(record.puzzle.to_string() for record in sampled)) == 2
+    band = puzzle_file[0].rating.value_string()
+    in_band = [d for d in data if difficulty_band(d[1]) == band]
+    sampled = puzzle_file.sample(len(in_band), [band])
+    assert sorted(record.puzzle.to_string() for record in sampled) == \
+        sorted(d[0] for d in in_band)
+
+
+def test_files_of_another_size_are_refused(tmp_path):
+    path = str(tmp_path / 'puzzles.bin')
+    PuzzleFileWriter(path, 9).close()
+    assert len(PuzzleFile(path)) == 0
+    with pytest.raises(ValueError):
+        PuzzleFileWriter(path, 16)
+    (tmp_path / 'other.bin').write_bytes(b'not a puzzle file')
+    with pytest.raises(ValueError):
+        PuzzleFile(str(tmp_path / 'other.bin'))
+
+
+def test_a_pool_round_trips_through_a_puzzle_file(tmp_path):
+    data = [generate(seed) for seed in range(4)]
+    path = str(tmp_path / 'puzzles.bin')
+    pool = PuzzlePool(str(tmp_path / 'pool.sqlite'))
+    copy = PuzzlePool(str(tmp_path / 'copy.sqlite'))
+    try:
+        pool.add(9, data)
+        pool.draw(9, 'Any', 1)
+        assert pool.export(path, 9) == 3
+        assert copy.import_file(path) == 3
+        assert copy.import_file(path) == 0
+        assert sorted(copy.draw(9, 'Any', 10)) == sorted(data[1:])
+    finally:
+        pool.close()
+        copy.close()
@@ -0,0 +1,63 @@
+import json
+import pytest
+from conf import load_config
+from service import SudokuService, RequestError
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = SudokuService(load_config(), workers=1, threads=1, max_amount=50)
+    yield service
+    service.close()
+
+
+def request(service, settings):
+    return service.request_config(json.dumps(settings).encode())
+
+
+def test_valid_request(service):
+    config = request(service, {'SUDOKU_AMOUNT': 3, 'SUDOKUS_PER_PAGE': 4,
+                               'SUDOKU_SQUARE_SIZE': 2, 'DIFFICULTY_LEVEL': 'Easy, Medium',
+                               'GENERATION_MODE': 'dig', 'PDF_FILE_NAME': 'book-1'})
+    assert config['SUDOKU_AMOUNT'] == 3
+    assert config['SUDOKUS_PER_PAGE'] == 4
+
+
+@pytest.mark.parametrize('settings', [
+    {'PUZZLE_POOL': '/tmp/injected.sqlite'},
+    {'RENDER_WORKERS': 64},
+    {'SUDOKU_WORKERS': 64},
+    {'NO_SUCH_SETTING': 1},
+    {'SUDOKU_AMOUNT': '3'},
+    {'SUDOKU_AMOUNT': 3.0},
+    {'SUDOKU_AMOUNT': True},
+    {'SUDOKU_AMOUNT': 0},
+    {'SUDOKU_AMOUNT': 51},
+    {'SUDOKU_SQUARE_SIZE': 1},
+    {'SUDOKU_SQUARE_SIZE': 6},
+    {'SUDOKU_SQUARE_SIZE': '3'},
+    {'SUDOKUS_PER_PAGE': 5},
+    {'DIFFICULTY_LEVEL': 'Extreme'},
+    {'DIFFICULTY_LEVEL': 3},
+    {'GENERATION_MODE': 'carve'},
+    {'SOLVER_ENGINE': 'fast'},
+    {'PDF_PAGE_SIZE': '210'},
+    {'PDF_PAGE_SIZE': '210,1e9'},
+    {'PDF_FILE_NAME': 'a"\r\nX-Injected: 1'},
+    {'PDF_FILE_NAME': '../../etc/passwd'},
+    {'CUSTOM_FONT': '/etc/passwd'},
+    {'FONT_SIZE_4_PAGE': 0},
+    {'SHOW_SOLUTIONS': 'yes'},
+    {'SUDOKU_SEED': [1]},
+])
+def test_bad_settings_are_refused(service, settings):
+    with pytest.raises(RequestError) as error:
+        request(service, settings)
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize('body', [b'{', b'[1, 2]', b'"text"'])
+def test_bad_json_is_refused(service, body):
+    with pytest.raises(RequestError) as error:
+        service.request_config(body)
+    assert error.value.status == 400
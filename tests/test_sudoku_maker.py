@@ -0,0 +1,67 @@
+import contextlib
+import io
+import pytest
+import random
+from Generator.sudoku_maker import SudokuGenerator, difficulty_bands, generate_puzzle_data, \
+    MODE_DIG
+from Generator.sudoku_solver import SudokuGrid, difficulty_band
+
+PUZZLE = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+          '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+          '4 0 0 1 0 0 3 9 0')
+
+
+@pytest.mark.parametrize('difficulty, bands', [
+    ('Any', ['Easy', 'Medium', 'Hard', 'Very hard']),
+    ('any', ['Easy', 'Medium', 'Hard', 'Very hard']),
+    ('Hard', ['Hard']),
+    ('Very Hard', ['Very hard']),
+    ('very hard, Easy', ['Easy', 'Very hard']),
+    ('Easy, Medium', ['Easy', 'Medium']),
+])
+def test_difficulty_bands(difficulty, bands):
+    assert difficulty_bands(difficulty) == bands
+
+
+@pytest.mark.parametrize('difficulty', ['', 'Extreme', 'Hard, Extreme', 'Any, Easy', 'Very'])
+def test_unknown_difficulties_are_refused(difficulty):
+    with pytest.raises(ValueError, match='Very hard'):
+        difficulty_bands(difficulty)
+
+
+def test_dig_finds_a_very_hard_puzzle():
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = generate_puzzle_data((1, 'very hard', 9, 'bitmask', MODE_DIG))
+    assert difficulty_band(data[1]) == 'Very hard'
+
+
+def test_dig_gives_up_on_a_band_out_of_reach():
+    # 4x4 puzzles never rate past Easy
+    with contextlib.redirect_stdout(io.StringIO()):
+        with pytest.raises(RuntimeError, match='Hard'):
+            generate_puzzle_data((1, 'Hard', 4, 'bitmask', MODE_DIG))
+
+
+def test_dig_rates_small_grids_that_keep_many_clues():
+    # these 4x4 start grids can't be dug down to the usual clue count
+    for seed in (34, 46, 51, 52):
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = generate_puzzle_data((seed, 'Any', 4, 'bitmask', MODE_DIG))
+        assert difficulty_band(data[1]) == 'Easy'
+
+
+def test_is_unique_rates_only_unique_puzzles():
+    random.seed(2)
+    generator = SudokuGenerator(group_size=9)
+    rating = generator.is_unique(SudokuGrid(PUZZLE).grid)
+    assert rating.value_string() in difficulty_bands('Any')
+
+    def analyse(sudoku_grid, unique=None):
+        raise AssertionError('rated a puzzle with several solutions')
+
+    generator.analyse = analyse
+    cells = PUZZLE.split()
+    clues = [i for i, v in enumerate(cells) if v != '0']
+    for i in clues[len(clues) // 2:]:
+        cells[i] = '0'
+    assert generator.is_unique(SudokuGrid(' '.join(cells)).grid) is None
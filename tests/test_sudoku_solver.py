@@ -0,0 +1,233 @@
+import contextlib
+import copy
+import io
+import pickle
+import random
+import sys
+import pytest
+from Generator.sudoku_maker import generate_puzzle_data
+from Generator.sudoku_solver import SudokuGrid, SudokuSolver, SudokuRater, Guess, GuessList, \
+    BreadcrumbTrail
+
+PUZZLE = ('0 8 2 0 0 7 0 0 3 7 0 0 8 9 3 0 0 0 0 0 4 0 0 2 6 0 0 0 0 0 0 5 0 0 0 9 '
+          '6 0 9 0 0 0 5 0 4 1 0 0 0 8 0 0 0 0 0 0 8 4 0 0 2 0 0 0 0 0 3 7 5 0 0 6 '
+          '4 0 0 1 0 0 3 9 0')
+# needs hundreds of backtraces
+HARD = ('8 0 0 0 0 0 0 0 0 0 0 3 6 0 0 0 0 0 0 7 0 0 9 0 2 0 0 0 5 0 0 0 7 0 0 0 '
+        '0 0 0 0 4 5 7 0 0 0 0 0 1 0 0 0 3 0 0 0 1 0 0 0 0 6 8 0 0 8 5 0 0 0 1 0 '
+        '0 9 0 0 0 0 4 0 0')
+
+
+def same_grid(a, b):
+    assert type(a) is type(b)
+    assert a.to_string() == b.to_string()
+    assert a.rows == b.rows and a.cols == b.cols and a.boxes == b.boxes
+    assert a.box_by_coords == b.box_by_coords
+    assert a.possible_values(0, 0) == b.possible_values(0, 0)
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+@pytest.mark.parametrize('make', [
+    lambda engine: SudokuGrid(PUZZLE),
+    lambda engine: SudokuSolver(PUZZLE, engine=engine),
+    lambda engine: SudokuRater(PUZZLE, engine=engine),
+])
+def test_grids_round_trip(make, engine):
+    grid = make(engine)
+    for copied in (pickle.loads(pickle.dumps(grid)), copy.deepcopy(grid)):
+        same_grid(grid, copied)
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_solved_solver_round_trips(engine):
+    random.seed(1)
+    solver = SudokuSolver(PUZZLE, engine=engine)
+    solver.solve()
+    copied = pickle.loads(pickle.dumps(solver))
+    same_grid(solver, copied)
+    assert len(copied.guesses) == len(solver.guesses)
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_copies_share_the_geometry(engine):
+    solver = SudokuSolver(PUZZLE, engine=engine)
+    for copied in (pickle.loads(pickle.dumps(solver)), copy.deepcopy(solver)):
+        for name in SudokuGrid.GEOMETRY_ATTRIBUTES:
+            assert getattr(copied, name) is getattr(solver, name)
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_open_squares_are_tracked_through_adds_and_removes(engine):
+    rnd = random.Random(5)
+    grid = SudokuSolver(PUZZLE, engine=engine)
+    filled = []
+    for step in range(2000):
+        poss = grid.calculate_open_squares()
+        if poss and (not filled or rnd.random() < 0.6):
+            coords = rnd.choice(sorted(poss))
+            if poss[coords]:
+                grid.add(*coords, rnd.choice(sorted(poss[coords])))
+                filled.append(coords)
+        elif filled:
+            grid.remove(*filled.pop(rnd.randrange(len(filled))))
+        poss = grid.calculate_open_squares()
+        if poss:
+            coords = min(poss, key=lambda c: (len(poss[c]), c))
+            assert grid.least_open_square() == (coords, poss[coords])
+        else:
+            assert grid.least_open_square() is None
+        assert grid.has_impossible_square() == (set() in poss.values())
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_analyse_trusts_a_known_answer(engine):
+    random.seed(3)
+    solution, unique, rating = SudokuRater(PUZZLE, engine=engine).analyse()
+    assert unique
+
+    def second_search():
+        raise AssertionError('searched for a second solution')
+
+    random.seed(3)
+    rater = SudokuRater(PUZZLE, engine=engine)
+    rater.find_another_solution = second_search
+    known_solution, known_unique, known_rating = rater.analyse(unique=True)
+    assert (known_solution, known_unique) == (solution, True)
+    assert known_rating.value == rating.value
+
+
+def test_plain_grids_do_not_file_open_squares():
+    grid = SudokuGrid(PUZZLE)
+    assert grid.open_counts is None
+    grid.add(0, 0, 5)
+    grid.remove(0, 0)
+    assert grid.open_counts is None
+    poss = grid.calculate_open_squares()
+    coords = min(poss, key=lambda c: (len(poss[c]), c))
+    assert grid.least_open_square() == (coords, poss[coords])
+    assert grid.open_counts is not None
+
+
+def rating_fields(puzzle, group_size, engine, seed):
+    random.seed(seed)
+    summary = SudokuRater(puzzle, group_size=group_size, engine=engine).difficulty().summary()
+    return (summary.value, summary.guesses, summary.backtraces, summary.squares_filled)
+
+
+@pytest.mark.parametrize('seed, difficulty, group_size, mode', [
+    (0, 'Any', 9, 'random'), (1, 'Any', 9, 'random'), (2, 'Hard', 9, 'dig'),
+    # these take guesses, and all but 2 backtrack
+    (1, 'Very hard', 9, 'dig'), (2, 'Very hard', 9, 'dig'),
+    (3, 'Very hard', 9, 'dig'), (4, 'Very hard', 9, 'dig'),
+    (1, 'Any', 4, 'random'),
+])
+def test_the_engines_rate_seeded_puzzles_alike(seed, difficulty, group_size, mode):
+    with contextlib.redirect_stdout(io.StringIO()):
+        puzzle = generate_puzzle_data((seed, difficulty, group_size, 'bitmask', mode))[0]
+    assert rating_fields(puzzle, group_size, 'set', seed) == \
+        rating_fields(puzzle, group_size, 'bitmask', seed)
+
+
+def test_the_engines_rate_a_hard_puzzle_alike():
+    fields = rating_fields(HARD, 9, 'set', 5)
+    assert fields[2] > 100
+    assert rating_fields(HARD, 9, 'bitmask', 5) == fields
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_backtracking_does_not_nest_searches(engine):
+    random.seed(5)
+    solver = SudokuSolver(HARD, engine=engine)
+    guess = solver.guess_least_open_square
+    depth = [0, 0]
+
+    def counted():
+        depth[0] += 1
+        depth[1] = max(depth)
+        try:
+            return guess()
+        finally:
+            depth[0] -= 1
+
+    solver.guess_least_open_square = counted
+    solver.solve()
+    assert solver.backtraces > 100
+    assert depth[1] == 1
+    assert '0' not in solver.to_string().split()
+    assert not solver.trail
+
+
+def subtree(guess):
+    guesses = []
+    undo = list(guess.children)
+    while undo:
+        g = undo.pop()
+        guesses.append(g)
+        undo.extend(g.children)
+    return guesses
+
+
+@pytest.mark.parametrize('engine', ['set', 'bitmask'])
+def test_unwrapping_a_guess_restores_the_grid(engine):
+    random.seed(2)
+    solver = SudokuSolver(HARD, engine=engine, trace=True)
+    solver.auto_fill()
+    before = solver.to_string()
+    while len(solver.breadcrumbs) < 3:
+        assert not solver.guess_least_open_square()
+    first = solver.breadcrumbs[0]
+    below = subtree(first)
+    assert len(below) >= 2
+    solver.unwrap_guess(first)
+    assert solver.to_string() == before
+    assert len(solver.breadcrumbs) == 0
+    # the guess itself stays excluded, the ones below it may come again
+    assert first in solver.guesses
+    assert not any(g in solver.guesses for g in below)
+    assert ('-', first) in solver.trail and ('-', below[-1]) in solver.trail
+
+
+def test_unwrapping_a_deep_guess_tree_does_not_recurse():
+    solver = SudokuSolver(PUZZLE)
+    guesses = [Guess(0, 0, 1)]
+    for i in range(3 * sys.getrecursionlimit()):
+        guesses.append(Guess(0, 0, 1))
+        guesses[-2].children.append(guesses[-1])
+    for guess in guesses:
+        solver.guesses.append(guess)
+    solver.unwrap_guess(guesses[0])
+    assert list(solver.guesses) == guesses[:1]
+    assert all(not g.children for g in guesses)
+
+
+def test_guess_lists_index_by_guess_and_square():
+    first, second, third = Guess(0, 0, 1), Guess(1, 0, 2), Guess(0, 0, 3)
+    guesses = GuessList([first, second, third])
+    assert list(guesses) == [first, second, third]
+    assert len(guesses) == 3
+    assert guesses[-1] is third and guesses[0] is first
+    assert guesses.guesses_for_coord(0, 0) == {1, 3}
+    assert guesses.guesses_for_coord(2, 2) == set()
+    guesses.remove(first)
+    assert first not in guesses and third in guesses
+    assert guesses.guesses_for_coord(0, 0) == {3}
+    with pytest.raises(ValueError):
+        guesses.remove(first)
+    guesses.remove(third)
+    assert guesses.guesses_for_coord(0, 0) == set()
+    assert list(guesses) == [second]
+
+
+def test_guess_lists_remove_children_and_later_guesses():
+    parent, child, other, later = (Guess(0, 0, 1), Guess(1, 0, 2), Guess(2, 0, 3),
+                                   Guess(3, 0, 4))
+    parent.children = [child, other]
+    guesses = GuessList([parent, child, later])
+    assert guesses.remove_children(parent) == [child]
+    assert list(guesses) == [parent, later]
+    guesses.append(child)
+    assert guesses.remove_guesses_for_coord(3, 0) == [later, child]
+    assert list(guesses) == [parent]
+    trail = BreadcrumbTrail([parent])
+    with pytest.raises(ValueError):
+        trail.append(Guess(0, 0, 2))